@@ -102,198 +102,217 @@ BEGIN
 END$$
 
 						# PROCEDURES
-# P1. Create a new request (validations + compute total)
+# Request workflow (same definitions as migrations/0005_workflow_procedures.sql).
+# Errors are raised with SIGNAL ... SET MYSQL_ERRNO = 50xx; flask_app/workflow.py maps the codes
+# back to the app's messages.
+
+# P0. Next ID from the ID_SEQUENCE counter table (see migrations/0001_id_sequence.sql)
+CREATE PROCEDURE next_sequence_id(
+  IN  p_prefix CHAR(3),
+  OUT p_id     VARCHAR(10)
+)
+BEGIN
+  # Same counter as flask_app/ids.py; the row stays locked until the caller commits,
+  # so callers take it as late as possible
+  UPDATE ID_SEQUENCE SET Next_Value = LAST_INSERT_ID(Next_Value) + 1 WHERE Prefix = p_prefix;
+  IF ROW_COUNT() = 0 THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5014, MESSAGE_TEXT = 'No ID_SEQUENCE counter for prefix';
+  END IF;
+  SET p_id = CONCAT(p_prefix, LPAD(LAST_INSERT_ID(),
+                    CASE p_prefix WHEN 'REQ' THEN 7 WHEN 'BUD' THEN 7 WHEN 'PRO' THEN 4 ELSE 3 END, '0'));
+END$$
+
+# P1. Create a new request (validations, vendor from the product, ID from ID_SEQUENCE)
 CREATE PROCEDURE create_procurement_request(
-  IN p_request_id VARCHAR(10),
-  IN p_dept_id    VARCHAR(6),
-  IN p_item_id    VARCHAR(7),
-  IN p_vendor_id  VARCHAR(6),
-  IN p_qty        INT
+  IN p_dept_id VARCHAR(6),
+  IN p_item_id VARCHAR(7),
+  IN p_qty     INT
 )
 BEGIN
-  DECLARE v_cost DECIMAL(20,2);
-  DECLARE v_vendor_of_item VARCHAR(6);
+  DECLARE v_request_id  VARCHAR(10);
+  DECLARE v_found       BOOLEAN DEFAULT FALSE;
+  DECLARE v_vendor      VARCHAR(6);
   DECLARE v_blacklisted BOOLEAN;
-
-  IF EXISTS(SELECT 1 FROM PROCUREMENT_REQUEST WHERE Request_ID = p_request_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Request_ID already exists.';
-  END IF;
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
 
   IF p_qty IS NULL OR p_qty <= 0 THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Quantity must be positive.';
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5012, MESSAGE_TEXT = 'Quantity must be positive';
   END IF;
 
-  # Validate foreign keys
-  IF NOT EXISTS(SELECT 1 FROM DEPARTMENT WHERE Dept_ID = p_dept_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Dept_ID.';
-  END IF;
+  START TRANSACTION;
 
-  IF NOT EXISTS(SELECT 1 FROM PRODUCT WHERE Item_ID = p_item_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Item_ID.';
+  IF NOT EXISTS(SELECT 1 FROM DEPARTMENT WHERE Dept_ID = p_dept_id) THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5011, MESSAGE_TEXT = 'Unknown Dept_ID';
   END IF;
 
-  IF NOT EXISTS(SELECT 1 FROM VENDOR WHERE Vendor_ID = p_vendor_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Vendor_ID.';
+  SELECT TRUE, Vendor_ID INTO v_found, v_vendor
+  FROM PRODUCT WHERE Item_ID = p_item_id
+  FOR UPDATE;
+  IF NOT v_found THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5008, MESSAGE_TEXT = 'No supplier found for selected product';
   END IF;
-
-  SELECT Vendor_ID INTO v_vendor_of_item
-  FROM PRODUCT WHERE Item_ID = p_item_id;
-
-  IF v_vendor_of_item IS NULL OR v_vendor_of_item <> p_vendor_id THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Vendor does not supply the selected product.';
+  IF v_vendor IS NULL OR v_vendor = '' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5009, MESSAGE_TEXT = 'Product has no linked vendor';
   END IF;
 
-  # Check vendor status
-  SELECT Blacklisted INTO v_blacklisted FROM VENDOR WHERE Vendor_ID = p_vendor_id;
+  SELECT Blacklisted INTO v_blacklisted
+  FROM VENDOR WHERE Vendor_ID = v_vendor
+  FOR UPDATE;
   IF v_blacklisted THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Vendor is blacklisted.';
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5010, MESSAGE_TEXT = 'Vendor is blacklisted';
   END IF;
 
-  # Compute total
-  SET v_cost = calc_total_cost(p_item_id, p_qty);
+  CALL next_sequence_id('REQ', v_request_id);
 
+  # Total_Cost is filled in by trg_request_bi
   INSERT INTO PROCUREMENT_REQUEST
-    (Request_ID, Dept_ID, Item_ID, Vendor_ID, Quantity, Total_Cost, Status, Request_Date)
+    (Request_ID, Dept_ID, Item_ID, Vendor_ID, Quantity, Status, Date_of_Request)
   VALUES
-    (p_request_id, p_dept_id, p_item_id, p_vendor_id, p_qty, v_cost, 'PENDING', NOW());
+    (v_request_id, p_dept_id, p_item_id, v_vendor, p_qty, 'Pending', NOW());
+
+  COMMIT;
+  SELECT v_request_id AS Request_ID, v_vendor AS Vendor_ID;
 END$$
 
 # P2. Approve a request (atomic workflow)
 # STEPS:
-# 1. Validates status
+# 1. Validates status and admin
 # 2. Checks dept budget & stock
 # 3. Deducts stock, deducts dept budget
-# 4. Writes to BUDGET_LOG
-# 5. Stamps Approved_Date & Admin_ID
+# 4. Stamps Date_of_Approval & Approval_Authority
+# 5. Writes a 'Procurement' entry to BUDGET_LOG
 CREATE PROCEDURE approve_request(
   IN p_request_id VARCHAR(10),
-  IN p_admin_id   VARCHAR(6)
+  IN p_admin_id   VARCHAR(6),
+  IN p_log_id     VARCHAR(10)  # pre-reserved BUDGET_LOG ID, or NULL to take one from ID_SEQUENCE
 )
 BEGIN
-  DECLARE v_status VARCHAR(20);
-  DECLARE v_dept   VARCHAR(6);
-  DECLARE v_item   VARCHAR(7);
-  DECLARE v_vendor VARCHAR(6);
-  DECLARE v_qty    INT;
-  DECLARE v_total  DECIMAL(20,2);
-  DECLARE v_budget DECIMAL(20,2);
-  DECLARE v_stock  INT;
+  DECLARE v_status     VARCHAR(20);
+  DECLARE v_dept       VARCHAR(6);
+  DECLARE v_item       VARCHAR(7);
+  DECLARE v_qty        INT;
+  DECLARE v_total      DECIMAL(20,2);
+  DECLARE v_admin_name VARCHAR(100);
+  DECLARE v_budget     DECIMAL(20,8);
+  DECLARE v_stock      INT;
+  DECLARE v_log_id     VARCHAR(10);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
 
-  # Lock rows we’ll touch to keep it consistent
   START TRANSACTION;
 
-  # Validate admin
-  IF NOT EXISTS(SELECT 1 FROM MINISTRY WHERE Admin_ID = p_admin_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Admin_ID.';
-  END IF;
-
-  # Load request (FOR UPDATE to serialize)
-  SELECT Status, Dept_ID, Item_ID, Vendor_ID, Quantity, Total_Cost
-    INTO v_status, v_dept, v_item, v_vendor, v_qty, v_total
+  SELECT Status, Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost, 0)
+    INTO v_status, v_dept, v_item, v_qty, v_total
   FROM PROCUREMENT_REQUEST
   WHERE Request_ID = p_request_id
   FOR UPDATE;
-
   IF v_status IS NULL THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Request_ID.';
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5001, MESSAGE_TEXT = 'Unknown Request_ID';
+  END IF;
+  IF v_status <> 'Pending' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5003, MESSAGE_TEXT = 'Only Pending can be approved';
   END IF;
 
-  IF v_status <> 'PENDING' THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Only PENDING requests can be approved.';
+  SELECT Name INTO v_admin_name FROM MINISTRY WHERE Admin_ID = p_admin_id;
+  IF v_admin_name IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
   END IF;
 
-  # Budget check
+  IF v_total = 0 THEN
+    SELECT COALESCE(Unit_Cost, 0) * v_qty INTO v_total FROM PRODUCT WHERE Item_ID = v_item;
+  END IF;
+
+  # Lock order: request -> department -> product
   SELECT Current_Budget INTO v_budget
-  FROM DEPARTMENT
-  WHERE Dept_ID = v_dept
+  FROM DEPARTMENT WHERE Dept_ID = v_dept
   FOR UPDATE;
-
-  IF v_budget IS NULL OR v_budget < v_total THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Insufficient department budget.';
+  IF v_budget IS NULL THEN
+    # No running budget: allocation minus approved spend
+    SELECT COALESCE(d.Budget_Allocation, 0) - COALESCE(SUM(pr.Total_Cost), 0) INTO v_budget
+    FROM DEPARTMENT d
+    LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Dept_ID = d.Dept_ID AND pr.Status = 'Approved'
+    WHERE d.Dept_ID = v_dept
+    GROUP BY d.Dept_ID;
   END IF;
 
-  # Stock check
   SELECT Stock_Available INTO v_stock
-  FROM PRODUCT
-  WHERE Item_ID = v_item
+  FROM PRODUCT WHERE Item_ID = v_item
   FOR UPDATE;
 
-  IF v_stock IS NULL OR v_stock < v_qty THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Insufficient stock.';
+  IF COALESCE(v_budget, 0) < v_total THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5006, MESSAGE_TEXT = 'Insufficient department budget';
+  END IF;
+  IF COALESCE(v_stock, 0) < v_qty THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5007, MESSAGE_TEXT = 'Insufficient stock';
   END IF;
 
-  # Deduct stock
-  UPDATE PRODUCT
-  SET Stock_Available = Stock_Available - v_qty
-  WHERE Item_ID = v_item;
-
-  # Deduct budget
-  UPDATE DEPARTMENT
-  SET Current_Budget = Current_Budget - v_total
-  WHERE Dept_ID = v_dept;
-
-  # Log budget movement
-  INSERT INTO BUDGET_LOG (Log_ID, Dept_ID, Request_ID, Admin_ID, Amount, Action, Log_Timestamp)
-  VALUES (CONCAT('BL', LPAD(FLOOR(RAND()*999999),6,'0')), v_dept, p_request_id, p_admin_id, v_total, 'DEDUCT', NOW());
-
-  # Finalize request
+  UPDATE PRODUCT SET Stock_Available = Stock_Available - v_qty WHERE Item_ID = v_item;
+  UPDATE DEPARTMENT SET Current_Budget = Current_Budget - v_total WHERE Dept_ID = v_dept;
   UPDATE PROCUREMENT_REQUEST
-  SET Status = 'APPROVED',
-      Approved_Date = NOW(),
-      Admin_ID = p_admin_id,
-      Total_Cost = v_total -- keep it explicit
+  SET Status = 'Approved', Date_of_Approval = NOW(), Approval_Authority = v_admin_name, Total_Cost = v_total
   WHERE Request_ID = p_request_id;
 
+  SET v_log_id = p_log_id;
+  IF v_log_id IS NULL THEN
+    CALL next_sequence_id('BUD', v_log_id);
+  END IF;
+  INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount)
+  VALUES (v_log_id, 'Procurement', v_dept, p_request_id, p_admin_id, v_total);
+
   COMMIT;
 END$$
 
-# P3. Reject a request (Through the log, giving reasons)
+# P3. Reject a pending request
 CREATE PROCEDURE reject_request(
   IN p_request_id VARCHAR(10),
-  IN p_admin_id   VARCHAR(6),
-  IN p_reason     VARCHAR(255)
+  IN p_admin_id   VARCHAR(6)
 )
 BEGIN
-  DECLARE v_status VARCHAR(20);
-  DECLARE v_dept   VARCHAR(6);
+  DECLARE v_status     VARCHAR(20);
+  DECLARE v_admin_name VARCHAR(100);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
 
   START TRANSACTION;
 
-  IF NOT EXISTS(SELECT 1 FROM MINISTRY WHERE Admin_ID = p_admin_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Admin_ID.';
-  END IF;
-
-  SELECT Status, Dept_ID INTO v_status, v_dept
+  SELECT Status INTO v_status
   FROM PROCUREMENT_REQUEST
   WHERE Request_ID = p_request_id
   FOR UPDATE;
-
   IF v_status IS NULL THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Request_ID.';
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5001, MESSAGE_TEXT = 'Unknown Request_ID';
+  END IF;
+  IF v_status <> 'Pending' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5004, MESSAGE_TEXT = 'Only Pending can be rejected';
   END IF;
 
-  IF v_status <> 'PENDING' THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Only PENDING requests can be rejected.';
+  SELECT Name INTO v_admin_name FROM MINISTRY WHERE Admin_ID = p_admin_id;
+  IF v_admin_name IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
   END IF;
 
   UPDATE PROCUREMENT_REQUEST
-  SET Status = 'REJECTED',
-      Approved_Date = NULL,
-      Admin_ID = p_admin_id
+  SET Status = 'Rejected', Date_of_Approval = NOW(), Approval_Authority = v_admin_name
   WHERE Request_ID = p_request_id;
 
-  # Log as REFUND with 0 (acts like an audit note)
-  INSERT INTO BUDGET_LOG (Log_ID, Dept_ID, Request_ID, Admin_ID, Amount, Action, Log_Timestamp)
-  VALUES (CONCAT('BL', LPAD(FLOOR(RAND()*999999),6,'0')), v_dept, p_request_id, p_admin_id, 0, CONCAT('REJECT:', COALESCE(p_reason,'')), NOW());
-
   COMMIT;
 END$$
 
-# P4. Cancel an approved request (Restock & Refund)
+# P4. Cancel an approved request (Restock, Refund, 'Reversal' log entry, request removed)
 CREATE PROCEDURE cancel_request(
   IN p_request_id VARCHAR(10),
   IN p_admin_id   VARCHAR(6),
-  IN p_reason     VARCHAR(255)
+  IN p_log_id     VARCHAR(10)  # pre-reserved BUDGET_LOG ID, or NULL to take one from ID_SEQUENCE
 )
 BEGIN
   DECLARE v_status VARCHAR(20);
@@ -301,48 +320,100 @@ BEGIN
   DECLARE v_item   VARCHAR(7);
   DECLARE v_qty    INT;
   DECLARE v_total  DECIMAL(20,2);
+  DECLARE v_log_id VARCHAR(10);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
 
   START TRANSACTION;
 
-  IF NOT EXISTS(SELECT 1 FROM MINISTRY WHERE Admin_ID = p_admin_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Admin_ID.';
-  END IF;
-
-  SELECT Status, Dept_ID, Item_ID, Quantity, Total_Cost
+  SELECT Status, Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost, 0)
     INTO v_status, v_dept, v_item, v_qty, v_total
   FROM PROCUREMENT_REQUEST
   WHERE Request_ID = p_request_id
   FOR UPDATE;
-
   IF v_status IS NULL THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Request_ID.';
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5001, MESSAGE_TEXT = 'Unknown Request_ID';
   END IF;
-
-  IF v_status <> 'APPROVED' THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Only APPROVED requests can be cancelled.';
+  IF v_status <> 'Approved' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5005, MESSAGE_TEXT = 'Only Approved can be cancelled';
+  END IF;
+  IF NOT EXISTS(SELECT 1 FROM MINISTRY WHERE Admin_ID = p_admin_id) THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
   END IF;
 
-  -- Restock
-  UPDATE PRODUCT
-  SET Stock_Available = Stock_Available + v_qty
-  WHERE Item_ID = v_item;
+  # Refund and restock (department before product, as in approve_request)
+  UPDATE DEPARTMENT SET Current_Budget = Current_Budget + v_total WHERE Dept_ID = v_dept;
+  UPDATE PRODUCT SET Stock_Available = Stock_Available + v_qty WHERE Item_ID = v_item;
 
-  # Refund budget
-  UPDATE DEPARTMENT
-  SET Current_Budget = Current_Budget + v_total
-  WHERE Dept_ID = v_dept;
+  IF v_total <> 0 THEN
+    SET v_log_id = p_log_id;
+    IF v_log_id IS NULL THEN
+      CALL next_sequence_id('BUD', v_log_id);
+    END IF;
+    INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount)
+    VALUES (v_log_id, 'Reversal', v_dept, p_request_id, p_admin_id, -ABS(v_total));
+  END IF;
 
-  INSERT INTO BUDGET_LOG (Log_ID, Dept_ID, Request_ID, Admin_ID, Amount, Action, Log_Timestamp)
-  VALUES (CONCAT('BL', LPAD(FLOOR(RAND()*999999),6,'0')), v_dept, p_request_id, p_admin_id, v_total, CONCAT('REFUND:', COALESCE(p_reason,'')), NOW());
-
-  UPDATE PROCUREMENT_REQUEST
-  SET Status = 'CANCELLED',
-      Admin_ID = p_admin_id
-  WHERE Request_ID = p_request_id;
+  DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID = p_request_id;
 
   COMMIT;
 END$$
 
+# P4b. Approve/reject/cancel many requests in one call
+CREATE PROCEDURE run_request_batch(
+  IN p_action      VARCHAR(10),
+  IN p_request_ids JSON,
+  IN p_admin_id    VARCHAR(6)
+)
+BEGIN
+  DECLARE v_done    BOOLEAN DEFAULT FALSE;
+  DECLARE v_rid     VARCHAR(10);
+  DECLARE v_errno   INT;
+  DECLARE v_msg     VARCHAR(255);
+  DECLARE v_results JSON DEFAULT JSON_ARRAY();
+  DECLARE cur_ids CURSOR FOR
+    SELECT DISTINCT j.rid
+    FROM JSON_TABLE(p_request_ids, '$[*]' COLUMNS (rid VARCHAR(10) PATH '$')) j
+    WHERE j.rid IS NOT NULL
+    ORDER BY j.rid;
+  DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_done = TRUE;
+
+  IF p_action NOT IN ('approve', 'reject', 'cancel') THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5013, MESSAGE_TEXT = 'Unknown batch action';
+  END IF;
+  IF NOT EXISTS(SELECT 1 FROM MINISTRY WHERE Admin_ID = p_admin_id) THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
+  END IF;
+
+  OPEN cur_ids;
+  batch_loop: LOOP
+    FETCH cur_ids INTO v_rid;
+    IF v_done THEN
+      LEAVE batch_loop;
+    END IF;
+    SET v_errno = 0, v_msg = NULL;
+    BEGIN
+      DECLARE CONTINUE HANDLER FOR SQLEXCEPTION
+        GET DIAGNOSTICS CONDITION 1 v_errno = MYSQL_ERRNO, v_msg = MESSAGE_TEXT;
+      CASE p_action
+        WHEN 'approve' THEN CALL approve_request(v_rid, p_admin_id, NULL);
+        WHEN 'reject' THEN CALL reject_request(v_rid, p_admin_id);
+        ELSE CALL cancel_request(v_rid, p_admin_id, NULL);
+      END CASE;
+    END;
+    # A SELECT ... INTO that matched no row inside the call also fires the NOT FOUND handler
+    SET v_done = FALSE;
+    SET v_results = JSON_ARRAY_APPEND(v_results, '$',
+                      JSON_OBJECT('request_id', v_rid, 'errno', v_errno, 'message', v_msg));
+  END LOOP;
+  CLOSE cur_ids;
+
+  SELECT v_results AS Results;
+END$$
+
 # P5. Restock product
 CREATE PROCEDURE restock_product(
   IN p_item_id VARCHAR(7),
@@ -365,30 +436,32 @@ END$$
 # P6. Blacklist a vendor and auto-reject pending requests for it
 CREATE PROCEDURE blacklist_vendor(
   IN p_vendor_id VARCHAR(6),
-  IN p_admin_id  VARCHAR(6),
-  IN p_reason    VARCHAR(255)
+  IN p_admin_id  VARCHAR(6)
 )
 BEGIN
+  DECLARE v_admin_name VARCHAR(100);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
+
+  SELECT Name INTO v_admin_name FROM MINISTRY WHERE Admin_ID = p_admin_id;
+  IF v_admin_name IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
+  END IF;
+
   START TRANSACTION;
 
   IF NOT EXISTS(SELECT 1 FROM VENDOR WHERE Vendor_ID = p_vendor_id) THEN
-    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown Vendor_ID.';
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5015, MESSAGE_TEXT = 'Unknown Vendor_ID';
   END IF;
 
   UPDATE VENDOR SET Blacklisted = TRUE WHERE Vendor_ID = p_vendor_id;
 
   UPDATE PROCUREMENT_REQUEST
-  SET Status = 'REJECTED', Admin_ID = p_admin_id
-  WHERE Vendor_ID = p_vendor_id AND Status = 'PENDING';
-
-  # One-liner BUDGET_LOG note
-  INSERT INTO BUDGET_LOG (Log_ID, Dept_ID, Request_ID, Admin_ID, Amount, Action, Log_Timestamp)
-  SELECT CONCAT('BL', LPAD(FLOOR(RAND()*999999),6,'0')),
-         pr.Dept_ID, pr.Request_ID, p_admin_id, 0,
-         CONCAT('VENDOR_BLACKLIST:', COALESCE(p_reason,'')),
-         NOW()
-  FROM PROCUREMENT_REQUEST pr
-  WHERE pr.Vendor_ID = p_vendor_id AND pr.Status = 'REJECTED';
+  SET Status = 'Rejected', Date_of_Approval = NOW(), Approval_Authority = v_admin_name
+  WHERE Vendor_ID = p_vendor_id AND Status = 'Pending';
 
   COMMIT;
 END$$
@@ -479,10 +552,12 @@ BEGIN
   # Compute total
   SET NEW.Total_Cost = calc_total_cost(NEW.Item_ID, NEW.Quantity);
 
-  # Default status if missing
-  IF NEW.Status IS NULL THEN
-    SET NEW.Status = 'PENDING';
-  END IF;
+  # Default and canonical status ('Pending' / 'Approved' / 'Rejected')
+  SET NEW.Status = CASE UPPER(COALESCE(NEW.Status, 'PENDING'))
+    WHEN 'PENDING' THEN 'Pending'
+    WHEN 'APPROVED' THEN 'Approved'
+    WHEN 'REJECTED' THEN 'Rejected'
+    ELSE NEW.Status END;
 END$$
 
 DROP TRIGGER IF EXISTS trg_request_bu$$
@@ -490,8 +565,14 @@ CREATE TRIGGER trg_request_bu
 BEFORE UPDATE ON PROCUREMENT_REQUEST
 FOR EACH ROW
 BEGIN
-  # Once approved/rejected/cancelled, lock identifiers & qty
-  IF OLD.Status IN ('APPROVED','REJECTED','CANCELLED') THEN
+  SET NEW.Status = CASE UPPER(NEW.Status)
+    WHEN 'PENDING' THEN 'Pending'
+    WHEN 'APPROVED' THEN 'Approved'
+    WHEN 'REJECTED' THEN 'Rejected'
+    ELSE NEW.Status END;
+
+  # Once approved/rejected, lock identifiers & qty
+  IF OLD.Status IN ('Approved','Rejected') THEN
     IF (NEW.Dept_ID <> OLD.Dept_ID) OR (NEW.Item_ID <> OLD.Item_ID) OR
        (NEW.Vendor_ID <> OLD.Vendor_ID) OR (NEW.Quantity <> OLD.Quantity) THEN
       SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Cannot change identifiers/quantity after finalization.';
@@ -499,18 +580,18 @@ BEGIN
   END IF;
 
   # Recompute total cost if qty or item changed (still pending)
-  IF NEW.Status = 'PENDING' AND (NEW.Item_ID <> OLD.Item_ID OR NEW.Quantity <> OLD.Quantity) THEN
+  IF NEW.Status = 'Pending' AND (NEW.Item_ID <> OLD.Item_ID OR NEW.Quantity <> OLD.Quantity) THEN
     SET NEW.Total_Cost = calc_total_cost(NEW.Item_ID, NEW.Quantity);
   END IF;
 END$$
 
-# T4 - BUDGET_LOG: Basic guard (No negative Amount)
+# T4 - BUDGET_LOG: Basic guard (No negative Amount, except Reversal/Adjustment entries)
 DROP TRIGGER IF EXISTS trg_budgetlog_bi$$
 CREATE TRIGGER trg_budgetlog_bi
 BEFORE INSERT ON BUDGET_LOG
 FOR EACH ROW
 BEGIN
-  IF NEW.Amount IS NULL OR NEW.Amount < 0 THEN
+  IF NEW.Amount IS NULL OR (NEW.Amount < 0 AND COALESCE(NEW.Category, '') NOT IN ('Reversal', 'Adjustment')) THEN
     SET NEW.Amount = 0;
   END IF;
   IF NEW.Timestamp IS NULL THEN
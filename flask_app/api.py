@@ -0,0 +1,312 @@
+import asyncio
+import datetime
+import json
+import os
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from flask import Response, abort, request
+from .db import acquire_read, query_all, release_read, replica_allowed
+from .feed import ENTITIES as FEED_ENTITIES, FeedGone, head as feed_head, read_changes
+from .pagination import page_args, offset_arg, keyset_page, ranked_page, approx_count
+from .reports import (dashboard_metrics, dashboard_spend, dept_kpis, category_spend, vendor_performance,
+                      above_average_departments, high_value_approvals, parse_period, period_filter)
+from .search import ENTITIES, entity_search, id_search, REQUEST_PREFIXES, LOG_PREFIXES
+
+PREFIX = '/api/v1'
+
+# URL name -> read model
+REPORTS = {
+    'dept-kpis': dept_kpis,
+    'category-spend': category_spend,
+    'vendor-performance': vendor_performance,
+    'above-average-departments': above_average_departments,
+    'high-value-approvals': high_value_approvals,
+}
+
+# URL name -> (table, SELECT); searchable the same way as the HTML list pages
+LISTS = {
+    'ministry': ('MINISTRY', "SELECT Admin_ID,Name,Role,Email,Phone,Current_Budget,Timestamp FROM MINISTRY"),
+    'departments': ('DEPARTMENT', "SELECT Dept_ID,Name,Location,Budget_Allocation,Current_Budget,Email,Region,Timestamp FROM DEPARTMENT"),
+    'vendors': ('VENDOR', "SELECT Vendor_ID,Company,Category,Country,Email,Phone,Blacklisted,Contract_Expiry_Date FROM VENDOR"),
+    'products': ('PRODUCT', "SELECT Item_ID,Name,Category,Unit_Cost,Manufacturer,Country_of_Origin,Imported,Stock_Available,Vendor_ID FROM PRODUCT"),
+}
+
+REQUESTS_SELECT = (
+    "SELECT pr.Request_ID, pr.Dept_ID, pr.Item_ID, pr.Vendor_ID, pr.Quantity, pr.Total_Cost, pr.Status, "
+    "pr.Date_of_Request, COALESCE(m.Name, pr.Approval_Authority) AS Approval_Authority, pr.Date_of_Approval "
+    "FROM PROCUREMENT_REQUEST pr "
+    "LEFT JOIN MINISTRY m ON pr.Approval_Authority = m.Admin_ID "
+)
+
+# Change feed: long-poll and event-stream pacing. A stream ends after FEED_STREAM_SECONDS and the
+# client reconnects with Last-Event-ID, so no worker thread is held indefinitely.
+FEED_POLL_SECONDS = float(os.environ.get('FEED_POLL_SECONDS', '1'))
+FEED_MAX_WAIT = float(os.environ.get('FEED_MAX_WAIT', '30'))
+FEED_STREAM_SECONDS = float(os.environ.get('FEED_STREAM_SECONDS', '300'))
+FEED_HEARTBEAT_SECONDS = 15.0
+
+_executor = None
+
+
+def _get_executor():
+    # Shared by all requests: Flask runs each async view on its own short-lived event loop,
+    # whose default executor would be created and torn down per request
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=int(os.environ.get('API_QUERY_THREADS', '8')),
+                                       thread_name_prefix='api-query')
+    return _executor
+
+
+def _with_conn(fn, use_replica):
+    # Each concurrent read gets its own pooled connection; a connection runs one statement at a time
+    conn = acquire_read(use_replica)
+    try:
+        return fn(conn)
+    finally:
+        release_read(conn)
+
+
+async def gather_reads(**reads):
+    """Run independent read models concurrently on separate pooled connections; returns {name: rows}."""
+    loop = asyncio.get_running_loop()
+    ex = _get_executor()
+    names = list(reads)
+    # Decided here: the worker threads have no request (or session) to look at
+    use_replica = replica_allowed()
+    results = await asyncio.gather(*(loop.run_in_executor(ex, _with_conn, reads[n], use_replica) for n in names))
+    return dict(zip(names, results))
+
+
+def _plain(v):
+    if isinstance(v, Decimal):
+        # Exact, as the database stores it; clients parse money as decimal strings
+        return str(v)
+    if isinstance(v, (datetime.datetime, datetime.date)):
+        return v.isoformat()
+    if isinstance(v, bytes):
+        return v.decode('utf-8', 'replace')
+    raise TypeError(f'{type(v).__name__} is not JSON serializable')
+
+
+def json_response(payload):
+    """
+    JSON with a strong ETag over the body. A matching If-None-Match gets an empty 304,
+    so pollers only pay for the (mostly cached) reads, not for the transfer.
+    """
+    body = json.dumps(payload, default=_plain, sort_keys=True, separators=(',', ':'))
+    resp = Response(body, mimetype='application/json')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+def _page_payload(page):
+    out = dict(items=page.rows, limit=page.limit, total=page.total)
+    if page.offset is not None:
+        out.update(offset=page.offset, next_offset=page.next_cursor, prev_offset=page.prev_cursor)
+    else:
+        out.update(next=page.next_cursor, prev=page.prev_cursor)
+    return out
+
+
+def _logs_cursor(cursor):
+    # "<Timestamp ISO>,<Log_ID>" as returned in `next`
+    try:
+        ts, log_id = cursor.rsplit(',', 1)
+        return datetime.datetime.fromisoformat(ts), log_id
+    except ValueError:
+        abort(400, description='Invalid cursor')
+
+
+async def _on_primary(fn):
+    # Feed reads go to the primary (see feed.py), one pooled connection per read
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), _with_conn, fn, False)
+
+
+def _feed_args():
+    # Last-Event-ID is how an EventSource resumes after a reconnect
+    raw = request.headers.get('Last-Event-ID', '').strip() or request.args.get('since', '').strip()
+    if raw == 'latest':
+        since = None
+    else:
+        try:
+            since = int(raw)
+        except ValueError:
+            abort(400, description='since must be a position from an earlier response, 0, or latest')
+    _, _, limit = page_args(request.args)
+    entities = tuple(e.strip().upper() for e in request.args.get('entities', '').split(',') if e.strip())
+    unknown = [e for e in entities if e not in FEED_ENTITIES]
+    if unknown:
+        abort(400, description=f"Unknown entity: {', '.join(unknown)}")
+    return since, limit, entities
+
+
+def _feed_gone(e):
+    resp = Response(json.dumps(dict(error=str(e), purged_through=e.purged_through, head=e.head)),
+                    status=410, mimetype='application/json')
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def _feed_events(since, limit, entities):
+    """Server-sent events: one `change` event per change with its position as the event id."""
+    start = last = time.monotonic()
+    yield f"retry: {int(FEED_POLL_SECONDS * 1000)}\n\n"
+    while time.monotonic() - start < FEED_STREAM_SECONDS:
+        conn = acquire_read(False)
+        try:
+            changes, position, more = read_changes(conn, since, limit, entities)
+        except FeedGone as e:
+            yield f"event: gone\ndata: {json.dumps(dict(purged_through=e.purged_through, head=e.head))}\n\n"
+            return
+        finally:
+            release_read(conn)
+        for c in changes:
+            yield f"id: {c['position']}\nevent: change\ndata: {json.dumps(c, default=_plain, separators=(',', ':'))}\n\n"
+        if position != since and not changes:
+            # Only other entities' changes: move the client's Last-Event-ID past them
+            yield f"id: {position}\n\n"
+        if changes or position != since:
+            last = time.monotonic()
+        elif time.monotonic() - last >= FEED_HEARTBEAT_SECONDS:
+            yield ": keep-alive\n\n"
+            last = time.monotonic()
+        since = position
+        if not more:
+            time.sleep(FEED_POLL_SECONDS)
+
+
+def register_api(app):
+    """Versioned read-only JSON API over the dashboard, analytics and list read models."""
+
+    @app.route(f'{PREFIX}/dashboard')
+    async def api_dashboard():
+        data = await gather_reads(metrics=dashboard_metrics, department_spend=dashboard_spend)
+        return json_response(dict(metrics=dict(data['metrics']), department_spend=data['department_spend']))
+
+    @app.route(f'{PREFIX}/analytics')
+    async def api_analytics():
+        # ?only=dept-kpis,high-value-approvals picks sections; all five by default; ?from=&to= limit the period
+        only = [s.strip() for s in request.args.get('only', '').split(',') if s.strip()]
+        unknown = [s for s in only if s not in REPORTS]
+        if unknown:
+            abort(404, description=f"Unknown report: {', '.join(unknown)}")
+        period = parse_period(request.args)
+        data = await gather_reads(**{name: partial(REPORTS[name], period=period) for name in (only or REPORTS)})
+        return json_response(data)
+
+    @app.route(f'{PREFIX}/analytics/<name>')
+    async def api_report(name):
+        if name not in REPORTS:
+            abort(404)
+        data = await gather_reads(rows=partial(REPORTS[name], period=parse_period(request.args)))
+        return json_response(dict(items=data['rows']))
+
+    @app.route(f'{PREFIX}/<name>')
+    async def api_list(name):
+        if name not in LISTS:
+            abort(404)
+        table, sel = LISTS[name]
+        key = ENTITIES[table]['id']
+        q = request.args.get('q', '').strip()
+        after, before, limit = page_args(request.args)
+        offset = offset_arg(request.args)
+
+        def load(conn):
+            plan = entity_search(table, q) if q else None
+            if plan and plan.ranked:
+                page = ranked_page(conn, sel, plan.where, plan.params, plan.order, plan.order_params,
+                                   offset=offset, limit=limit)
+            else:
+                where, params = (plan.where, plan.params) if plan else ('', ())
+                page = keyset_page(conn, sel, key, where, params, after=after, before=before, limit=limit)
+            page.total = None if q else approx_count(conn, table)
+            return page
+
+        page = (await gather_reads(page=load))['page']
+        return json_response(_page_payload(page))
+
+    @app.route(f'{PREFIX}/requests')
+    async def api_requests():
+        q = request.args.get('q', '').strip()
+        order = 'ASC' if request.args.get('sort', 'desc').lower() == 'asc' else 'DESC'
+        after, before, limit = page_args(request.args)
+
+        def load(conn):
+            where, params = '', ()
+            if q:
+                plan = id_search(q, REQUEST_PREFIXES, ('pr.Request_ID', 'pr.Dept_ID'), status_col='pr.Status')
+                where, params = plan.where, plan.params
+            page = keyset_page(conn, REQUESTS_SELECT, 'pr.Request_ID', where, params, order=order,
+                               after=after, before=before, limit=limit)
+            page.total = None if q else approx_count(conn, 'PROCUREMENT_REQUEST')
+            return page
+
+        page = (await gather_reads(page=load))['page']
+        return json_response(_page_payload(page))
+
+    @app.route(f'{PREFIX}/logs')
+    async def api_logs():
+        # Newest first on (Timestamp, Log_ID) (idx_log_ts_id); `after` is the previous page's `next`
+        q = request.args.get('q', '').strip()
+        _, _, limit = page_args(request.args)
+        cursor = request.args.get('after', '').strip()
+        ts, log_id = _logs_cursor(cursor) if cursor else (None, None)
+        period = parse_period(request.args)
+
+        def load(conn):
+            conds, params = [], []
+            if q:
+                plan = id_search(q, LOG_PREFIXES, ('Admin_ID', 'Dept_ID'))
+                conds.append(f"({plan.where})")
+                params.extend(plan.params)
+            if period:
+                where, period_params = period_filter('Timestamp', period)
+                conds.append(where)
+                params.extend(period_params)
+            if cursor:
+                conds.append("Timestamp <= %s AND (Timestamp < %s OR Log_ID < %s)")
+                params.extend([ts, ts, log_id])
+            sql = "SELECT Log_ID,Category,Dept_ID,Request_ID,Admin_ID,Amount,Timestamp FROM BUDGET_LOG"
+            if conds:
+                sql += " WHERE " + " AND ".join(conds)
+            sql += " ORDER BY Timestamp DESC, Log_ID DESC LIMIT %s"
+            return query_all(conn, sql, params + [limit + 1])
+
+        rows = (await gather_reads(rows=load))['rows']
+        more = len(rows) > limit
+        rows = rows[:limit]
+        nxt = f"{rows[-1]['Timestamp'].isoformat()},{rows[-1]['Log_ID']}" if more else None
+        return json_response(dict(items=rows, limit=limit, next=nxt))
+
+    @app.route(f'{PREFIX}/feed')
+    async def api_feed():
+        # ?since=<position> (or `latest`), &limit=, &entities=REQUEST,BUDGET_LOG; &wait=<s> long-polls,
+        # ?stream=1 or Accept: text/event-stream switches to server-sent events
+        since, limit, entities = _feed_args()
+        if since is None:
+            since = await _on_primary(feed_head)
+        if request.args.get('stream') == '1' or request.accept_mimetypes.best == 'text/event-stream':
+            return Response(_feed_events(since, limit, entities), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        try:
+            wait = min(max(float(request.args.get('wait', 0) or 0), 0.0), FEED_MAX_WAIT)
+        except ValueError:
+            abort(400, description='Invalid wait')
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                changes, position, more = await _on_primary(
+                    partial(read_changes, since=since, limit=limit, entities=entities))
+            except FeedGone as e:
+                return _feed_gone(e)
+            left = deadline - time.monotonic()
+            if changes or more or left <= 0:
+                break
+            # Nothing new (or only other entities' changes, which still move the position): wait and re-read
+            since = position
+            await asyncio.sleep(min(FEED_POLL_SECONDS, left))
+        return json_response(dict(changes=changes, position=position, more=more))
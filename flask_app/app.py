@@ -1,52 +1,169 @@
 import os
-from decimal import Decimal, ROUND_HALF_UP
-from flask import Flask, render_template, request, redirect, url_for, flash
-from flask import send_file
+from flask import Flask, render_template, stream_template, request, redirect, url_for, flash, jsonify, get_flashed_messages
+from flask import Response, stream_with_context, send_file, abort
 import csv
 import io
-from .db import get_db, query_all, query_scalar, exec_sql, transactional, close_db
+import re
+import zlib
+from .db import get_db, get_read_db, query_all, exec_sql, close_db, pool_stats, replica_stats, remember_writes, iter_rows, stmt_cache_stats
+from .pagination import page_args, offset_arg, keyset_page, ranked_page, approx_count, RowStream
+from .search import ENTITIES, entity_search
+from .exports import REQUEST_SELECT, export_args, export_query, request_filter, log_query
+from .ids import next_id
+from .workflow import BACKENDS as WORKFLOW_BACKENDS, run_batch, create_request, act_on_request
+from .importer import KINDS as IMPORT_KINDS, import_upload
+from .cli import register_cli
+from .api import register_api
+from .cache import invalidate, get_cache
+from .reports import ANALYTICS, dashboard_data, parse_period
+from .instrument import init_instrumentation, get_metrics, render_metrics
+from .snapshots import init_snapshots, load_snapshots
+from . import money, refdata
+from .jobs import init_jobs, enqueue, get_job, recent_jobs, job_stats, jobs_dir
 
 
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret')
+    # Request create/approve/reject/cancel: in-app statements or one stored-procedure CALL each
+    app.config['WORKFLOW_BACKEND'] = os.environ.get('WORKFLOW_BACKEND', 'python').strip().lower()
+    if app.config['WORKFLOW_BACKEND'] not in WORKFLOW_BACKENDS:
+        raise RuntimeError(f"WORKFLOW_BACKEND must be one of {', '.join(WORKFLOW_BACKENDS)}")
+    # List pages stream rows from an unbuffered cursor into the template as it renders
+    app.config['STREAM_PAGES'] = os.environ.get('STREAM_PAGES', '1') not in ('0', 'false', 'no')
     # Ensure DB connection closes after each request
     app.teardown_appcontext(close_db)
+    # GET pages read from DB_REPLICA_HOSTS when set; a browser's own writes are read back from the primary
+    app.after_request(remember_writes)
+    register_cli(app)
+    register_api(app)
+    init_instrumentation(app)
+    init_snapshots(app)
+    init_jobs(app)
 
-    def export_csv(filename, columns, rows):
-        si = io.StringIO()
-        cw = csv.writer(si)
-        cw.writerow(columns)
-        for r in rows:
-            cw.writerow([r.get(c) for c in columns])
-        mem = io.BytesIO()
-        mem.write(si.getvalue().encode('utf-8'))
-        mem.seek(0)
-        return send_file(mem, mimetype='text/csv', as_attachment=True, download_name=filename)
+    def export_csv(name):
+        # Stream rows straight from an unbuffered cursor; memory stays at one batch
+        db = get_read_db()
+        batch = int(os.environ.get('EXPORT_BATCH_ROWS', '2000'))
+        gz = request.args.get('gzip') in ('1', 'true', 'yes')
+        args = export_args(name, request.args)
+        if request.args.get('async') in ('1', 'true', 'yes'):
+            # Large exports: written to a file by a job worker, downloaded from /jobs when done
+            job_id = enqueue(get_db(), 'export', dict(export=name, args=args, gzip=gz))
+            flash(f'Export queued as job {job_id}', 'info')
+            return redirect(url_for('jobs_page'))
+
+        filename, columns, sql, params = export_query(name, args)
+        rows = iter_rows(db, sql, params, batch)
+        next(rows)  # runs the query up front so SQL errors surface before the 200 is sent
+
+        def generate():
+            buf = io.StringIO()
+            cw = csv.writer(buf)
+            comp = zlib.compressobj(6, zlib.DEFLATED, 31) if gz else None
+            cw.writerow(columns)
+            n = 0
+            for r in rows:
+                cw.writerow(r)
+                n += 1
+                if n % batch == 0:
+                    chunk = buf.getvalue().encode('utf-8')
+                    buf.seek(0)
+                    buf.truncate()
+                    chunk = comp.compress(chunk) if comp else chunk
+                    if chunk:
+                        yield chunk
+            chunk = buf.getvalue().encode('utf-8')
+            if comp:
+                chunk = comp.compress(chunk) + comp.flush()
+            if chunk:
+                yield chunk
+
+        if gz:
+            filename += '.gz'
+        resp = Response(stream_with_context(generate()), mimetype='application/gzip' if gz else 'text/csv')
+        resp.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        return resp
+
+    def render_page(template, **context):
+        # The header and forms go out before the rows are read; output is sent in ~8 KB chunks
+        if not app.config['STREAM_PAGES']:
+            return render_template(template, **context)
+        # Pop flashes now: once streaming starts the session cookie has already been sent
+        get_flashed_messages(with_categories=True)
+
+        def chunks(parts, size=8192):
+            buf, n = [], 0
+            for part in parts:
+                buf.append(part)
+                n += len(part)
+                if n >= size:
+                    yield ''.join(buf)
+                    buf, n = [], 0
+            if buf:
+                yield ''.join(buf)
+        return Response(chunks(stream_template(template, **context)), mimetype='text/html')
+
+    def search_listing(db, entity, sel, q):
+        key = ENTITIES[entity]['id']
+        after, before, limit = page_args(request.args)
+        plan = entity_search(entity, q) if q else None
+        stream = app.config['STREAM_PAGES']
+        # Before the page query: a streamed page keeps the connection busy until it is rendered
+        total = None if q else approx_count(db, entity)
+        if plan and plan.ranked:
+            page = ranked_page(db, sel, plan.where, plan.params, plan.order, plan.order_params,
+                               offset=offset_arg(request.args), limit=limit, stream=stream)
+        else:
+            where, params = (plan.where, plan.params) if plan else ('', ())
+            page = keyset_page(db, sel, key, where, params, after=after, before=before, limit=limit, stream=stream)
+        page.args = dict(q=q) if q else {}
+        page.total = total
+        return page
+
+    @app.route('/stats/pool')
+    def pool_status():
+        # Connection pool counters for sizing DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW
+        return jsonify(pool_stats())
+
+    @app.route('/stats/replicas')
+    def replica_status():
+        # Read replica health, lag and checkouts (DB_REPLICA_HOSTS)
+        return jsonify(replica_stats())
+
+    @app.route('/stats/statements')
+    def statement_cache_status():
+        # Prepared-statement cache counters (DB_STMT_CACHE)
+        return jsonify(stmt_cache_stats())
+
+    @app.route('/stats/cache')
+    def cache_status():
+        return jsonify(get_cache().stats())
+
+    @app.route('/stats/refdata')
+    def refdata_status():
+        # Reference-data snapshot sizes/ages and lookup hit counts
+        return jsonify(refdata.refdata_stats())
+
+    @app.route('/stats/queries')
+    def query_status():
+        # Heaviest statement shapes and the recent slow-query log (DB_INSTRUMENT=1 only)
+        m = get_metrics()
+        if m is None:
+            return jsonify(enabled=False)
+        with m.lock:
+            slow = list(m.slow)
+        return jsonify(enabled=True, slow_ms=m.slow_ms, top=m.top_queries(), slow=slow)
+
+    @app.route('/metrics')
+    def metrics():
+        return render_metrics(pool_stats(), get_cache().stats())
 
     @app.route('/')
     def dashboard():
-        db = get_db()
-        metrics = [
-            ("Departments", "SELECT COUNT(*) FROM DEPARTMENT"),
-            ("Vendors", "SELECT COUNT(*) FROM VENDOR"),
-            ("Products", "SELECT COUNT(*) FROM PRODUCT"),
-            ("Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST"),
-            ("Approved Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST WHERE UPPER(Status)='APPROVED'"),
-            ("Pending Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST WHERE UPPER(Status)='PENDING'"),
-            ("Rejected Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST WHERE UPPER(Status)='REJECTED'"),
-            ("Total Ministry Budget", "SELECT COALESCE(SUM(Current_Budget),0) FROM MINISTRY"),
-            ("Total Dept Budget", "SELECT COALESCE(SUM(Current_Budget),0) FROM DEPARTMENT"),
-        ]
-        data = [(name, query_scalar(db, sql, default=0)) for name, sql in metrics]
-        # Aggregate + nested subquery example: department spend vs remaining
-        spend_rows = query_all(db, (
-            "SELECT d.Dept_ID, d.Name, "
-            "COALESCE((SELECT SUM(Amount) FROM BUDGET_LOG bl WHERE bl.Dept_ID=d.Dept_ID),0) AS Spent, "
-            "COALESCE(d.Current_Budget,0) AS Remaining "
-            "FROM DEPARTMENT d ORDER BY Spent DESC, d.Dept_ID LIMIT 15"
-        ))
-        return render_template('dashboard.html', metrics=data, spend_rows=spend_rows)
+        db = get_read_db()
+        metrics, spend_rows = dashboard_data(db)
+        return render_template('dashboard.html', metrics=metrics, spend_rows=spend_rows)
 
     @app.route('/ministry', methods=['GET','POST'])
     def ministry():
@@ -63,29 +180,22 @@ def create_app():
                 if not name or not email:
                     raise RuntimeError('Name and Email are required')
                 if not aid:
-                    nxt = int(query_scalar(db, "SELECT COALESCE(MAX(CAST(SUBSTRING(Admin_ID,4) AS UNSIGNED)),0)+1 FROM MINISTRY", default=1))
-                    aid = f"DEF{nxt:03d}"
-                if query_scalar(db, "SELECT COUNT(*) FROM MINISTRY WHERE Admin_ID=%s", (aid,), 0):
+                    aid = next_id('DEF')
+                if refdata.admin_name(db, aid) is not None:
                     raise RuntimeError('Admin_ID already exists')
-                exec_sql(db, "INSERT INTO MINISTRY (Admin_ID, Name, Role, Email, Phone, Current_Budget) VALUES (%s,%s,%s,%s,%s,%s)", (aid, name, role, email, phone, float(budget) if budget else 0))
+                exec_sql(db, "INSERT INTO MINISTRY (Admin_ID, Name, Role, Email, Phone, Current_Budget) VALUES (%s,%s,%s,%s,%s,%s)", (aid, name, role, email, phone, money.parse(budget, field='Current_Budget') or money.ZERO))
+                invalidate('MINISTRY', 'REF_MINISTRY')
                 flash(f'Ministry official {name} ({aid}) created','success')
             except Exception as e:
                 flash(str(e),'danger')
             return redirect(url_for('ministry'))
+        db = get_read_db()
         q = request.args.get('q', '').strip()
-        if q:
-            like = f"%{q}%"
-            rows = query_all(db, """
-                SELECT Admin_ID,Name,Role,Email,Phone,Current_Budget,Timestamp
-                FROM MINISTRY
-                WHERE Admin_ID LIKE %s OR Name LIKE %s OR Role LIKE %s OR Email LIKE %s
-                ORDER BY Admin_ID
-            """, (like, like, like, like))
-        else:
-            rows = query_all(db, "SELECT Admin_ID,Name,Role,Email,Phone,Current_Budget,Timestamp FROM MINISTRY ORDER BY Admin_ID")
+        sel = "SELECT Admin_ID,Name,Role,Email,Phone,Current_Budget,Timestamp FROM MINISTRY"
         if 'export' in request.args:
-            return export_csv('ministry.csv', ["Admin_ID","Name","Role","Email","Phone","Current_Budget","Timestamp"], rows)
-        return render_template('ministry.html', rows=rows, q=q)
+            return export_csv('ministry')
+        page = search_listing(db, 'MINISTRY', sel, q)
+        return render_page('ministry.html', rows=page.rows, page=page, q=q)
 
     @app.route('/departments', methods=['GET','POST'])
     def departments():
@@ -102,35 +212,30 @@ def create_app():
                 if not name or not email:
                     raise RuntimeError('Name and Email are required')
                 if not did:
-                    nxt = int(query_scalar(db, "SELECT COALESCE(MAX(CAST(SUBSTRING(Dept_ID,4) AS UNSIGNED)),0)+1 FROM DEPARTMENT", default=1))
-                    did = f"DPT{nxt:03d}"
-                if query_scalar(db, "SELECT COUNT(*) FROM DEPARTMENT WHERE Dept_ID=%s", (did,), 0):
+                    did = next_id('DPT')
+                if refdata.department_exists(db, did):
                     raise RuntimeError('Dept_ID already exists')
                 # Default current budget to allocation when not provided
-                alloc_val = float(alloc) if alloc else 0.0
-                current_val = float(current) if current else alloc_val
+                alloc_val = money.parse(alloc, field='Budget_Allocation') or money.ZERO
+                current_val = money.parse(current, field='Current_Budget')
+                if current_val is None:
+                    current_val = alloc_val
                 exec_sql(db, """
                     INSERT INTO DEPARTMENT (Dept_ID, Name, Location, Budget_Allocation, Current_Budget, Email, Region)
                     VALUES (%s,%s,%s,%s,%s,%s,%s)
                 """, (did, name, location, alloc_val, current_val, email, region))
+                invalidate('DEPARTMENT', 'REF_DEPARTMENT')
                 flash(f'Department {name} ({did}) created','success')
             except Exception as e:
                 flash(str(e),'danger')
             return redirect(url_for('departments'))
+        db = get_read_db()
         q = request.args.get('q', '').strip()
-        if q:
-            like = f"%{q}%"
-            rows = query_all(db, """
-                SELECT Dept_ID,Name,Location,Budget_Allocation,Current_Budget,Email,Region,Timestamp
-                FROM DEPARTMENT
-                WHERE Dept_ID LIKE %s OR Name LIKE %s OR Region LIKE %s
-                ORDER BY Dept_ID
-            """, (like, like, like))
-        else:
-            rows = query_all(db, "SELECT Dept_ID,Name,Location,Budget_Allocation,Current_Budget,Email,Region,Timestamp FROM DEPARTMENT ORDER BY Dept_ID")
+        sel = "SELECT Dept_ID,Name,Location,Budget_Allocation,Current_Budget,Email,Region,Timestamp FROM DEPARTMENT"
         if 'export' in request.args:
-            return export_csv('departments.csv', ["Dept_ID","Name","Location","Budget_Allocation","Current_Budget","Email","Region","Timestamp"], rows)
-        return render_template('departments.html', rows=rows, q=q)
+            return export_csv('departments')
+        page = search_listing(db, 'DEPARTMENT', sel, q)
+        return render_page('departments.html', rows=page.rows, page=page, q=q)
 
     @app.route('/vendors', methods=['GET','POST'])
     def vendors():
@@ -142,12 +247,16 @@ def create_app():
                 aid = request.form.get('admin_id','').strip()
                 if not (vid and aid):
                     flash('Provide Vendor_ID and Admin_ID','danger')
+                elif request.form.get('cascade') == 'on':
+                    # Blacklist and reject the vendor's pending requests in the background
+                    job_id = enqueue(db, 'blacklist', dict(vendor_id=vid, admin_id=aid, backend=app.config['WORKFLOW_BACKEND']))
+                    flash(f'Blacklisting {vid} queued as job {job_id}', 'info')
                 else:
-                    exists = query_scalar(db, "SELECT COUNT(*) FROM MINISTRY WHERE Admin_ID=%s", (aid,), 0)
-                    if not exists:
+                    if refdata.admin_name(db, aid) is None:
                         flash('Unknown Admin_ID','danger')
                     else:
                         exec_sql(db, "UPDATE VENDOR SET Blacklisted=TRUE WHERE Vendor_ID=%s", (vid,))
+                        invalidate('VENDOR', 'REF_VENDOR')
                         flash(f'Vendor {vid} blacklisted','success')
                 return redirect(url_for('vendors'))
             if action == 'create':
@@ -162,30 +271,23 @@ def create_app():
                     if not company or not category:
                         raise RuntimeError('Company and Category are required')
                     if not vid:
-                        nxt = int(query_scalar(db, "SELECT COALESCE(MAX(CAST(SUBSTRING(Vendor_ID,4) AS UNSIGNED)),0)+1 FROM VENDOR", default=1))
-                        vid = f"VEN{nxt:03d}"
+                        vid = next_id('VEN')
                     exec_sql(db, """
                         INSERT INTO VENDOR (Vendor_ID, Company, Category, Country, Email, Phone, Contract_Expiry_Date)
                         VALUES (%s,%s,%s,%s,%s,%s,%s)
                     """, (vid, company, category, country, email, phone, expiry if expiry else None))
+                    invalidate('VENDOR', 'REF_VENDOR')
                     flash(f'Vendor {company} ({vid}) created','success')
                 except Exception as e:
                     flash(str(e),'danger')
                 return redirect(url_for('vendors'))
+        db = get_read_db()
         q = request.args.get('q', '').strip()
-        if q:
-            like = f"%{q}%"
-            rows = query_all(db, """
-                SELECT Vendor_ID,Company,Category,Country,Email,Phone,Blacklisted,Contract_Expiry_Date
-                FROM VENDOR
-                WHERE Vendor_ID LIKE %s OR Company LIKE %s OR Category LIKE %s OR Country LIKE %s
-                ORDER BY Vendor_ID
-            """, (like, like, like, like))
-        else:
-            rows = query_all(db, "SELECT Vendor_ID,Company,Category,Country,Email,Phone,Blacklisted,Contract_Expiry_Date FROM VENDOR ORDER BY Vendor_ID")
+        sel = "SELECT Vendor_ID,Company,Category,Country,Email,Phone,Blacklisted,Contract_Expiry_Date FROM VENDOR"
         if 'export' in request.args:
-            return export_csv('vendors.csv', ["Vendor_ID","Company","Category","Country","Email","Phone","Blacklisted","Contract_Expiry_Date"], rows)
-        return render_template('vendors.html', rows=rows, q=q)
+            return export_csv('vendors')
+        page = search_listing(db, 'VENDOR', sel, q)
+        return render_page('vendors.html', rows=page.rows, page=page, q=q)
 
     @app.route('/products', methods=['GET','POST'])
     def products():
@@ -198,11 +300,11 @@ def create_app():
                 if not (iid and qty.isdigit() and int(qty) > 0):
                     flash('Provide valid Item_ID and positive quantity','danger')
                 else:
-                    ex = query_scalar(db, "SELECT COUNT(*) FROM PRODUCT WHERE Item_ID=%s", (iid,), 0)
-                    if not ex:
+                    if refdata.product(db, iid) is None:
                         flash('Unknown Item_ID','danger')
                     else:
                         exec_sql(db, "UPDATE PRODUCT SET Stock_Available = Stock_Available + %s WHERE Item_ID=%s", (int(qty), iid))
+                        invalidate('PRODUCT')
                         flash(f'Restocked {iid} by {qty}','success')
                 return redirect(url_for('products'))
             if action == 'create':
@@ -219,32 +321,25 @@ def create_app():
                     if not name or not category or not vendor_id:
                         raise RuntimeError('Name, Category and Vendor_ID are required')
                     if not iid:
-                        nxt = int(query_scalar(db, "SELECT COALESCE(MAX(CAST(SUBSTRING(Item_ID,4) AS UNSIGNED)),0)+1 FROM PRODUCT", default=1))
-                        iid = f"PRO{nxt:04d}"
-                    if not query_scalar(db, "SELECT COUNT(*) FROM VENDOR WHERE Vendor_ID=%s", (vendor_id,), 0):
+                        iid = next_id('PRO')
+                    if refdata.vendor_blacklisted(db, vendor_id) is None:
                         raise RuntimeError('Unknown Vendor_ID')
                     exec_sql(db, """
                         INSERT INTO PRODUCT (Item_ID, Name, Category, Unit_Cost, Manufacturer, Country_of_Origin, Imported, Stock_Available, Vendor_ID)
                         VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                    """, (iid, name, category, float(unit_cost) if unit_cost else 0, manufacturer, origin, imported, int(stock) if stock else 0, vendor_id))
+                    """, (iid, name, category, money.parse(unit_cost, 12, money.COST_PLACES, 'Unit_Cost') or money.ZERO, manufacturer, origin, imported, int(stock) if stock else 0, vendor_id))
+                    invalidate('PRODUCT', 'REF_PRODUCT')
                     flash(f'Product {name} ({iid}) created','success')
                 except Exception as e:
                     flash(str(e),'danger')
                 return redirect(url_for('products'))
+        db = get_read_db()
         q = request.args.get('q', '').strip()
-        if q:
-            like = f"%{q}%"
-            rows = query_all(db, """
-                SELECT Item_ID,Name,Category,Unit_Cost,Manufacturer,Country_of_Origin,Imported,Stock_Available,Vendor_ID
-                FROM PRODUCT
-                WHERE Item_ID LIKE %s OR Name LIKE %s OR Category LIKE %s OR Manufacturer LIKE %s
-                ORDER BY Item_ID
-            """, (like, like, like, like))
-        else:
-            rows = query_all(db, "SELECT Item_ID,Name,Category,Unit_Cost,Manufacturer,Country_of_Origin,Imported,Stock_Available,Vendor_ID FROM PRODUCT ORDER BY Item_ID")
+        sel = "SELECT Item_ID,Name,Category,Unit_Cost,Manufacturer,Country_of_Origin,Imported,Stock_Available,Vendor_ID FROM PRODUCT"
         if 'export' in request.args:
-            return export_csv('products.csv', ["Item_ID","Name","Category","Unit_Cost","Manufacturer","Country_of_Origin","Imported","Stock_Available","Vendor_ID"], rows)
-        return render_template('products.html', rows=rows, q=q)
+            return export_csv('products')
+        page = search_listing(db, 'PRODUCT', sel, q)
+        return render_page('products.html', rows=page.rows, page=page, q=q)
 
     @app.route('/requests', methods=['GET','POST'])
     def requests_page():
@@ -260,28 +355,8 @@ def create_app():
                 flash('Invalid input for new request','danger')
             else:
                 try:
-                    with transactional(db):
-                        # Resolve product and vendor
-                        row = query_all(db, "SELECT Vendor_ID, Unit_Cost FROM PRODUCT WHERE Item_ID=%s FOR UPDATE", (iid,))
-                        if not row:
-                            raise RuntimeError('No supplier found for selected product')
-                        vid = row[0]['Vendor_ID']
-                        if vid is None or vid == '':
-                            raise RuntimeError('Product has no linked vendor')
-                        # Check vendor not blacklisted
-                        black = query_scalar(db, "SELECT Blacklisted FROM VENDOR WHERE Vendor_ID=%s FOR UPDATE", (vid,), 0)
-                        if black:
-                            raise RuntimeError('Vendor is blacklisted')
-                        # Generate the next Request_ID (lock table read)
-                        nextn = int(query_scalar(db, "SELECT COALESCE(MAX(CAST(SUBSTRING(Request_ID,4) AS UNSIGNED)),0)+1 FROM PROCUREMENT_REQUEST FOR UPDATE", default=1))
-                        rid = f"REQ{nextn:07d}"
-                        total = query_scalar(db, "SELECT Unit_Cost * %s FROM PRODUCT WHERE Item_ID=%s", (int(qty), iid), 0) or 0
-                        total_dec = Decimal(str(total)).quantize(Decimal('0.00000001'), rounding=ROUND_HALF_UP)
-                        exec_sql(db, """
-                            INSERT INTO PROCUREMENT_REQUEST
-                            (Request_ID, Dept_ID, Item_ID, Vendor_ID, Quantity, Total_Cost, Status, Date_of_Request)
-                            VALUES (%s,%s,%s,%s,%s,%s,'Pending', NOW())
-                        """, (rid, did, iid, vid, int(qty), total_dec))
+                    rid, vid = create_request(db, did, iid, int(qty), app.config['WORKFLOW_BACKEND'])
+                    invalidate('PROCUREMENT_REQUEST')
                     flash(f'Request {rid} created with vendor {vid}','success')
                 except Exception as e:
                     flash(str(e), 'danger')
@@ -296,213 +371,195 @@ def create_app():
             if not (rid and aid):
                 flash('Provide Request_ID and Admin_ID','danger')
                 return redirect(url_for('requests_page'))
-            status = query_scalar(db, "SELECT Status FROM PROCUREMENT_REQUEST WHERE Request_ID=%s", (rid,))
-            if status is None:
-                flash('Unknown Request_ID','danger'); return redirect(url_for('requests_page'))
-            if action == 'approve' and status != 'Pending':
-                flash('Only Pending can be approved','danger'); return redirect(url_for('requests_page'))
-            # New semantics: cancel only for Approved (undo approval)
-            if action == 'cancel' and status != 'Approved':
-                flash('Only Approved can be cancelled','danger'); return redirect(url_for('requests_page'))
-            if action == 'reject' and status != 'Pending':
-                flash('Only Pending can be rejected','danger'); return redirect(url_for('requests_page'))
-            if not query_scalar(db, "SELECT COUNT(*) FROM MINISTRY WHERE Admin_ID=%s", (aid,), 0):
-                flash('Unknown Admin_ID','danger'); return redirect(url_for('requests_page'))
-            # Approve path (transactional updates)
-            if action == 'approve':
-                try:
-                    with transactional(db):
-                        r = query_all(db, "SELECT Dept_ID, Item_ID, Vendor_ID, Quantity, COALESCE(Total_Cost,0) Total_Cost FROM PROCUREMENT_REQUEST WHERE Request_ID=%s FOR UPDATE", (rid,))
-                        if not r:
-                            raise RuntimeError('Request not found')
-                        did, iid, vid, qty, total = r[0]['Dept_ID'], r[0]['Item_ID'], r[0]['Vendor_ID'], int(r[0]['Quantity']), float(r[0]['Total_Cost'])
-                        if total == 0:
-                            total = query_scalar(db, "SELECT Unit_Cost * %s FROM PRODUCT WHERE Item_ID=%s", (qty, iid), 0) or 0
-                        total_dec = Decimal(str(total)).quantize(Decimal('0.00000001'), rounding=ROUND_HALF_UP)
-                        # Effective budget: prefer Current_Budget; if NULL, compute allocation minus approved spend
-                        budget = query_scalar(db, "SELECT Current_Budget FROM DEPARTMENT WHERE Dept_ID=%s FOR UPDATE", (did,))
-                        if budget is None:
-                            budget = query_scalar(db, (
-                                "SELECT COALESCE(d.Budget_Allocation,0) - COALESCE(SUM(pr2.Total_Cost),0) "
-                                "FROM DEPARTMENT d LEFT JOIN PROCUREMENT_REQUEST pr2 ON pr2.Dept_ID=d.Dept_ID AND pr2.Status='Approved' "
-                                "WHERE d.Dept_ID=%s GROUP BY d.Dept_ID"
-                            ), (did,), 0)
-                        budget = float(budget or 0)
-                        stock = int(query_scalar(db, "SELECT Stock_Available FROM PRODUCT WHERE Item_ID=%s FOR UPDATE", (iid,), 0) or 0)
-                        if budget < total:
-                            raise RuntimeError('Insufficient department budget')
-                        if stock < qty:
-                            raise RuntimeError('Insufficient stock')
-                        # Resolve admin name for Approval_Authority display
-                        admin_name = query_scalar(db, "SELECT Name FROM MINISTRY WHERE Admin_ID=%s", (aid,), '') or aid
-                        exec_sql(db, "UPDATE PRODUCT SET Stock_Available = Stock_Available - %s WHERE Item_ID=%s", (qty, iid))
-                        exec_sql(db, "UPDATE DEPARTMENT SET Current_Budget = Current_Budget - %s WHERE Dept_ID=%s", (total_dec, did))
-                        nextn = int(query_scalar(db, "SELECT COALESCE(MAX(CAST(SUBSTRING(Log_ID,4) AS UNSIGNED)),0)+1 FROM BUDGET_LOG", default=1))
-                        log_id = f"BUD{nextn:07d}"
-                        exec_sql(db, "INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)", (log_id, 'Procurement', did, rid, aid, total_dec))
-                        exec_sql(db, "UPDATE PROCUREMENT_REQUEST SET Status='Approved', Date_of_Approval=NOW(), Approval_Authority=%s, Total_Cost=%s WHERE Request_ID=%s", (admin_name, total_dec, rid))
-                    flash('Approved','success')
-                except Exception as e:
-                    flash(str(e),'danger')
-                return redirect(url_for('requests_page'))
-            # Cancel path (undo an approved request fully)
-            if action == 'cancel':
-                try:
-                    with transactional(db):
-                        # Lock the request and related rows
-                        r = query_all(db, "SELECT Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost,0) Total_Cost FROM PROCUREMENT_REQUEST WHERE Request_ID=%s FOR UPDATE", (rid,))
-                        if not r:
-                            raise RuntimeError('Request not found')
-                        did, iid, qty, total = r[0]['Dept_ID'], r[0]['Item_ID'], int(r[0]['Quantity']), float(r[0]['Total_Cost'])
-                        # Restore stock and department budget
-                        exec_sql(db, "UPDATE PRODUCT SET Stock_Available = Stock_Available + %s WHERE Item_ID=%s", (qty, iid))
-                        total_dec = Decimal(str(total)).quantize(Decimal('0.00000001'), rounding=ROUND_HALF_UP)
-                        exec_sql(db, "UPDATE DEPARTMENT SET Current_Budget = Current_Budget + %s WHERE Dept_ID=%s", (total_dec, did))
-                        # Write reversal entry in budget log (negative amount)
-                        nextn = int(query_scalar(db, "SELECT COALESCE(MAX(CAST(SUBSTRING(Log_ID,4) AS UNSIGNED)),0)+1 FROM BUDGET_LOG", default=1))
-                        log_id = f"BUD{nextn:07d}"
-                        rev_amt = -abs(total_dec)
-                        if rev_amt != 0:
-                            exec_sql(db, "INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)", (log_id, 'Reversal', did, rid, aid, rev_amt))
-                        # Finally remove the approved request entry
-                        exec_sql(db, "DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID=%s", (rid,))
-                    flash('Cancelled and reverted successfully','success')
-                except Exception as e:
-                    flash(str(e),'danger')
+            try:
+                act_on_request(db, action, rid, aid, app.config['WORKFLOW_BACKEND'])
+            except Exception as e:
+                flash(str(e),'danger')
                 return redirect(url_for('requests_page'))
-            # Reject (for Pending requests)
-            admin_name = query_scalar(db, "SELECT Name FROM MINISTRY WHERE Admin_ID=%s", (aid,), '') or aid
-            exec_sql(db, "UPDATE PROCUREMENT_REQUEST SET Status='Rejected', Date_of_Approval=NOW(), Approval_Authority=%s WHERE Request_ID=%s", (admin_name, rid))
-            flash('Rejected','success')
+            if action == 'reject':
+                invalidate('PROCUREMENT_REQUEST')
+            else:
+                invalidate('PROCUREMENT_REQUEST', 'DEPARTMENT', 'PRODUCT', 'BUDGET_LOG')
+            flash({'approve': 'Approved', 'cancel': 'Cancelled and reverted successfully', 'reject': 'Rejected'}[action],'success')
             return redirect(url_for('requests_page'))
 
         # GET: render lists and forms
+        db = get_read_db()
         q = request.args.get('q','').strip()
         sort = request.args.get('sort','desc').lower()
         sort = 'asc' if sort == 'asc' else 'desc'
         order_sql = 'ASC' if sort == 'asc' else 'DESC'
-        cols = ["Request_ID","Dept_ID","Item_ID","Vendor_ID","Quantity","Total_Cost","Status","Date_of_Request","Approval_Authority","Date_of_Approval"]
-        base = (
-            "SELECT pr.Request_ID, pr.Dept_ID, pr.Item_ID, pr.Vendor_ID, pr.Quantity, pr.Total_Cost, pr.Status, "
-            "pr.Date_of_Request, COALESCE(m.Name, pr.Approval_Authority) AS Approval_Authority, pr.Date_of_Approval "
-            "FROM PROCUREMENT_REQUEST pr "
-            "LEFT JOIN MINISTRY m ON pr.Approval_Authority = m.Admin_ID "
-        )
+        base = REQUEST_SELECT
         new_id = request.args.get('new','').strip()
-        if q:
-            like = f"%{q}%"
-            rows = query_all(db, base + f"WHERE pr.Request_ID LIKE %s OR pr.Dept_ID LIKE %s OR pr.Status LIKE %s ORDER BY pr.Request_ID {order_sql}", (like, like, like))
-        else:
-            rows = query_all(db, base + f"ORDER BY pr.Request_ID {order_sql}")
-        # Ensure just-created request is present even if not in default window
+        where, params = request_filter(q)
+        if 'export' in request.args:
+            return export_csv('requests')
+        after, before, limit = page_args(request.args)
+        # Everything else this page reads comes first; a streamed page holds the connection while rendering.
+        # Dept/Item fields autocomplete from /autocomplete/<kind> instead of listing every ID
+        total = None if q else approx_count(db, 'PROCUREMENT_REQUEST')
+        officials = refdata.officials(db)
+        # Right after a create the page is buffered, to make sure the new request is on it
+        page = keyset_page(db, base, 'pr.Request_ID', where, params, order=order_sql, after=after, before=before,
+                           limit=limit, stream=app.config['STREAM_PAGES'] and not new_id)
+        page.args = dict(q=q, sort=sort) if q else dict(sort=sort)
+        page.total = total
+        rows = page.rows
+        # Ensure just-created request is present even if not in the current page
         if new_id and not any(r['Request_ID'] == new_id for r in rows):
             single = query_all(db, base + "WHERE pr.Request_ID=%s", (new_id,))
             if single:
                 rows = (rows + single) if sort == 'asc' else (single + rows)
-        if 'export' in request.args:
-            return export_csv('requests.csv', cols, rows)
-        depts = [r['Dept_ID'] for r in query_all(db, "SELECT Dept_ID FROM DEPARTMENT ORDER BY Dept_ID")]
-        items = [r['Item_ID'] for r in query_all(db, "SELECT Item_ID FROM PRODUCT ORDER BY Item_ID")]
-        officials = query_all(db, "SELECT Admin_ID, Name FROM MINISTRY ORDER BY Name")
-        return render_template('requests.html', rows=rows, q=q, sort=sort, depts=depts, items=items, officials=officials)
+        return render_page('requests.html', rows=rows, page=page, q=q, sort=sort, officials=officials)
+
+    @app.route('/autocomplete/<kind>')
+    def autocomplete(kind):
+        # Served from the reference-data snapshots; the DB is only read when one is rebuilt
+        if kind not in refdata.AUTOCOMPLETE:
+            return jsonify(error=f'Unknown kind: {kind}'), 404
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        return jsonify(refdata.autocomplete(get_read_db(), kind, request.args.get('q', ''), limit))
+
+    @app.route('/requests/batch', methods=['POST'])
+    def requests_batch():
+        # Bulk approve/reject/cancel; JSON in -> JSON report out, form in -> flash + redirect
+        db = get_db()
+        payload = request.get_json(silent=True) if request.is_json else None
+        if payload is not None:
+            action = str(payload.get('action', '')).strip()
+            aid = str(payload.get('admin_id', '')).strip()
+            ids = [str(r) for r in payload.get('request_ids') or []]
+        else:
+            action = request.form.get('action', '').strip()
+            aid = request.form.get('admin_id', '').strip()
+            ids = re.split(r'[\s,]+', request.form.get('request_ids', ''))
+        ids = [r.strip() for r in ids if r.strip()]
+        if action not in ('approve', 'reject', 'cancel') or not (aid and ids):
+            if payload is not None:
+                return jsonify(error='Provide action (approve/reject/cancel), admin_id and request_ids'), 400
+            flash('Provide Request_IDs and Admin_ID','danger')
+            return redirect(url_for('requests_page'))
+        if (payload.get('async') if payload is not None else request.form.get('async') == 'on'):
+            job_id = enqueue(db, 'batch', dict(action=action, request_ids=ids, admin_id=aid,
+                                               backend=app.config['WORKFLOW_BACKEND']))
+            if payload is not None:
+                return jsonify(job_id=job_id, status_url=url_for('job_status', job_id=job_id)), 202
+            flash(f'Batch {action} of {len(ids)} requests queued as job {job_id}', 'info')
+            return redirect(url_for('jobs_page'))
+        report = run_batch(db, action, ids, aid, app.config['WORKFLOW_BACKEND'])
+        ok = sum(1 for r in report if r['ok'])
+        if ok:
+            invalidate('PROCUREMENT_REQUEST', 'DEPARTMENT', 'PRODUCT', 'BUDGET_LOG')
+        if payload is not None:
+            return jsonify(action=action, succeeded=ok, failed=len(report) - ok, results=report)
+        done = {'approve': 'Approved', 'reject': 'Rejected', 'cancel': 'Cancelled'}[action]
+        flash(f'{done} {ok} of {len(report)} requests', 'success' if ok == len(report) else 'warning')
+        failed = [f"{r['request_id']}: {r['message']}" for r in report if not r['ok']]
+        if failed:
+            more = f' (+{len(failed) - 10} more)' if len(failed) > 10 else ''
+            flash('; '.join(failed[:10]) + more, 'danger')
+        return redirect(url_for('requests_page'))
+
+    @app.route('/import/<kind>', methods=['POST'])
+    def import_data(kind):
+        # Bulk upsert from an uploaded CSV/JSONL file; the page forms send ui=1 to get flash + redirect
+        page = {'vendors': 'vendors', 'products': 'products', 'departments': 'departments'}.get(kind)
+        upload = request.files.get('file')
+        ui = request.form.get('ui') == '1'
+        if kind not in IMPORT_KINDS or upload is None or not upload.filename:
+            if ui and page:
+                flash('Choose a CSV or JSONL file to import', 'danger')
+                return redirect(url_for(page))
+            return jsonify(error='POST a CSV/JSONL file as "file" to /import/vendors|products|departments'), 400
+        try:
+            result = import_upload(get_db(), kind, upload, infile=request.form.get('infile') == '1')
+        except Exception as e:
+            if ui:
+                flash(f'Import failed: {e}', 'danger')
+                return redirect(url_for(page))
+            return jsonify(error=str(e)), 500
+        if not ui:
+            return jsonify(result.as_dict())
+        flash(f'Imported {result.read - len(result.rejected)} of {result.read} rows '
+              f'({result.inserted} new, {result.updated} updated) at {result.rows_per_sec:,.0f} rows/s',
+              'success' if not result.rejected else 'warning')
+        if result.rejected:
+            shown = [f'line {l}: {m}' for l, _, m in sorted(result.rejected, key=lambda r: r[0])[:10]]
+            more = f' (+{len(result.rejected) - 10} more)' if len(result.rejected) > 10 else ''
+            flash('; '.join(shown) + more, 'danger')
+        return redirect(url_for(page))
+
+    @app.route('/jobs')
+    def jobs_page():
+        return render_template('jobs.html', jobs=recent_jobs(get_db()))
+
+    @app.route('/jobs/<int:job_id>')
+    def job_status(job_id):
+        job = get_job(get_db(), job_id)
+        if job is None:
+            return jsonify(error='Unknown job'), 404
+        job['download_url'] = url_for('job_download', job_id=job_id) if job['Status'] == 'done' and job['Result_Path'] else None
+        del job['Result_Path']
+        return jsonify(job)
+
+    @app.route('/jobs/<int:job_id>/download')
+    def job_download(job_id):
+        job = get_job(get_db(), job_id)
+        path = job and job['Status'] == 'done' and job['Result_Path']
+        if not path or os.path.dirname(os.path.abspath(path)) != os.path.abspath(jobs_dir()) or not os.path.exists(path):
+            abort(404)
+        name = os.path.basename(path).split('-', 2)[-1]
+        return send_file(path, as_attachment=True, download_name=name)
+
+    @app.route('/stats/jobs')
+    def jobs_status():
+        # Queue depth, throughput and queue/run latency over the last `minutes` (default 60)
+        return jsonify(job_stats(get_db(), max(request.args.get('minutes', 60, type=int), 1)))
+
+    @app.route('/reconcile', methods=['POST'])
+    def reconcile_ledger():
+        # Ledger audit runs as a job; the JSON report is the job's download
+        payload = request.get_json(silent=True) if request.is_json else None
+        if payload is not None:
+            correct, aid = bool(payload.get('correct')), str(payload.get('admin_id', '')).strip()
+        else:
+            correct, aid = request.form.get('correct') == 'on', request.form.get('admin_id', '').strip()
+        if correct and not aid:
+            if payload is not None:
+                return jsonify(error='Corrections need an admin_id'), 400
+            flash('Corrections need an Admin_ID', 'danger')
+            return redirect(url_for('jobs_page'))
+        job_id = enqueue(get_db(), 'reconcile', dict(correct=correct, admin_id=aid or None))
+        if payload is not None:
+            return jsonify(job_id=job_id, status_url=url_for('job_status', job_id=job_id)), 202
+        flash(f'Budget reconciliation queued as job {job_id}', 'info')
+        return redirect(url_for('jobs_page'))
 
     @app.route('/logs')
     def logs():
         q = request.args.get('q','').strip()
-        db = get_db()
-        if q:
-            like = f"%{q}%"
-            rows = query_all(db, """
-                SELECT Log_ID,Category,Dept_ID,Request_ID,Admin_ID,Amount,Timestamp
-                FROM BUDGET_LOG
-                WHERE Log_ID LIKE %s OR Dept_ID LIKE %s OR Request_ID LIKE %s OR Admin_ID LIKE %s
-                ORDER BY Timestamp DESC, Log_ID DESC
-                LIMIT 1000
-            """, (like, like, like, like))
-        else:
-            rows = query_all(db, "SELECT Log_ID,Category,Dept_ID,Request_ID,Admin_ID,Amount,Timestamp FROM BUDGET_LOG ORDER BY Timestamp DESC, Log_ID DESC LIMIT 1000")
+        date_from = request.args.get('from', '').strip()
+        date_to = request.args.get('to', '').strip()
+        db = get_read_db()
+        sql, params = log_query(request.args)
         if 'export' in request.args:
-            return export_csv('budget_log.csv', ["Log_ID","Category","Dept_ID","Request_ID","Admin_ID","Amount","Timestamp"], rows)
-        return render_template('logs.html', rows=rows, q=q)
+            # Exports are streamed, so they get the full log rather than the on-screen window
+            return export_csv('budget_log')
+        sql += " LIMIT 1000"
+        rows = RowStream(db, sql, params) if app.config['STREAM_PAGES'] else query_all(db, sql, params)
+        return render_page('logs.html', rows=rows, q=q, date_from=date_from, date_to=date_to)
 
     @app.route('/analytics')
     def analytics():
-        db = get_db()
-        # 1) Department KPIs with joins + conditional aggregates + nested spend
-        dept_kpis = query_all(db, """
-            SELECT d.Dept_ID, d.Name,
-                   COUNT(pr.Request_ID) AS Total_Requests,
-                   SUM(CASE WHEN UPPER(pr.Status)='APPROVED' THEN 1 ELSE 0 END) AS Approved,
-                   SUM(CASE WHEN UPPER(pr.Status)='REJECTED' THEN 1 ELSE 0 END) AS Rejected,
-                   SUM(CASE WHEN UPPER(pr.Status)='PENDING'  THEN 1 ELSE 0 END) AS Pending,
-                   COALESCE((SELECT SUM(bl.Amount) FROM BUDGET_LOG bl WHERE bl.Dept_ID=d.Dept_ID),0) AS Total_Spend,
-                   AVG(pr.Total_Cost) AS Avg_Request_Cost,
-                   MAX(pr.Total_Cost) AS Max_Request_Cost
-            FROM DEPARTMENT d
-            LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Dept_ID = d.Dept_ID
-            GROUP BY d.Dept_ID, d.Name
-            ORDER BY Total_Spend DESC, d.Dept_ID
-        """)
-
-        # 2) Category spend using join PR->PRODUCT and only approved requests
-        cat_spend = query_all(db, """
-            SELECT p.Category,
-                   COUNT(pr.Request_ID) AS Requests,
-                   SUM(CASE WHEN pr.Status='Approved' THEN pr.Total_Cost ELSE 0 END) AS Approved_Spend,
-                   AVG(p.Unit_Cost) AS Avg_Unit_Cost
-            FROM PRODUCT p
-            LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Item_ID = p.Item_ID
-            GROUP BY p.Category
-            ORDER BY Approved_Spend DESC, p.Category
-        """)
-
-        # 3) Vendor performance: product_count (subquery) + spend (join logs)
-        vendor_perf = query_all(db, """
-            SELECT v.Vendor_ID, v.Company,
-                   (SELECT COUNT(*) FROM PRODUCT px WHERE px.Vendor_ID = v.Vendor_ID) AS Product_Count,
-                   COALESCE(SUM(bl.Amount),0) AS Total_Spend
-            FROM VENDOR v
-            LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Vendor_ID = v.Vendor_ID AND pr.Status='Approved'
-            LEFT JOIN BUDGET_LOG bl ON bl.Request_ID = pr.Request_ID
-            GROUP BY v.Vendor_ID, v.Company
-            ORDER BY Total_Spend DESC, Product_Count DESC
-        """)
-
-        # 4) Departments whose spend is above average department spend (nested subquery + HAVING)
-        above_avg_dept = query_all(db, """
-            SELECT d.Dept_ID, d.Name,
-                   COALESCE((SELECT SUM(Amount) FROM BUDGET_LOG bl WHERE bl.Dept_ID=d.Dept_ID),0) AS Spend
-            FROM DEPARTMENT d
-            HAVING Spend > (
-                SELECT AVG(x.sum_amt) FROM (
-                    SELECT COALESCE(SUM(Amount),0) AS sum_amt
-                    FROM BUDGET_LOG bl2
-                    RIGHT JOIN DEPARTMENT d2 ON d2.Dept_ID = bl2.Dept_ID
-                    GROUP BY d2.Dept_ID
-                ) x
-            )
-            ORDER BY Spend DESC
-        """)
-
-        # 5) High value approvals with join to vendor + ministry via budget_log
-        high_value = query_all(db, """
-            SELECT pr.Request_ID, pr.Dept_ID, pr.Item_ID, pr.Vendor_ID, pr.Total_Cost,
-                   v.Company AS Vendor, m.Name AS Approved_By, pr.Date_of_Approval
-            FROM PROCUREMENT_REQUEST pr
-            LEFT JOIN VENDOR v ON v.Vendor_ID = pr.Vendor_ID
-            LEFT JOIN BUDGET_LOG bl ON bl.Request_ID = pr.Request_ID
-            LEFT JOIN MINISTRY m ON m.Admin_ID = bl.Admin_ID
-            WHERE pr.Status='Approved'
-            ORDER BY pr.Total_Cost DESC
-            LIMIT 20
-        """)
-
-        return render_template('analytics.html',
-                               dept_kpis=dept_kpis,
-                               cat_spend=cat_spend,
-                               vendor_perf=vendor_perf,
-                               above_avg_dept=above_avg_dept,
-                               high_value=high_value)
+        db = get_read_db()
+        period = parse_period(request.args)
+        # All-time figures come from the background-refreshed snapshots when there are any;
+        # date ranges (and sections never refreshed) are computed live
+        snaps = {} if period else load_snapshots(db)
+        sections = {name: snaps[name]['rows'] if name in snaps else load(db, period) for name, load in ANALYTICS.items()}
+        as_of = min((s['as_of'] for s in snaps.values()), default=None)
+        return render_template('analytics.html', date_from=request.args.get('from', '').strip(),
+                               date_to=request.args.get('to', '').strip(), as_of=as_of, **sections)
 
     return app
 
@@ -0,0 +1,592 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from .db import query_all
+from .pagination import approx_count
+from .search import ENTITIES, entity_search
+
+
+def percentiles(samples):
+    s = sorted(samples)
+    if not s:
+        return dict(n=0, p50=0.0, p95=0.0, p99=0.0, mean=0.0)
+    pick = lambda p: s[min(len(s) - 1, int(round(p * (len(s) - 1))))]
+    return dict(n=len(s), p50=pick(0.50), p95=pick(0.95), p99=pick(0.99), mean=sum(s) / len(s))
+
+
+def time_ms(fn, rounds):
+    out = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def bench_search(conn, rounds=20, limit=100):
+    """
+    Compare the old `LIKE '%q%'` search with the planned one (ID prefix / FULLTEXT)
+    for an ID-shaped and a word-shaped query per entity. Returns one row per case.
+    """
+    results = []
+    for entity, spec in ENTITIES.items():
+        cols = (spec['id'],) + spec['text']
+        sample = query_all(conn, f"SELECT {','.join(cols)} FROM {entity} LIMIT 50")
+        if not sample:
+            continue
+        row = random.choice(sample)
+        words = [w for c in spec['text'] for w in re.findall(r'\w{4,}', str(row[c] or ''))]
+        cases = [('id', str(row[spec['id']])[:5])]
+        if words:
+            cases.append(('text', random.choice(words)))
+        total = approx_count(conn, entity)
+        for kind, q in cases:
+            like = f"%{q}%"
+            legacy_sql = (f"SELECT {','.join(cols)} FROM {entity} WHERE "
+                          + " OR ".join(f"{c} LIKE %s" for c in cols) + f" ORDER BY {spec['id']} LIMIT {limit}")
+            legacy = time_ms(lambda: query_all(conn, legacy_sql, (like,) * len(cols)), rounds)
+            plan = entity_search(entity, q)
+            order = plan.order if plan.ranked else spec['id']
+            new_sql = f"SELECT {','.join(cols)} FROM {entity} WHERE {plan.where} ORDER BY {order} LIMIT {limit}"
+            new = time_ms(lambda: query_all(conn, new_sql, plan.params + plan.order_params), rounds)
+            results.append(dict(entity=entity, rows=total, kind=kind, q=q,
+                                legacy=percentiles(legacy), planned=percentiles(new)))
+    return results
+
+
+class _TestClient:
+    """In-process client: requests run in this thread, so their statements can be counted."""
+
+    def __init__(self, app):
+        self._c = app.test_client()
+
+    def request(self, method, path, data=None):
+        resp = self._c.open(path, method=method, data=data, buffered=False)
+        size = sum(len(chunk) for chunk in resp.iter_encoded())
+        resp.close()
+        return resp.status_code, size
+
+
+class _HttpClient:
+    """Client for a running server (gunicorn etc.); redirects are not followed."""
+
+    def __init__(self, base_url):
+        import urllib.request
+
+        class NoRedirect(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *a, **kw):
+                return None
+
+        self._base = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(NoRedirect)
+
+    def request(self, method, path, data=None):
+        import urllib.error
+        import urllib.parse
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self._opener.open(self._base + path, data=body, timeout=300) as resp:
+                return resp.status, len(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read() or b'')
+
+
+class _Workload:
+    """IDs to drive the routes with, sampled once; approve/cancel queues are shared by all clients."""
+
+    def __init__(self, conn, sample=2000):
+        self.depts = [r['Dept_ID'] for r in query_all(conn, "SELECT Dept_ID FROM DEPARTMENT LIMIT %s", (sample,))]
+        self.items = [r['Item_ID'] for r in query_all(conn, (
+            "SELECT p.Item_ID FROM PRODUCT p JOIN VENDOR v ON v.Vendor_ID = p.Vendor_ID "
+            "WHERE v.Blacklisted = FALSE LIMIT %s"), (sample,))]
+        self.admins = [r['Admin_ID'] for r in query_all(conn, "SELECT Admin_ID FROM MINISTRY")]
+        self.requests = [r['Request_ID'] for r in query_all(conn, (
+            "SELECT Request_ID FROM PROCUREMENT_REQUEST ORDER BY Request_ID DESC LIMIT %s"), (sample,))]
+        self.pending = deque(r['Request_ID'] for r in query_all(conn, (
+            "SELECT Request_ID FROM PROCUREMENT_REQUEST WHERE Status='Pending' LIMIT %s"), (sample,)))
+        self.approved = deque()
+        words = query_all(conn, "SELECT Name FROM PRODUCT LIMIT 200")
+        self.words = sorted({w for r in words for w in re.findall(r'[A-Za-z]{4,}', r['Name'])}) or ['radar']
+
+
+def _pop(q):
+    try:
+        return q.popleft()
+    except IndexError:
+        return None
+
+
+def _ops(w):
+    """(name, weight, fn(client, rng)) for each route the driver exercises."""
+    def get(path):
+        return lambda c, rng: c.request('GET', path(rng) if callable(path) else path)
+
+    def create(c, rng):
+        return c.request('POST', '/requests', dict(action='create', dept_id=rng.choice(w.depts),
+                                                   item_id=rng.choice(w.items), qty=str(rng.randint(1, 5))))
+
+    def approve(c, rng):
+        rid = _pop(w.pending)
+        if rid is None:
+            return create(c, rng)
+        res = c.request('POST', '/requests', dict(action='approve', request_id=rid, admin_id=rng.choice(w.admins)))
+        w.approved.append(rid)
+        return res
+
+    def cancel(c, rng):
+        rid = _pop(w.approved)
+        if rid is None:
+            return approve(c, rng)
+        return c.request('POST', '/requests', dict(action='cancel', request_id=rid, admin_id=rng.choice(w.admins)))
+
+    return [
+        ('dashboard', 5, get('/')),
+        ('list.requests', 15, get('/requests')),
+        ('list.requests.page', 10, get(lambda rng: f'/requests?after={rng.choice(w.requests)}')),
+        ('list.products', 5, get('/products')),
+        ('list.vendors', 3, get('/vendors')),
+        ('list.logs', 5, get('/logs')),
+        ('analytics', 3, get('/analytics')),
+        ('search.id', 8, get(lambda rng: f'/requests?q={rng.choice(w.requests)[:8]}')),
+        ('search.text', 8, get(lambda rng: f'/products?q={rng.choice(w.words)}')),
+        ('export.requests', 1, get(lambda rng: f'/requests?export=1&q={rng.choice(w.depts)}')),
+        ('create', 15, create),
+        ('approve', 15, approve),
+        ('cancel', 7, cancel),
+    ]
+
+
+def bench_routes(app, conn, clients=8, duration=30.0, base_url=None, only=None, seed=1):
+    """
+    Drive the app with `clients` concurrent clients for `duration` seconds using a
+    weighted mix of reads and writes. Returns per-operation latency percentiles,
+    throughput, error counts and (in-process only) DB round-trips per request.
+    """
+    from .db import capture_statements
+    work = _Workload(conn)
+    ops = [op for op in _ops(work) if not only or op[0] in only]
+    if not ops:
+        raise ValueError('No operations selected')
+    names, weights, fns = zip(*ops)
+    samples = {n: [] for n in names}
+    stmts = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(k):
+        rng = random.Random(seed * 1000 + k)
+        client = _HttpClient(base_url) if base_url else _TestClient(app)
+        while time.monotonic() < deadline:
+            i = rng.choices(range(len(fns)), weights=weights)[0]
+            with capture_statements() as log:
+                t0 = time.perf_counter()
+                try:
+                    status, _ = fns[i](client, rng)
+                except Exception:
+                    status = 599
+                ms = (time.perf_counter() - t0) * 1000.0
+            with lock:
+                samples[names[i]].append(ms)
+                stmts[names[i]].append(log.round_trips)
+                if status >= 500:
+                    errors[names[i]] += 1
+
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(k,), daemon=True) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+
+    def summary(ms, rt, err):
+        out = percentiles(ms)
+        out.update(rps=len(ms) / elapsed if elapsed else 0.0, errors=err,
+                   round_trips=None if base_url or not rt else sum(rt) / len(rt))
+        return out
+
+    return dict(
+        meta=dict(started=time.strftime('%Y-%m-%dT%H:%M:%S'), clients=clients, duration=elapsed,
+                  target=base_url or 'test-client',
+                  rows={t: approx_count(conn, t) for t in ('DEPARTMENT', 'VENDOR', 'PRODUCT',
+                                                             'PROCUREMENT_REQUEST', 'BUDGET_LOG')}),
+        total=summary([x for n in names for x in samples[n]], [x for n in names for x in stmts[n]],
+                      sum(errors.values())),
+        ops={n: summary(samples[n], stmts[n], errors[n]) for n in names if samples[n]},
+    )
+
+
+def bench_workflow(conn, rounds=50, batch=100, backends=('python', 'procedures')):
+    """
+    Time create/approve/cancel/reject of one request, and approve/cancel of `batch`
+    requests at once, through each workflow backend. Runs on the caller's connection
+    against the best-funded department and best-stocked product; approved requests
+    are cancelled again and the rejected ones deleted, but the BUDGET_LOG entries stay.
+    Returns {backend: {action: percentiles + statements and round-trips per call}}.
+    """
+    from .db import capture_statements, exec_sql, query_row
+    from .workflow import act_on_request, create_request, run_batch
+    did = query_row(conn, "SELECT Dept_ID FROM DEPARTMENT ORDER BY Current_Budget DESC LIMIT 1")[0]
+    iid, stock = query_row(conn, (
+        "SELECT p.Item_ID, p.Stock_Available FROM PRODUCT p JOIN VENDOR v ON v.Vendor_ID = p.Vendor_ID "
+        "WHERE v.Blacklisted = FALSE ORDER BY p.Stock_Available DESC LIMIT 1"))
+    aid = query_row(conn, "SELECT Admin_ID FROM MINISTRY ORDER BY Admin_ID LIMIT 1")[0]
+    if stock < batch:
+        raise ValueError(f'{iid} has only {stock} units in stock; lower --batch')
+    out = {}
+    for backend in backends:
+        samples, stmts, trips, rejected = {}, {}, {}, []
+
+        def timed(name, fn):
+            with capture_statements() as log:
+                t0 = time.perf_counter()
+                res = fn()
+                samples.setdefault(name, []).append((time.perf_counter() - t0) * 1000.0)
+            stmts.setdefault(name, []).append(len(log))
+            trips.setdefault(name, []).append(log.round_trips)
+            return res
+
+        for _ in range(rounds):
+            rid, _ = timed('create', lambda: create_request(conn, did, iid, 1, backend))
+            timed('approve', lambda: act_on_request(conn, 'approve', rid, aid, backend))
+            timed('cancel', lambda: act_on_request(conn, 'cancel', rid, aid, backend))
+            rid, _ = create_request(conn, did, iid, 1, backend)
+            timed('reject', lambda: act_on_request(conn, 'reject', rid, aid, backend))
+            rejected.append(rid)
+        ids = [create_request(conn, did, iid, 1, backend)[0] for _ in range(batch)]
+        for action in ('approve', 'cancel'):
+            report = timed(f'batch.{action}', lambda: run_batch(conn, action, ids, aid, backend))
+            failed = [r for r in report if not r['ok']]
+            if failed:
+                raise RuntimeError(f"{backend} batch {action}: {failed[0]['request_id']}: {failed[0]['message']}")
+        for i in range(0, len(rejected), 500):
+            chunk = rejected[i:i + 500]
+            exec_sql(conn, f"DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID IN ({','.join(['%s'] * len(chunk))})", chunk)
+        out[backend] = {name: dict(percentiles(ms), statements=sum(stmts[name]) / len(stmts[name]),
+                                   round_trips=sum(trips[name]) / len(trips[name]))
+                        for name, ms in samples.items()}
+    return out
+
+
+def bench_approvals(conn, levels=(1, 8, 32, 128), requests=2000, backends=('python', 'optimistic')):
+    """
+    Approval throughput under contention: `requests` Pending requests for the best-funded
+    department and best-stocked product are approved by N parallel clients (each with its
+    own connection), for every N in `levels` and every workflow backend. Approved requests
+    are cancelled again afterwards and leftovers deleted. Returns
+    {backend: {N: dict(approvals_per_sec, p50/p95/p99 ms, ok, errors by message, retries)}}.
+    """
+    from .db import ConnectionPool, _conn_params, exec_sql, query_row, retry_stats
+    from .workflow import act_on_request, create_request, run_batch
+    did, budget = query_row(conn, "SELECT Dept_ID, Current_Budget FROM DEPARTMENT ORDER BY Current_Budget DESC LIMIT 1")
+    iid, stock, cost = query_row(conn, (
+        "SELECT p.Item_ID, p.Stock_Available, p.Unit_Cost FROM PRODUCT p JOIN VENDOR v ON v.Vendor_ID = p.Vendor_ID "
+        "WHERE v.Blacklisted = FALSE ORDER BY p.Stock_Available DESC LIMIT 1"))
+    aid = query_row(conn, "SELECT Admin_ID FROM MINISTRY ORDER BY Admin_ID LIMIT 1")[0]
+    if stock < requests or (budget or 0) < requests * (cost or 0):
+        raise ValueError(f'{did}/{iid} cannot cover {requests} approvals; lower --requests')
+    # Dedicated pool: one connection per client, so the app pool's size doesn't cap concurrency
+    pool = ConnectionPool(_conn_params(), size=max(levels), max_overflow=0)
+    out = {}
+    for backend in backends:
+        out[backend] = {}
+        for clients in levels:
+            ids = deque(create_request(conn, did, iid, 1)[0] for _ in range(requests))
+            created = list(ids)
+            lock = threading.Lock()
+            samples, errors, approved = [], {}, []
+
+            def client():
+                c = pool.acquire()
+                try:
+                    while True:
+                        rid = _pop(ids)
+                        if rid is None:
+                            return
+                        t0 = time.perf_counter()
+                        try:
+                            act_on_request(c, 'approve', rid, aid, backend)
+                            ok, msg = True, None
+                        except Exception as e:
+                            ok, msg = False, str(e)
+                        ms = (time.perf_counter() - t0) * 1000.0
+                        with lock:
+                            samples.append(ms)
+                            if ok:
+                                approved.append(rid)
+                            else:
+                                errors[msg] = errors.get(msg, 0) + 1
+                finally:
+                    pool.release(c)
+
+            before = retry_stats()
+            threads = [threading.Thread(target=client) for _ in range(clients)]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - t0
+            after = retry_stats()
+            out[backend][clients] = dict(
+                percentiles(samples), ok=len(approved), errors=errors,
+                approvals_per_sec=len(approved) / elapsed if elapsed else 0.0,
+                retries=after['retries'] - before['retries'], gave_up=after['gave_up'] - before['gave_up'],
+            )
+            run_batch(conn, 'cancel', approved, aid)
+            done = set(approved)
+            leftover = [rid for rid in created if rid not in done]
+            for i in range(0, len(leftover), 500):
+                chunk = leftover[i:i + 500]
+                exec_sql(conn, f"DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID IN ({','.join(['%s'] * len(chunk))})", chunk)
+    return out
+
+
+def bench_partitions(conn, rounds=10, month=None):
+    """
+    Time month-bounded BUDGET_LOG reads written so MySQL can prune partitions (a plain
+    Timestamp range) against the same reads with the month test wrapped in a function,
+    which has to visit every partition. `month` defaults to last month. Returns one row
+    per case with percentiles and the partitions each plan touches.
+    """
+    import datetime
+    from .db import query_scalar
+    from .partitions import add_months, list_partitions, month_start
+    start = month or add_months(month_start(datetime.date.today()), -1)
+    end = add_months(start, 1)
+    dept = query_scalar(conn, "SELECT Dept_ID FROM BUDGET_LOG WHERE Timestamp >= %s AND Timestamp < %s "
+                              "AND Dept_ID IS NOT NULL LIMIT 1", (start, end))
+    pruned = ("Timestamp >= %s AND Timestamp < %s", (start, end))
+    unpruned = ("DATE_FORMAT(Timestamp, '%%Y-%%m') = %s", (f'{start:%Y-%m}',))
+    cases = [
+        ('month spend by dept', "SELECT Dept_ID, SUM(Amount), COUNT(*) FROM BUDGET_LOG WHERE {} GROUP BY Dept_ID", ()),
+        ('month log page', "SELECT Log_ID,Category,Dept_ID,Request_ID,Admin_ID,Amount,Timestamp FROM BUDGET_LOG "
+                           "WHERE Dept_ID = %s AND {} ORDER BY Timestamp DESC, Log_ID DESC LIMIT 1000", (dept,)),
+    ]
+
+    def touched(sql, params):
+        plan = query_all(conn, 'EXPLAIN ' + sql, params)
+        return sum(len((r.get('partitions') or '').split(',')) for r in plan if r.get('partitions'))
+
+    total = len(list_partitions(conn, 'BUDGET_LOG'))
+    results = []
+    for name, template, head in cases:
+        row = dict(case=name, month=f'{start:%Y-%m}', rows=approx_count(conn, 'BUDGET_LOG'), partitions=total)
+        for kind, (cond, params) in (('pruned', pruned), ('full', unpruned)):
+            sql, args = template.format(cond), head + params
+            ms = time_ms(lambda: query_all(conn, sql, args), rounds)
+            row[kind] = dict(percentiles(ms), partitions=touched(sql, args))
+        results.append(row)
+    return results
+
+
+def bench_money(ops=200000, trials=2000, seed=1):
+    """
+    Micro-benchmark of one budget check-and-deduct the way the approval paths used to do it
+    (float compare, then Decimal(str()) quantize) against money.py's Decimal and integer-unit
+    forms and the batch approval's workflow.allocate(), plus seeded checks of the money
+    invariants that drive workflow.allocate() and workflow.release(). Each check also counts
+    how often the float path gets it wrong, for comparison. Needs no database.
+    """
+    from decimal import Decimal, ROUND_HALF_UP
+    from . import money
+    from .workflow import allocate, release
+    rnd = random.Random(seed)
+
+    def rand_cost():
+        return Decimal(rnd.randint(1, 10 ** 9)).scaleb(-2)
+
+    def rand_budget():
+        return Decimal(rnd.randint(10 ** 11, 10 ** 17)).scaleb(-8)
+
+    pairs = [(rand_budget(), rand_cost()) for _ in range(min(ops, 10000))]
+    q8 = Decimal('0.00000001')
+
+    def legacy():
+        for budget, total in pairs:
+            t = float(total)
+            if float(budget) >= t:
+                budget - Decimal(str(t)).quantize(q8, rounding=ROUND_HALF_UP)
+
+    def decimal_path():
+        for budget, total in pairs:
+            t = money.cost(total)
+            if budget >= t:
+                budget - t
+
+    def units_path():
+        for budget, total in pairs:
+            b, t = money.to_units(budget), money.to_units(total)
+            if b >= t:
+                b - t
+
+    def units_only():
+        # Bulk approvals convert once per row, then only add/compare integers
+        for b, t in unit_pairs:
+            if b >= t:
+                b - t
+
+    def allocate_path():
+        # One department and product per row, so every row is a fresh check-and-deduct
+        allocate(alloc_rows, alloc_budgets, alloc_products)
+
+    unit_pairs = [(money.to_units(b), money.to_units(t)) for b, t in pairs]
+    alloc_rows = [dict(Request_ID=n, Dept_ID=n, Item_ID=n, Quantity=1, Total_Cost=t) for n, (_, t) in enumerate(pairs)]
+    alloc_budgets = {n: b for n, (b, _) in enumerate(pairs)}
+    alloc_products = {n: dict(Stock_Available=1, Unit_Cost=t) for n, (_, t) in enumerate(pairs)}
+    reps = max(1, ops // len(pairs))
+    timings = {}
+    for name, fn in (('float+quantize', legacy), ('decimal', decimal_path), ('units', units_path),
+                     ('units (pre-converted)', units_only), ('workflow.allocate', allocate_path)):
+        ms = time_ms(fn, reps)
+        timings[name] = round(sum(ms) * 1e6 / (reps * len(pairs)), 1)  # ns per op
+
+    checks = {}
+
+    def check(name, trial):
+        fails = float_fails = 0
+        for _ in range(trials):
+            ok, float_ok = trial()
+            fails += not ok
+            float_fails += not float_ok
+        checks[name] = dict(trials=trials, failures=fails, float_failures=float_fails)
+
+    def rand_batch():
+        depts = {f'DPT{i}': rand_budget() for i in range(rnd.randint(1, 4))}
+        products = {f'PRO{i}': dict(Stock_Available=rnd.randint(0, 400), Unit_Cost=rand_cost())
+                    for i in range(rnd.randint(1, 4))}
+        rows = [dict(Request_ID=f'REQ{n}', Dept_ID=rnd.choice(list(depts)), Item_ID=rnd.choice(list(products)),
+                     Quantity=rnd.randint(1, 20), Total_Cost=rand_cost() if rnd.random() < 0.8 else Decimal(0))
+                for n in range(rnd.randint(1, 50))]
+        return depts, products, rows
+
+    def approve_cancel_round_trip():
+        # Approve a random batch with allocate(), then cancel what it approved, in random order,
+        # with release(): budgets and stock never go negative and come back exactly
+        depts, products, rows = rand_batch()
+        out, approved, spend, used = allocate(rows, depts, products)
+        ok = (all(depts[d] - s >= 0 for d, s in spend.items())
+              and all(products[i]['Stock_Available'] - q >= 0 for i, q in used.items())
+              and sum(s for s in spend.values()) == sum(t for _, _, t in approved))
+        totals = {rid: t for rid, _, t in approved}
+        done = [dict(r, Total_Cost=totals[r['Request_ID']]) for r in rows if out[r['Request_ID']] is None]
+        rnd.shuffle(done)
+        refund, restock, reversals = release(done)
+        ok = (ok and all(depts[d] - spend.get(d, 0) + refund.get(d, 0) == depts[d] for d in depts)
+              and restock == used and sum(a for _, _, a in reversals) == -sum(refund.values()))
+        # The same batch the float way: compare, deduct, add back
+        fb = {d: float(b) for d, b in depts.items()}
+        stock = {i: p['Stock_Available'] for i, p in products.items()}
+        taken = []
+        for r in rows:
+            t = float(money.cost(r['Total_Cost']) or money.line_total(products[r['Item_ID']]['Unit_Cost'], r['Quantity']))
+            if fb[r['Dept_ID']] >= t and stock[r['Item_ID']] >= r['Quantity']:
+                fb[r['Dept_ID']] -= t
+                stock[r['Item_ID']] -= r['Quantity']
+                taken.append((r['Dept_ID'], t))
+        rnd.shuffle(taken)
+        for d, t in taken:
+            fb[d] += t
+        return ok, all(Decimal(repr(fb[d])).quantize(q8) == depts[d] for d in depts)
+
+    def exact_boundary():
+        # A budget equal to the cost is enough; one unit less is not. Costs go up to the
+        # DECIMAL(20,8) range, where a float can no longer tell the two budgets apart.
+        c = Decimal(rnd.randint(10 ** 8, 10 ** 14)).scaleb(-2)
+        exact, short = money.amount(c), money.amount(c) - q8
+        row = dict(Request_ID='REQ1', Dept_ID='DPT1', Item_ID='PRO1', Quantity=1, Total_Cost=c)
+        stock = {'PRO1': dict(Stock_Available=1, Unit_Cost=c)}
+        fits = allocate([row], {'DPT1': exact}, stock)[0]['REQ1'] is None
+        refused = allocate([row], {'DPT1': short}, stock)[0]['REQ1'] == 'Insufficient department budget'
+        return fits and refused, float(exact) >= float(c) and not float(short) >= float(c)
+
+    def unit_sums():
+        vals = [money.amount(Decimal(rnd.randint(-10 ** 15, 10 ** 15)).scaleb(-8)) for _ in range(100)]
+        exact = sum(vals, Decimal(0))
+        return money.from_units(money.sum_units(vals)) == exact, Decimal(repr(sum(float(v) for v in vals))).quantize(q8) == exact
+
+    def line_totals():
+        unit, qty = rand_cost(), rnd.randint(1, 10 ** 4)
+        return money.line_total(unit, qty) == unit * qty, Decimal(repr(float(unit) * qty)).quantize(Decimal('0.01')) == unit * qty
+
+    check('approve/cancel round trip', approve_cancel_round_trip)
+    check('exact budget boundary', exact_boundary)
+    check('integer-unit sums', unit_sums)
+    check('line totals', line_totals)
+    return dict(ns_per_op=timings, checks=checks)
+
+
+def bench_streaming(app, paths=('/requests?limit=500', '/logs'), rounds=5):
+    """
+    Time-to-first-byte, total time and peak memory of list pages rendered whole
+    (STREAM_PAGES off) and streamed (on), through the in-process test client.
+    Peak memory is the Python heap high-water mark during one request (tracemalloc),
+    measured on a separate pass so tracing does not inflate the timings. Process RSS is
+    reported too, but it rarely shrinks once grown, so only the heap figure is per request.
+    """
+    import resource
+    import tracemalloc
+    client = app.test_client()
+    saved = app.config['STREAM_PAGES']
+
+    def fetch(path):
+        t0 = time.perf_counter()
+        resp = client.get(path, buffered=False)
+        it = iter(resp.response)
+        first = next(it, b'')
+        ttfb = time.perf_counter() - t0
+        size = len(first) + sum(len(chunk) for chunk in it)
+        resp.close()
+        return ttfb * 1000.0, (time.perf_counter() - t0) * 1000.0, size, resp.status_code
+
+    results = []
+    try:
+        for path in paths:
+            row = dict(path=path)
+            for mode, on in (('buffered', False), ('streamed', True)):
+                app.config['STREAM_PAGES'] = on
+                fetch(path)  # warm caches and reference data
+                ttfb, total, size = [], [], 0
+                for _ in range(rounds):
+                    a, b, size, status = fetch(path)
+                    ttfb.append(a)
+                    total.append(b)
+                tracemalloc.start()
+                tracemalloc.reset_peak()
+                fetch(path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                row[mode] = dict(ttfb=percentiles(ttfb), total=percentiles(total), bytes=size, status=status,
+                                 heap_peak_kb=round(peak / 1024.0, 1),
+                                 max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+            results.append(row)
+    finally:
+        app.config['STREAM_PAGES'] = saved
+    return results
+
+
+def save_results(result, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True, default=str)
+
+
+def compare_results(old, new):
+    """
+    Per operation: (name, old p50, new p50, old p95, new p95, p95 change in %, old round-trips,
+    new round-trips); round-trips are None where a run had none (--url).
+    """
+    rows = []
+    for name, cur in sorted(new['ops'].items()):
+        prev = old.get('ops', {}).get(name)
+        if prev is None:
+            continue
+        change = (cur['p95'] - prev['p95']) / prev['p95'] * 100.0 if prev['p95'] else 0.0
+        rows.append((name, prev['p50'], cur['p50'], prev['p95'], cur['p95'], change,
+                     prev.get('round_trips'), cur.get('round_trips')))
+    return rows
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from . import jsoncodec
+
+
+class LocalBackend:
+    """In-process LRU with per-entry TTL. Each gunicorn worker has its own copy."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._gens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return False, None
+            expires, value = hit
+            if expires < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._gens.get(t, 0) for t in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for t in tags:
+                self._gens[t] = self._gens.get(t, 0) + 1
+
+    def size(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Shared backend so invalidations made by one worker are seen by all of them. Values are stored as
+    JSON (jsoncodec), so whoever can write to the Redis cannot make the workers run code.
+    """
+
+    def __init__(self, url, prefix='defdb:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('CACHE_REDIS_URL is set but the redis package is not installed') from e
+        self._r = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._r.get(self._prefix + key)
+        if raw is None:
+            return False, None
+        try:
+            return True, jsoncodec.loads(raw)
+        except ValueError:
+            # Not ours (or an older format): a miss, and the next set() overwrites it
+            return False, None
+
+    def set(self, key, value, ttl):
+        try:
+            raw = jsoncodec.dumps(value)
+        except TypeError:
+            return
+        self._r.set(self._prefix + key, raw, ex=max(1, int(ttl)))
+
+    def generations(self, tags):
+        vals = self._r.mget([f'{self._prefix}gen:{t}' for t in tags])
+        return [int(v or 0) for v in vals]
+
+    def bump(self, tags):
+        pipe = self._r.pipeline()
+        for t in tags:
+            pipe.incr(f'{self._prefix}gen:{t}')
+        pipe.execute()
+
+    def size(self):
+        return None
+
+
+class QueryCache:
+    """
+    Read-model cache keyed per query.
+
+    Every entry is tagged with the tables it reads. The cache key embeds the
+    current generation of each tag, so `invalidate('BUDGET_LOG')` makes every
+    entry built from BUDGET_LOG unreachable at once; stale entries then age out
+    of the LRU/TTL. A TTL of 0 disables caching.
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, invalidations=0)
+
+    def get_or_load(self, name, tags, loader, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or getattr(_bypass, 'on', False):
+            return loader()
+        gens = self.backend.generations(tags)
+        key = name + '@' + '.'.join(f'{t}{g}' for t, g in zip(tags, gens))
+        found, value = self.backend.get(key)
+        self._count('hits' if found else 'misses')
+        if found:
+            return value
+        value = loader()
+        self.backend.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *tags):
+        if tags:
+            self.backend.bump(tags)
+            self._count('invalidations')
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        total = s['hits'] + s['misses']
+        s['hit_ratio'] = s['hits'] / total if total else 0.0
+        s['entries'] = self.backend.size()
+        s['backend'] = type(self.backend).__name__
+        s['ttl'] = self.ttl
+        return s
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_bypass = threading.local()
+
+
+@contextmanager
+def bypass_cache():
+    """Run read models on the calling thread without reading or filling the cache."""
+    prev = getattr(_bypass, 'on', False)
+    _bypass.on = True
+    try:
+        yield
+    finally:
+        _bypass.on = prev
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                url = os.environ.get('CACHE_REDIS_URL')
+                backend = RedisBackend(url) if url else LocalBackend(int(os.environ.get('CACHE_MAX_ENTRIES', '256')))
+                _cache = QueryCache(backend, ttl=float(os.environ.get('CACHE_TTL', '60')))
+    return _cache
+
+
+def cached(name, tags, loader, ttl=None):
+    return get_cache().get_or_load(name, tags, loader, ttl)
+
+
+def invalidate(*tags):
+    get_cache().invalidate(*tags)
@@ -0,0 +1,368 @@
+import click
+from .db import get_db
+
+
+def register_cli(app):
+    """Maintenance commands, run as `flask --app flask_app <command>`."""
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_cmd():
+        """Recompute the SPEND_ROLLUP summary table from scratch."""
+        from .rollup import rebuild_rollups
+        counts = rebuild_rollups(get_db())
+        for dim, n in sorted(counts.items()):
+            click.echo(f'{dim}: {n} rows')
+
+    @app.cli.command('bench-search')
+    @click.option('--rounds', default=20, show_default=True, help='Executions per query.')
+    def bench_search_cmd(rounds):
+        """Time LIKE '%q%' search against the indexed search plans."""
+        from .bench import bench_search
+        click.echo(f"{'entity':<12}{'rows':>10}  {'kind':<5}{'query':<16}{'legacy p50/p95 ms':>22}{'planned p50/p95 ms':>22}")
+        for r in bench_search(get_db(), rounds):
+            lg, pl = r['legacy'], r['planned']
+            click.echo(f"{r['entity']:<12}{r['rows'] or 0:>10}  {r['kind']:<5}{r['q'][:15]:<16}"
+                       f"{lg['p50']:>11.2f}/{lg['p95']:<10.2f}{pl['p50']:>11.2f}/{pl['p95']:<10.2f}")
+
+    @app.cli.command('db-migrate')
+    @click.option('--status', 'show_status', is_flag=True, help='List migrations and their state, apply nothing.')
+    @click.option('--target', default=None, help='Apply up to and including this version (e.g. 0004).')
+    @click.option('--baseline', default=None,
+                  help='Record versions up to this one as applied without running them '
+                       '(for databases migrated by hand with the mysql client).')
+    def db_migrate_cmd(show_status, target, baseline):
+        """Apply pending migrations/*.sql in order, tracked in SCHEMA_VERSION."""
+        from .migrate import migrate, status
+        db = get_db()
+        if show_status:
+            for m in status(db):
+                click.echo(f"{m['version']}  {m['state']:<9} {m['name']}")
+            return
+        try:
+            ran = migrate(db, target=target, baseline=baseline, echo=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        if not ran:
+            click.echo('Nothing to apply.')
+
+    @app.cli.command('explain-check')
+    @click.option('--min-rows', default=1000, show_default=True,
+                  help='Ignore full scans of tables estimated below this many rows.')
+    @click.option('--allow', multiple=True, help='Extra table allowed to be fully scanned (repeatable).')
+    @click.option('--verbose', is_flag=True, help='Print every plan row, not only failures.')
+    def explain_check_cmd(min_rows, allow, verbose):
+        """EXPLAIN every query the GET pages issue; fail on unexpected full table scans."""
+        from flask import current_app
+        from .explain import ALLOW_FULL_SCAN, collect_statements, explain_statements
+        statements = collect_statements(current_app._get_current_object())
+        allowed = set(ALLOW_FULL_SCAN) | {a.upper() for a in allow}
+        report, failures = explain_statements(get_db(), statements, allowed, min_rows)
+        for r in report if verbose else failures:
+            click.echo(f"{r['route']:<24}{r['table']:<22}{r['type'] or '':<9}{r['key'] or '-':<28}{r['rows'] or 0:>10}")
+        click.echo(f'{len(statements)} queries, {len(report)} plan rows, {len(failures)} full scans')
+        if failures:
+            for r in failures:
+                click.echo(f"\n[{r['route']}] {r['sql']}", err=True)
+            raise click.ClickException('full table scans found')
+
+    @app.cli.command('gen-data')
+    @click.option('--departments', default=0, show_default=True)
+    @click.option('--vendors', default=0, show_default=True)
+    @click.option('--products', default=0, show_default=True)
+    @click.option('--requests', 'n_requests', default=0, show_default=True)
+    @click.option('--logs', default=0, show_default=True)
+    @click.option('--skew', default=1.1, show_default=True, help='Zipf exponent for department/product popularity.')
+    @click.option('--days', default=730, show_default=True, help='Spread dates over this many days back.')
+    @click.option('--seed', default=1, show_default=True)
+    def gen_data_cmd(departments, vendors, products, n_requests, logs, skew, days, seed):
+        """Bulk-load synthetic data with LOAD DATA LOCAL INFILE (needs local_infile=1 on the server)."""
+        from .datagen import generate
+        counts = generate(get_db(), departments, vendors, products, n_requests, logs,
+                          seed=seed, skew=skew, days=days, echo=click.echo)
+        for table, n in counts.items():
+            click.echo(f'{table}: +{n}')
+
+    @app.cli.command('bench-routes')
+    @click.option('--clients', default=8, show_default=True, help='Concurrent clients.')
+    @click.option('--duration', default=30.0, show_default=True, help='Seconds to run.')
+    @click.option('--url', default=None, help='Drive a running server instead of the in-process test client.')
+    @click.option('--only', default='', help='Comma-separated operation names to run (default: all).')
+    @click.option('--out', default=None, help='Write results as JSON (default bench-results/routes-<time>.json).')
+    @click.option('--compare', 'compare_to', default=None, type=click.Path(exists=True),
+                  help='Earlier results file to compare against.')
+    def bench_routes_cmd(clients, duration, url, only, out, compare_to):
+        """Load-test the routes; report p50/p95/p99, throughput and DB round-trips per request."""
+        import json
+        import time
+        from flask import current_app
+        from .bench import bench_routes, compare_results, save_results
+        only = {o.strip() for o in only.split(',') if o.strip()}
+        res = bench_routes(current_app._get_current_object(), get_db(), clients=clients, duration=duration,
+                           base_url=url, only=only)
+        click.echo(f"{'operation':<22}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'trips':>7}{'err':>5}")
+        for name, s in sorted(res['ops'].items()) + [('TOTAL', res['total'])]:
+            trips = '-' if s['round_trips'] is None else f"{s['round_trips']:.1f}"
+            click.echo(f"{name:<22}{s['n']:>7}{s['p50']:>9.1f}{s['p95']:>9.1f}{s['p99']:>9.1f}"
+                       f"{s['rps']:>9.1f}{trips:>7}{s['errors']:>5}")
+        out = out or time.strftime('bench-results/routes-%Y%m%d-%H%M%S.json')
+        save_results(res, out)
+        click.echo(f'saved {out}')
+        if compare_to:
+            with open(compare_to) as f:
+                old = json.load(f)
+            click.echo(f"\n{'operation':<22}{'p50 old':>9}{'p50 new':>9}{'p95 old':>9}{'p95 new':>9}{'p95 %':>8}"
+                       f"{'trips old':>11}{'trips new':>11}")
+            fmt = lambda t: '-' if t is None else f'{t:.1f}'
+            for name, o50, n50, o95, n95, pct, otr, ntr in compare_results(old, res):
+                click.echo(f'{name:<22}{o50:>9.1f}{n50:>9.1f}{o95:>9.1f}{n95:>9.1f}{pct:>+8.1f}'
+                           f'{fmt(otr):>11}{fmt(ntr):>11}')
+
+    @app.cli.command('bench-workflow')
+    @click.option('--rounds', default=50, show_default=True, help='Create/approve/cancel/reject cycles per backend.')
+    @click.option('--batch', default=100, show_default=True, help='Requests per batch approve/cancel.')
+    def bench_workflow_cmd(rounds, batch):
+        """Compare request workflow latency: in-app statements vs. one stored-procedure CALL."""
+        from .bench import bench_workflow
+        res = bench_workflow(get_db(), rounds=rounds, batch=batch)
+        click.echo(f"{'action':<16}{'backend':<12}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'stmts':>7}{'trips':>7}")
+        for name in res['python']:
+            for backend, r in res.items():
+                s = r[name]
+                click.echo(f"{name:<16}{backend:<12}{s['p50']:>9.2f}{s['p95']:>9.2f}{s['mean']:>9.2f}"
+                           f"{s['statements']:>7.1f}{s['round_trips']:>7.1f}")
+
+    @app.cli.command('partitions')
+    @click.option('--ahead', default=3, show_default=True, help='Months to create past the current one.')
+    @click.option('--retire-before', default=None, metavar='YYYY-MM',
+                  help='Summarize BUDGET_LOG months before this one and take them out of the live table.')
+    @click.option('--mode', type=click.Choice(['archive', 'compact']), default='archive', show_default=True,
+                  help='archive: move retired months to BUDGET_LOG_ARCHIVE; compact: keep only the daily summary.')
+    @click.option('--archive-rejected', type=int, default=None, metavar='MONTHS',
+                  help='Move Rejected requests decided more than MONTHS months ago to PROCUREMENT_REQUEST_ARCHIVE.')
+    @click.option('--status', 'show_status', is_flag=True, help='List partitions and estimated rows, change nothing.')
+    def partitions_cmd(ahead, retire_before, mode, archive_rejected, show_status):
+        """Maintain the monthly BUDGET_LOG partitions (run daily or monthly from cron)."""
+        import datetime
+        from .cache import invalidate
+        from .partitions import archive_rejected as archive_rejected_requests, ensure_partitions, list_partitions, retire_partitions
+        db = get_db()
+        try:
+            if show_status:
+                for table in ('BUDGET_LOG', 'BUDGET_LOG_ARCHIVE', 'PROCUREMENT_REQUEST_ARCHIVE'):
+                    for name, _, est in list_partitions(db, table):
+                        click.echo(f'{table:<30}{name:<10}{est:>12}')
+                return
+            for table in ('BUDGET_LOG', 'PROCUREMENT_REQUEST_ARCHIVE'):
+                created = ensure_partitions(db, table, ahead=ahead)
+                click.echo(f"{table}: {len(created)} new partitions {' '.join(created)}".rstrip())
+            if retire_before:
+                try:
+                    before = datetime.datetime.strptime(retire_before, '%Y-%m').date()
+                except ValueError:
+                    raise click.BadParameter('expected YYYY-MM', param_hint='--retire-before')
+                for name, est in retire_partitions(db, before, mode):
+                    click.echo(f'BUDGET_LOG {name}: ~{est} rows {mode}d')
+                invalidate('BUDGET_LOG')
+            if archive_rejected is not None:
+                moved = archive_rejected_requests(db, archive_rejected)
+                click.echo(f'PROCUREMENT_REQUEST: {moved} rejected requests archived')
+                invalidate('PROCUREMENT_REQUEST')
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command('change-feed')
+    @click.option('--retain-days', type=float, default=None,
+                  help='Delete changes older than this (default FEED_RETENTION_DAYS or 7; 0 keeps all).')
+    @click.option('--compact-hours', type=float, default=None,
+                  help='Keep only the newest change per row among those older than this '
+                       '(default FEED_COMPACT_HOURS or 24; 0 disables).')
+    @click.option('--chunk', default=10000, show_default=True, help='Positions deleted per statement.')
+    @click.option('--status', 'show_status', is_flag=True, help='Show the feed head and horizons, change nothing.')
+    def change_feed_cmd(retain_days, compact_hours, chunk, show_status):
+        """Apply the CHANGE_FEED retention and compaction policy (run hourly or daily from cron)."""
+        from .feed import purge, status
+        db = get_db()
+        if show_status:
+            for k, v in status(db).items():
+                click.echo(f'{k:<20}{v}')
+            return
+        done = purge(db, retain_days=retain_days, compact_hours=compact_hours, chunk=chunk)
+        click.echo(f"CHANGE_FEED: {done['purged']} changes past retention deleted, {done['compacted']} superseded changes compacted")
+
+    @app.cli.command('bench-partitions')
+    @click.option('--rounds', default=10, show_default=True, help='Executions per query.')
+    @click.option('--month', default=None, metavar='YYYY-MM', help='Month to read (default: last month).')
+    def bench_partitions_cmd(rounds, month):
+        """Compare month-bounded BUDGET_LOG reads with and without partition pruning."""
+        import datetime
+        from .bench import bench_partitions
+        month = datetime.datetime.strptime(month, '%Y-%m').date() if month else None
+        click.echo(f"{'case':<22}{'month':<9}{'rows':>12}{'pruned p50/p95 ms':>22}{'parts':>7}{'full p50/p95 ms':>22}{'parts':>7}")
+        for r in bench_partitions(get_db(), rounds, month):
+            p, f = r['pruned'], r['full']
+            click.echo(f"{r['case']:<22}{r['month']:<9}{r['rows'] or 0:>12}{p['p50']:>11.2f}/{p['p95']:<10.2f}{p['partitions']:>7}"
+                       f"{f['p50']:>11.2f}/{f['p95']:<10.2f}{f['partitions']:>7}")
+
+    @app.cli.command('refresh-analytics')
+    @click.option('--full', is_flag=True, help='Rebuild every section instead of only what changed.')
+    @click.option('--loop', is_flag=True, help='Keep running: full rebuild every --interval, incremental after writes.')
+    @click.option('--interval', default=900.0, show_default=True, help='Seconds between full rebuilds (--loop).')
+    @click.option('--delay', default=10.0, show_default=True,
+                  help='Seconds the oldest pending change waits before an incremental refresh (--loop).')
+    @click.option('--poll', default=5.0, show_default=True, help='Seconds between checks for changes (--loop).')
+    def refresh_analytics_cmd(full, loop, interval, delay, poll):
+        """Recompute the Analytics page snapshots (ANALYTICS_SNAPSHOT)."""
+        import logging
+        import threading
+        from .snapshots import refresh, run_refresher
+        if loop:
+            logging.basicConfig(level=logging.INFO)
+            try:
+                run_refresher(threading.Event(), interval=interval, delay=delay, poll=poll)
+            except KeyboardInterrupt:
+                pass
+            return
+        done = refresh(get_db(), full=full)
+        if done is None:
+            raise click.ClickException('another refresh is running')
+        if not done:
+            click.echo('Nothing changed since the last refresh.')
+        for name, (mode, rows, seconds) in done.items():
+            click.echo(f'{name:<16}{mode:<13}{rows:>8} rows {seconds:>8.2f}s')
+
+    @app.cli.command('bench-approvals')
+    @click.option('--clients', default='1,8,32,128', show_default=True, help='Comma-separated client counts.')
+    @click.option('--requests', 'n_requests', default=2000, show_default=True, help='Approvals per client count.')
+    @click.option('--backends', default='python,optimistic', show_default=True, help='Workflow backends to compare.')
+    def bench_approvals_cmd(clients, n_requests, backends):
+        """Approvals/second against one hot department and product at increasing concurrency."""
+        from .bench import bench_approvals
+        levels = tuple(int(c) for c in clients.split(',') if c.strip())
+        res = bench_approvals(get_db(), levels=levels, requests=n_requests,
+                              backends=tuple(b.strip() for b in backends.split(',') if b.strip()))
+        click.echo(f"{'backend':<12}{'clients':>8}{'appr/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ok':>7}{'retries':>9}  errors")
+        for backend, by_level in res.items():
+            for n, r in by_level.items():
+                errs = ', '.join(f'{m}: {c}' for m, c in sorted(r['errors'].items())) or '-'
+                click.echo(f"{backend:<12}{n:>8}{r['approvals_per_sec']:>9.1f}{r['p50']:>9.1f}{r['p95']:>9.1f}"
+                           f"{r['p99']:>9.1f}{r['ok']:>7}{r['retries']:>9}  {errs}")
+
+    @app.cli.command('import-data')
+    @click.argument('kind', type=click.Choice(['vendors', 'products', 'departments']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+                  help='Input format (default: from the file extension).')
+    @click.option('--infile', is_flag=True, help='Stage with LOAD DATA LOCAL INFILE instead of executemany.')
+    @click.option('--rejects', type=click.Path(dir_okay=False), default=None,
+                  help='Write rejected rows (line, id, reason) to this CSV file.')
+    def import_data_cmd(kind, path, fmt, infile, rejects):
+        """Bulk upsert vendors, products or departments from a CSV/JSONL file."""
+        import csv
+        from .importer import detect_format, import_stream
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            result = import_stream(get_db(), kind, f, detect_format(path, fmt), infile=infile)
+        click.echo(f'{result.read} rows read: {result.inserted} inserted, {result.updated} updated, '
+                   f'{len(result.rejected)} rejected in {result.seconds:.1f}s ({result.rows_per_sec:,.0f} rows/s)')
+        if rejects and result.rejected:
+            with open(rejects, 'w', newline='') as out:
+                w = csv.writer(out)
+                w.writerow(['line', 'id', 'reason'])
+                w.writerows(sorted(result.rejected, key=lambda r: r[0]))
+            click.echo(f'rejected rows written to {rejects}')
+        else:
+            for line, rid, reason in sorted(result.rejected, key=lambda r: r[0])[:20]:
+                click.echo(f'  line {line} {rid or ""}: {reason}')
+
+    @app.cli.command('jobs-worker')
+    @click.option('--threads', default=2, show_default=True, help='Jobs run concurrently by this process.')
+    @click.option('--poll', default=1.0, show_default=True, help='Seconds between queue checks while idle.')
+    @click.option('--stats', 'show_stats', is_flag=True, help='Print queue depth and latency, run nothing.')
+    def jobs_worker_cmd(threads, poll, show_stats):
+        """Run queued background jobs (exports, batch actions, vendor blacklisting) until interrupted."""
+        import logging
+        import threading
+        from .jobs import job_stats, run_worker
+        if show_stats:
+            s = job_stats(get_db())
+            click.echo(', '.join(f'{k}: {v}' for k, v in sorted(s['counts'].items())) or 'no jobs')
+            click.echo(f"oldest queued: {s['oldest_queued_s']}s, {s['jobs_per_minute']} jobs/min over {s['window_minutes']} min")
+            for r in s['by_kind']:
+                click.echo(f"  {r['kind']:<10}{r['jobs']:>6} done {r['failed']:>4} failed  queue avg/max "
+                           f"{r['avg_queue_s']}/{r['max_queue_s']}s  run avg {r['avg_run_s']}s")
+            return
+        logging.basicConfig(level=logging.INFO)
+        stop = threading.Event()
+        workers = [threading.Thread(target=run_worker, args=(stop,), kwargs=dict(poll=poll),
+                                    name=f'job-worker-{i}', daemon=True) for i in range(threads)]
+        for t in workers:
+            t.start()
+        try:
+            while any(t.is_alive() for t in workers):
+                stop.wait(1.0)
+        except KeyboardInterrupt:
+            stop.set()
+            for t in workers:
+                t.join()
+
+    @app.cli.command('reconcile')
+    @click.option('--correct', is_flag=True, help='Write Adjustment entries that bring every mismatch back in balance.')
+    @click.option('--admin', 'admin_id', default=None, help='Admin_ID the correction entries are signed with.')
+    @click.option('--chunk', default=None, type=int, help='Rows per chunk (default RECONCILE_CHUNK or 50000).')
+    @click.option('--sample', default=20, show_default=True, help='Mismatched requests to list.')
+    @click.option('--json', 'json_path', default=None, help='Also write the full report to this file.')
+    def reconcile_cmd(correct, admin_id, chunk, sample, json_path):
+        """Check department budgets and request totals against BUDGET_LOG; exits non-zero on mismatches."""
+        from .reconcile import reconcile, summary, write_report
+        try:
+            report = reconcile(get_db(), correct=correct, admin_id=admin_id, chunk=chunk, sample=sample)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if json_path:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                write_report(report, f)
+        click.echo(summary(report))
+        for d in report['departments']:
+            click.echo(f"  dept {d['Dept_ID']:<8} current {d['Current_Budget']}  logged {d['Logged']}  "
+                       f"expected {d['Expected']}  difference {d['Difference']}")
+        for d in report['unknown_departments']:
+            click.echo(f"  unknown dept {d['Dept_ID']}: logged {d['Logged']}")
+        for p in report['products']:
+            click.echo(f"  product {p['Item_ID']}: stock {p['Stock_Available']}  approved qty {p['Approved_Quantity']}  "
+                       f"approved spend {p['Approved_Spend']}  difference {p['Difference']}")
+        for r in report['requests']:
+            click.echo(f"  request {r['Request_ID']} ({r['Status'] or 'deleted'}): expected {r['Expected']}  logged {r['Logged']}")
+        if (report['departments'] or report['requests_mismatched']) and not correct:
+            raise SystemExit(1)
+
+    @app.cli.command('bench-money')
+    @click.option('--ops', default=200000, show_default=True, help='Budget check-and-deduct operations to time per variant.')
+    @click.option('--trials', default=2000, show_default=True, help='Random cases per invariant check.')
+    @click.option('--seed', default=1, show_default=True)
+    def bench_money_cmd(ops, trials, seed):
+        """Time the money paths and check that budgets never drift (no database needed)."""
+        from .bench import bench_money
+        res = bench_money(ops=ops, trials=trials, seed=seed)
+        for name, ns in res['ns_per_op'].items():
+            click.echo(f'{name:<24}{ns:>10.1f} ns/op')
+        failed = 0
+        for name, c in res['checks'].items():
+            failed += c['failures']
+            click.echo(f"{name:<28}{c['trials']:>7} cases {c['failures']:>5} failures "
+                       f"(float arithmetic: {c['float_failures']} wrong)")
+        if failed:
+            raise click.ClickException(f'{failed} money invariant failures')
+
+    @app.cli.command('bench-streaming')
+    @click.option('--path', 'paths', multiple=True, help='Page to fetch (repeatable; default /requests?limit=500 and /logs).')
+    @click.option('--rounds', default=5, show_default=True, help='Fetches per page and mode.')
+    def bench_streaming_cmd(paths, rounds):
+        """Compare time-to-first-byte and peak memory of list pages rendered whole and streamed."""
+        from flask import current_app
+        from .bench import bench_streaming
+        res = bench_streaming(current_app._get_current_object(), paths or ('/requests?limit=500', '/logs'), rounds)
+        click.echo(f"{'page':<24}{'mode':<10}{'ttfb p50':>10}{'total p50':>11}{'KB':>9}{'heap peak KB':>14}{'max RSS KB':>12}")
+        for r in res:
+            for mode in ('buffered', 'streamed'):
+                m = r[mode]
+                click.echo(f"{r['path'][:23]:<24}{mode:<10}{m['ttfb']['p50']:>10.1f}{m['total']['p50']:>11.1f}"
+                           f"{m['bytes'] / 1024.0:>9.1f}{m['heap_peak_kb']:>14.1f}{m['max_rss_kb']:>12}")
@@ -0,0 +1,254 @@
+import itertools
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from .db import query_all, query_scalar
+from .ids import ID_FORMATS, allocator, format_id
+
+# Rows per LOAD DATA file / transaction
+CHUNK_ROWS = 200000
+
+VENDOR_CATEGORIES = ['Vehicles', 'Ammunition', 'IT & Communication', 'Cybersecurity',
+                     'Uniforms & Gear', 'Medical', 'Others']
+PRODUCT_CATEGORIES = {
+    'Vehicles': ['Tanks', 'Armored Trucks', 'Fighter Jets', 'Submarines', 'Drones', 'Transport Aircraft'],
+    'Ammunition': ['Rifles', 'Missiles', 'Artillery System', 'Air-defence systems'],
+    'IT & Communication': ['Radios', 'Satellite Phones', 'Secure Routers', 'Command Servers', 'Radar installations'],
+    'Cybersecurity': ['Firewalls', 'Threat monitoring platforms', 'Data centers'],
+    'Uniforms & Gear': ['Helmets', 'Defence suits', 'Uniform'],
+    'Medical': ['First-aid kits', 'Medical drones', 'Surgical instruments'],
+    'Others': ['Others'],
+}
+# Rough unit cost band per product category (min, max)
+COST_BANDS = {
+    'Tanks': (2e6, 9e6), 'Fighter Jets': (2e7, 9e7), 'Submarines': (5e7, 2e8), 'Transport Aircraft': (1e7, 6e7),
+    'Missiles': (1e5, 3e6), 'Artillery System': (5e5, 5e6), 'Air-defence systems': (1e6, 2e7),
+    'Radar installations': (5e5, 1e7), 'Data centers': (1e6, 1e7), 'Command Servers': (1e4, 2e5),
+}
+DEFAULT_BAND = (50, 50000)
+UNITS = ['Field Ops Unit', 'Logistics Corps', 'Cyber Command', 'Signals Regiment', 'Air Wing',
+         'Naval Squadron', 'Medical Corps', 'Engineering Brigade']
+CITIES = ['Bengaluru', 'Hyderabad', 'Mumbai', 'Delhi', 'Chennai', 'Pune', 'Kolkata', 'Jaipur', 'Lucknow']
+REGIONS = ['North', 'South', 'East', 'West', 'Central']
+COUNTRIES = ['India', 'India', 'India', 'USA', 'France', 'Israel', 'Russia', 'Germany', 'UK', 'Japan']
+WORDS = ['Apex', 'Vajra', 'Trident', 'Garuda', 'Sentinel', 'Falcon', 'Orion', 'Astra', 'Titan', 'Nova',
+         'Shakti', 'Prithvi', 'Aegis', 'Kestrel', 'Bharat', 'Zenith']
+SUFFIXES = ['Defence Systems', 'Industries', 'Technologies', 'Dynamics', 'Aerospace', 'Labs', 'Works']
+# Request status mix: (status, weight)
+STATUS_MIX = (('Approved', 60), ('Pending', 25), ('Rejected', 15))
+
+
+def zipf_weights(n, s):
+    """Cumulative Zipf(s) weights over n ranks: rank 1 is drawn ~2^s times as often as rank 2."""
+    return list(itertools.accumulate(1.0 / (i + 1) ** s for i in range(n)))
+
+
+def _tsv(v):
+    if v is None:
+        return '\\N'
+    if isinstance(v, bool):
+        return '1' if v else '0'
+    return str(v).replace('\\', '\\\\').replace('\t', ' ').replace('\n', ' ')
+
+
+def load_rows(conn, table, columns, rows):
+    """LOAD DATA LOCAL INFILE `rows` into `table` via a temporary TSV file; returns rows loaded."""
+    fd, path = tempfile.mkstemp(prefix=f'defdb-{table.lower()}-', suffix='.tsv')
+    n = 0
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+            for row in rows:
+                f.write('\t'.join(_tsv(v) for v in row) + '\n')
+                n += 1
+        if n:
+            cur = conn.cursor()
+            cur.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(columns)})",
+                (path,),
+            )
+            cur.close()
+            conn.commit()
+    finally:
+        os.unlink(path)
+    return n
+
+
+def _capacity(conn, prefix, wanted):
+    # IDs are fixed-width (VEN999, PRO9999, REQ9999999): clamp to what is left of the ID space
+    nxt = query_scalar(conn, "SELECT Next_Value FROM ID_SEQUENCE WHERE Prefix=%s", (prefix,), 1) or 1
+    return max(0, min(wanted, 10 ** ID_FORMATS[prefix][2] - int(nxt)))
+
+
+def _chunks(total, size=CHUNK_ROWS):
+    done = 0
+    while done < total:
+        n = min(size, total - done)
+        yield n
+        done += n
+
+
+class Generator:
+    """
+    Bulk synthetic data on top of whatever is already loaded.
+
+    IDs come from ID_SEQUENCE so the app's allocator stays consistent. Departments
+    and products are drawn with Zipf skew (a few hot departments/items get most of
+    the requests), timestamps lean towards the recent end of the window, and every
+    Approved request gets its Procurement BUDGET_LOG entry with the matching amount.
+    """
+
+    def __init__(self, conn, seed=1, skew=1.1, days=730, echo=print):
+        self.conn = conn
+        self.rng = random.Random(seed)
+        self.skew = skew
+        self.days = days
+        self.echo = echo
+        self.now = datetime.now().replace(microsecond=0)
+
+    def _ids(self, prefix, n):
+        n = _capacity(self.conn, prefix, n)
+        if n == 0:
+            return []
+        return [format_id(prefix, i) for i in allocator.reserve_range(prefix, n)]
+
+    def _moment(self):
+        # Squared uniform: recent days are denser, like a growing system
+        age = self.days * self.rng.random() ** 2
+        return (self.now - timedelta(days=age)).replace(microsecond=0)
+
+    def _timed(self, label, table, columns, rows):
+        t0 = time.perf_counter()
+        n = load_rows(self.conn, table, columns, rows)
+        dt = time.perf_counter() - t0
+        self.echo(f'{label}: {n} rows in {dt:.1f}s ({n / dt if dt else 0:,.0f} rows/s)')
+        return n
+
+    def departments(self, n):
+        rng, ids = self.rng, self._ids('DPT', n)
+
+        def rows():
+            for did in ids:
+                alloc = Decimal(rng.randint(10 ** 9, 10 ** 11))
+                yield (did, f'{rng.choice(UNITS)} {int(did[3:])}', rng.choice(CITIES), alloc, alloc,
+                       f'bench.{did.lower()}@gov.in', rng.choice(REGIONS))
+        return self._timed('departments', 'DEPARTMENT',
+                           ['Dept_ID', 'Name', 'Location', 'Budget_Allocation', 'Current_Budget', 'Email', 'Region'], rows())
+
+    def vendors(self, n):
+        rng, ids = self.rng, self._ids('VEN', n)
+
+        def rows():
+            for vid in ids:
+                company = f'{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)}'
+                expiry = (self.now + timedelta(days=rng.randint(-180, 1500))).date()
+                yield (vid, company, rng.choice(VENDOR_CATEGORIES), rng.choice(COUNTRIES),
+                       f'sales.{vid.lower()}@vendor.example', f'+91-{rng.randint(10 ** 9, 10 ** 10 - 1)}',
+                       rng.random() < 0.02, expiry)
+        return self._timed('vendors', 'VENDOR',
+                           ['Vendor_ID', 'Company', 'Category', 'Country', 'Email', 'Phone', 'Blacklisted',
+                            'Contract_Expiry_Date'], rows())
+
+    def products(self, n):
+        rng, ids = self.rng, self._ids('PRO', n)
+        vendors = query_all(self.conn, "SELECT Vendor_ID, Category FROM VENDOR WHERE Blacklisted = FALSE")
+        if not vendors:
+            raise RuntimeError('No vendors to attach products to')
+
+        def rows():
+            for iid in ids:
+                v = rng.choice(vendors)
+                category = rng.choice(PRODUCT_CATEGORIES.get(v['Category'], ['Others']))
+                lo, hi = COST_BANDS.get(category, DEFAULT_BAND)
+                cost = Decimal(str(round(rng.uniform(lo, hi), 2)))
+                origin = rng.choice(COUNTRIES)
+                yield (iid, f'{rng.choice(WORDS)} {category} Mk-{rng.randint(1, 9)}', category, cost,
+                       f'{rng.choice(WORDS)} {rng.choice(SUFFIXES)}', origin, origin != 'India',
+                       rng.randint(10 ** 5, 10 ** 7), v['Vendor_ID'])
+        return self._timed('products', 'PRODUCT',
+                           ['Item_ID', 'Name', 'Category', 'Unit_Cost', 'Manufacturer', 'Country_of_Origin',
+                            'Imported', 'Stock_Available', 'Vendor_ID'], rows())
+
+    def requests_and_logs(self, n_requests, n_logs):
+        """Requests in chunks, each followed by the BUDGET_LOG rows of its approved requests."""
+        rng = self.rng
+        depts = [r['Dept_ID'] for r in query_all(self.conn, "SELECT Dept_ID FROM DEPARTMENT")]
+        items = query_all(self.conn, (
+            "SELECT p.Item_ID, p.Vendor_ID, p.Unit_Cost FROM PRODUCT p "
+            "JOIN VENDOR v ON v.Vendor_ID = p.Vendor_ID WHERE v.Blacklisted = FALSE"
+        ))
+        admins = [r['Admin_ID'] for r in query_all(self.conn, "SELECT Admin_ID FROM MINISTRY")]
+        if not (depts and items and admins):
+            raise RuntimeError('Need departments, products and ministry officials before requests')
+        rng.shuffle(depts)
+        rng.shuffle(items)
+        dept_cum, item_cum = zipf_weights(len(depts), self.skew), zipf_weights(len(items), self.skew)
+        statuses, status_w = zip(*STATUS_MIX)
+        n_requests = _capacity(self.conn, 'REQ', n_requests)
+        n_logs = _capacity(self.conn, 'BUD', n_logs)
+        logs_left = n_logs
+        req_cols = ['Request_ID', 'Dept_ID', 'Item_ID', 'Vendor_ID', 'Quantity', 'Status',
+                    'Date_of_Request', 'Approval_Authority', 'Date_of_Approval']
+        log_cols = ['Log_ID', 'Category', 'Dept_ID', 'Request_ID', 'Admin_ID', 'Amount', 'Timestamp']
+        loaded_req = loaded_log = 0
+        for size in _chunks(n_requests):
+            req_nums = allocator.reserve_range('REQ', size)
+            d_pick = rng.choices(depts, cum_weights=dept_cum, k=size)
+            i_pick = rng.choices(items, cum_weights=item_cum, k=size)
+            s_pick = rng.choices(statuses, weights=status_w, k=size)
+            reqs, logs = [], []
+            for num, did, item, status in zip(req_nums, d_pick, i_pick, s_pick):
+                rid = format_id('REQ', num)
+                # Pareto quantities, capped so Unit_Cost * Quantity fits DECIMAL(15,2)
+                qty = min(500, int(rng.paretovariate(1.5)))
+                asked = self._moment()
+                decided, authority = None, None
+                if status != 'Pending':
+                    decided = min(self.now, asked + timedelta(hours=rng.randint(1, 240)))
+                    authority = rng.choice(admins)
+                reqs.append((rid, did, item['Item_ID'], item['Vendor_ID'], qty, status,
+                             asked.date(), authority, decided.date() if decided else None))
+                if status == 'Approved' and len(logs) < logs_left:
+                    # Total_Cost is computed by trg_request_bi as Unit_Cost * Quantity
+                    logs.append(['Procurement', did, rid, authority, item['Unit_Cost'] * qty, decided])
+            loaded_req += self._timed('requests', 'PROCUREMENT_REQUEST', req_cols, reqs)
+            if logs:
+                log_nums = allocator.reserve_range('BUD', len(logs))
+                loaded_log += self._timed('budget log', 'BUDGET_LOG', log_cols,
+                                          ([format_id('BUD', num)] + row for num, row in zip(log_nums, logs)))
+                logs_left -= len(logs)
+        # Remaining log volume: allocation entries not tied to a request
+        for size in _chunks(logs_left):
+            log_nums = allocator.reserve_range('BUD', size)
+            d_pick = rng.choices(depts, cum_weights=dept_cum, k=size)
+
+            def rows():
+                for num, did in zip(log_nums, d_pick):
+                    amount = Decimal(str(round(rng.uniform(1e5, 5e7), 2)))
+                    yield (format_id('BUD', num), rng.choice(('Defense', 'R&D')), did, None,
+                           rng.choice(admins), amount, self._moment())
+            loaded_log += self._timed('budget log', 'BUDGET_LOG', log_cols, rows())
+        return loaded_req, loaded_log
+
+
+def generate(conn, departments=0, vendors=0, products=0, requests=0, logs=0, seed=1, skew=1.1, days=730, echo=print):
+    """Load the requested volumes in FK order; returns {table: rows loaded}."""
+    gen = Generator(conn, seed=seed, skew=skew, days=days, echo=echo)
+    out = {}
+    if departments:
+        out['DEPARTMENT'] = gen.departments(departments)
+    if vendors:
+        out['VENDOR'] = gen.vendors(vendors)
+    if products:
+        out['PRODUCT'] = gen.products(products)
+    if requests or logs:
+        out['PROCUREMENT_REQUEST'], out['BUDGET_LOG'] = gen.requests_and_logs(requests, logs)
+    cur = conn.cursor()
+    for table in out:
+        cur.execute(f"ANALYZE TABLE {table}")
+        cur.fetchall()
+    cur.close()
+    return out
@@ -1,7 +1,11 @@
 import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
 import mysql.connector as mysql
 from contextlib import contextmanager
-from flask import g, has_app_context
+from flask import g, has_app_context, has_request_context, request, session
 
 
 def _conn_params():
@@ -14,11 +18,7 @@ def _conn_params():
     return dict(host=host, user=user, password=password, port=port, database=database)
 
 
-def get_db():
-    # Reuse one connection per request/app context
-    if has_app_context() and hasattr(g, 'db_conn') and g.db_conn:
-        return g.db_conn
-    cfg = _conn_params()
+def _connect(cfg):
     try:
         conn = mysql.connect(
             host=cfg['host'],
@@ -39,54 +39,706 @@ def get_db():
             f"Tried host={cfg['host']} user={cfg['user']} db={cfg['database']}"
         )
         raise RuntimeError(f"{e}; {hint}") from e
-    if has_app_context():
-        g.db_conn = conn
+    conn._pool_born = time.monotonic()
+    return conn
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of MySQL connections.
+
+    - keeps up to `size` idle connections, allows `max_overflow` extra ones under load
+    - connections older than `recycle` seconds are replaced on checkout
+    - `pre_ping` checks liveness before handing out an idle connection
+    - `acquire()` waits at most `timeout` seconds for a free slot, then raises PoolTimeout
+    """
+
+    def __init__(self, params, size=5, max_overflow=10, recycle=1800, pre_ping=True, timeout=30.0):
+        self.params = params
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = dict(checkouts=0, created=0, recycled=0, invalidated=0, timeouts=0,
+                           wait_total=0.0, wait_max=0.0)
+
+    def _expired(self, conn):
+        return self.recycle > 0 and time.monotonic() - getattr(conn, '_pool_born', 0) > self.recycle
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._in_use < self.size + self.max_overflow:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {self.timeout}s "
+                        f"(pool size={self.size}, overflow={self.max_overflow})"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            waited = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+        # Validate/establish outside the lock so slow handshakes don't block other threads
+        try:
+            if conn is not None and self._expired(conn):
+                self._close(conn)
+                self._count('recycled')
+                conn = None
+            if conn is not None and self.pre_ping and not self._alive(conn):
+                self._close(conn)
+                self._count('invalidated')
+                conn = None
+            if conn is None:
+                conn = _connect(self.params)
+                self._count('created')
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn):
+        # An abandoned unbuffered cursor leaves rows on the wire; don't reuse that socket
+        keep = not getattr(conn, 'unread_result', False)
+        try:
+            # Never hand a half-finished transaction to the next request
+            if conn.in_transaction:
+                conn.rollback()
+            # The connector's own copy of the flag: reading conn.autocommit is a round-trip
+            if not getattr(conn, '_autocommit', True):
+                conn.autocommit = True
+        except Exception:
+            keep = False
+        with self._cond:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.size and not self._expired(conn):
+                self._idle.append(conn)
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s.update(size=self.size, max_overflow=self.max_overflow, in_use=self._in_use,
+                     idle=len(self._idle))
+        s['wait_avg'] = s['wait_total'] / s['checkouts'] if s['checkouts'] else 0.0
+        return s
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _alive(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _pool_settings():
+    return dict(
+        size=int(os.environ.get('DB_POOL_SIZE', '5')),
+        max_overflow=int(os.environ.get('DB_POOL_MAX_OVERFLOW', '10')),
+        recycle=int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+        pre_ping=os.environ.get('DB_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'no'),
+        timeout=float(os.environ.get('DB_POOL_TIMEOUT', '30')),
+    )
+
+
+def get_pool():
+    # One pool per process: connections must not be shared across forked gunicorn workers
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(_conn_params(), **_pool_settings())
+                _pool_pid = pid
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def _replica_params():
+    # DB_REPLICA_HOSTS=host[:port],host[:port]; user, password and database default to the primary's
+    base = _conn_params()
+    out = []
+    for entry in os.environ.get('DB_REPLICA_HOSTS', '').split(','):
+        host, _, port = entry.strip().partition(':')
+        if host:
+            out.append(dict(
+                base, host=host, port=int(port) if port else base['port'],
+                user=os.environ.get('DB_REPLICA_USER', base['user']),
+                password=os.environ.get('DB_REPLICA_PASSWORD', base['password']),
+                database=os.environ.get('DB_REPLICA_NAME', base['database']),
+            ))
+    return out
+
+
+class ReplicaSet:
+    """
+    Round-robin over read replicas, each with its own ConnectionPool.
+
+    - a replica whose checkout fails, or that lags more than `max_lag` seconds behind
+      the primary (or has stopped replicating), is skipped for `retry` seconds
+    - lag is re-checked on checkout at most every `check_interval` seconds per replica;
+      a server that is not replicating at all (e.g. a local stand-in) counts as current
+    - `acquire()` returns None when no replica is usable, and callers fall back to the primary
+    """
+
+    def __init__(self, params_list, max_lag=30, retry=30, check_interval=5, **pool_settings):
+        self.pools = [ConnectionPool(p, **pool_settings) for p in params_list]
+        self.max_lag = max_lag
+        self.retry = retry
+        self.check_interval = check_interval
+        self._down_until = [0.0] * len(self.pools)
+        self._checked = [0.0] * len(self.pools)
+        self._lag = [None] * len(self.pools)
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stats = dict(checkouts=0, fallbacks=0, marked_down=0)
+
+    def acquire(self):
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+        for i in range(len(self.pools)):
+            idx = (start + i) % len(self.pools)
+            now = time.monotonic()
+            if self._down_until[idx] > now:
+                continue
+            pool = self.pools[idx]
+            try:
+                conn = pool.acquire()
+            except Exception:
+                self._mark_down(idx)
+                continue
+            if now - self._checked[idx] >= self.check_interval:
+                lag = self._replication_lag(conn)
+                self._checked[idx] = now
+                self._lag[idx] = lag
+                if lag is None or lag > self.max_lag:
+                    pool.release(conn)
+                    self._mark_down(idx)
+                    continue
+            conn._replica_pool = pool
+            self._count('checkouts')
+            return conn
+        self._count('fallbacks')
+        return None
+
+    @staticmethod
+    def release(conn):
+        conn._replica_pool.release(conn)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            s = dict(self._stats)
+            s['replicas'] = [
+                dict(host=p.params['host'], port=p.params['port'], up=self._down_until[i] <= now,
+                     lag=self._lag[i], in_use=p.stats()['in_use'])
+                for i, p in enumerate(self.pools)
+            ]
+        return s
+
+    def _mark_down(self, idx):
+        with self._lock:
+            self._down_until[idx] = time.monotonic() + self.retry
+            self._stats['marked_down'] += 1
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _replication_lag(conn):
+        # Seconds behind the primary; 0 when the server is not a replica, None when replication is broken
+        cur = conn.cursor(dictionary=True)
+        try:
+            try:
+                cur.execute("SHOW REPLICA STATUS")
+            except mysql.Error:
+                # Before MySQL 8.0.22
+                cur.execute("SHOW SLAVE STATUS")
+            row = cur.fetchone()
+        except mysql.Error:
+            # No REPLICATION CLIENT privilege: rely on the connection check alone
+            return 0
+        finally:
+            cur.close()
+        if not row:
+            return 0
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        return None if lag is None else int(lag)
+
+
+_replicas = None
+_replicas_pid = None
+
+
+def get_replicas():
+    """The process's ReplicaSet, or None when DB_REPLICA_HOSTS is not set."""
+    global _replicas, _replicas_pid
+    pid = os.getpid()
+    if _replicas_pid != pid:
+        with _pool_lock:
+            if _replicas_pid != pid:
+                params = _replica_params()
+                settings = _pool_settings()
+                settings['size'] = int(os.environ.get('DB_REPLICA_POOL_SIZE', settings['size']))
+                _replicas = ReplicaSet(
+                    params,
+                    max_lag=float(os.environ.get('DB_REPLICA_MAX_LAG', '30')),
+                    retry=float(os.environ.get('DB_REPLICA_RETRY', '30')),
+                    check_interval=float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', '5')),
+                    **settings,
+                ) if params else None
+                _replicas_pid = pid
+    return _replicas
+
+
+def replica_stats():
+    replicas = get_replicas()
+    return replicas.stats() if replicas else dict(replicas=[])
+
+
+# Read-your-writes: a browser that just wrote reads from the primary for this many seconds,
+# so the redirect after a POST sees its own change even if the replicas are behind
+_RYW_KEY = 'rw_until'
+
+
+def remember_writes(resp):
+    """after_request hook: open the read-your-writes window after any non-GET request."""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        session[_RYW_KEY] = time.time() + float(os.environ.get('DB_READ_YOUR_WRITES', '5'))
+    return resp
+
+
+def replica_allowed():
+    """False while the current browser is inside its read-your-writes window."""
+    if not has_request_context():
+        return True
+    return session.get(_RYW_KEY, 0) <= time.time()
+
+
+def acquire_read(use_replica=True):
+    """Check out a connection for reads: a replica when one is usable, else the primary pool."""
+    replicas = get_replicas() if use_replica else None
+    conn = replicas.acquire() if replicas else None
+    return conn if conn is not None else get_pool().acquire()
+
+
+def release_read(conn):
+    if getattr(conn, '_replica_pool', None) is not None:
+        ReplicaSet.release(conn)
+    else:
+        get_pool().release(conn)
+
+
+def get_read_db():
+    """
+    Connection for read-only work in GET routes and exports: a replica when configured and
+    healthy, otherwise the primary. Stays on the primary inside an open transaction and
+    during the read-your-writes window.
+    """
+    if not has_app_context():
+        return get_db()
+    if getattr(g, 'read_db_conn', None):
+        return g.read_db_conn
+    primary = getattr(g, 'db_conn', None)
+    if (primary is not None and primary.in_transaction) or not replica_allowed() or get_replicas() is None:
+        return get_db()
+    conn = get_replicas().acquire()
+    if conn is None:
+        return get_db()
+    g.read_db_conn = conn
+    return conn
+
+
+def get_db():
+    # Reuse one pooled connection per request/app context
+    if has_app_context() and hasattr(g, 'db_conn') and g.db_conn:
+        return g.db_conn
+    if not has_app_context():
+        # Caller owns (and closes) connections opened outside a request
+        return _connect(_conn_params())
+    conn = get_pool().acquire()
+    g.db_conn = conn
     return conn
 
 
 def close_db(_=None):
+    if getattr(g, 'read_db_conn', None):
+        try:
+            ReplicaSet.release(g.read_db_conn)
+        finally:
+            g.read_db_conn = None
     if hasattr(g, 'db_conn') and g.db_conn:
         try:
-            g.db_conn.close()
+            get_pool().release(g.db_conn)
         finally:
             g.db_conn = None
 
 
-def query_all(conn, sql, params=None):
-    cur = conn.cursor(dictionary=True)
+# Statement capture (capture_statements): per-thread logs, plus a global count so the
+# helpers below pay a single truthiness check when nothing is capturing
+_capture_local = threading.local()
+_capture_lock = threading.Lock()
+_captures = 0
+
+
+class StatementLog(list):
+    """(sql, params) of each statement, plus `round_trips`: the client/server exchanges they took."""
+    round_trips = 0
+
+
+@contextmanager
+def capture_statements():
+    """Record (sql, params) of every statement the calling thread runs through the helpers below."""
+    global _captures
+    log = StatementLog()
+    logs = getattr(_capture_local, 'logs', None)
+    if logs is None:
+        logs = _capture_local.logs = []
+    logs.append(log)
+    with _capture_lock:
+        _captures += 1
+    try:
+        yield log
+    finally:
+        logs.remove(log)
+        with _capture_lock:
+            _captures -= 1
+
+
+def _capture(sql, params, trips=1):
+    for log in getattr(_capture_local, 'logs', ()):
+        log.append((sql, tuple(params or ())))
+        log.round_trips += trips
+
+
+def _trip(n=1):
+    # A round-trip that is not a statement of its own (COMMIT, START TRANSACTION, ...)
+    for log in getattr(_capture_local, 'logs', ()):
+        log.round_trips += n
+
+
+# Statement timing hook installed by instrument.py: observer(sql, params, seconds, rows).
+# None when instrumentation is off, which costs the helpers one attribute check.
+_observer = None
+
+
+def set_observer(fn):
+    global _observer
+    _observer = fn
+
+
+# Server-side prepared statements: DB_STMT_CACHE=n keeps the n most recently used per
+# connection, keyed by SQL text, so a repeated statement is parsed once per connection.
+# Off by default: the connector resets a prepared statement before every execution, an
+# extra round-trip that only pays off for statements that are expensive to parse.
+STMT_CACHE_SIZE = int(os.environ.get('DB_STMT_CACHE', '0'))
+ER_UNSUPPORTED_PS = 1295
+_stmt_lock = threading.Lock()
+_stmt_stats = dict(hits=0, prepared=0, evicted=0, unpreparable=0)
+
+
+def _stmt_count(key):
+    with _stmt_lock:
+        _stmt_stats[key] += 1
+
+
+def stmt_cache_stats():
+    with _stmt_lock:
+        s = dict(_stmt_stats)
+    s['size'] = STMT_CACHE_SIZE
+    return s
+
+
+def _drop_stmt(cache, key):
+    entry = cache.pop(key, None)
+    if entry:
+        try:
+            entry[0].close()
+        except Exception:
+            pass
+
+
+def _execute(conn, sql, params, dictionary=False):
+    """
+    Execute one statement and return (cursor, owned): owned cursors are the caller's to
+    close, the others belong to the connection's prepared-statement cache.
+    """
+    if STMT_CACHE_SIZE:
+        cache = getattr(conn, '_stmt_cache', None)
+        if cache is None:
+            cache = conn._stmt_cache = OrderedDict()
+        key = (sql, dictionary)
+        entry = cache.get(key, False)
+        if entry is False:
+            # The cursor re-prepares unless it is handed the very string object it prepared
+            entry = cache[key] = (conn.cursor(prepared=True, dictionary=dictionary), sql)
+            while len(cache) > STMT_CACHE_SIZE:
+                _drop_stmt(cache, next(iter(cache)))
+                _stmt_count('evicted')
+            fresh = True
+        else:
+            cache.move_to_end(key)
+            fresh = False
+        if entry is not None:
+            cur, text = entry
+            if _captures:
+                # COM_STMT_PREPARE (first use only), COM_STMT_RESET, COM_STMT_EXECUTE
+                _capture(sql, params, 3 if fresh else 2)
+            try:
+                cur.execute(text, tuple(params or ()))
+            except mysql.Error as e:
+                _drop_stmt(cache, key)
+                if not (fresh and e.errno == ER_UNSUPPORTED_PS):
+                    raise
+                # Not preparable (some SHOW/DDL): remember, and send it as text from now on
+                cache[key] = None
+                _stmt_count('unpreparable')
+            else:
+                _stmt_count('prepared' if fresh else 'hits')
+                return cur, False
+    if _captures:
+        _capture(sql, params)
+    cur = conn.cursor(dictionary=dictionary)
     cur.execute(sql, params or ())
+    return cur, True
+
+
+def query_all(conn, sql, params=None):
+    t0 = time.perf_counter() if _observer else None
+    cur, owned = _execute(conn, sql, params, dictionary=True)
     rows = cur.fetchall()
-    cur.close()
+    if owned:
+        cur.close()
+    if t0 is not None:
+        _observer(sql, params, time.perf_counter() - t0, len(rows))
     return rows
 
 
+def iter_rows(conn, sql, params=None, batch=2000):
+    """
+    Yield result rows (tuples) in batches from an unbuffered cursor, so at most
+    `batch` rows are held client-side. The first item yielded is the column names.
+    The connection cannot run other statements until the generator is exhausted.
+    """
+    if _captures:
+        _capture(sql, params)
+    t0 = time.perf_counter() if _observer else None
+    n = 0
+    cur = conn.cursor(buffered=False)
+    try:
+        cur.execute(sql, params or ())
+        yield tuple(cur.column_names)
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            n += len(rows)
+            yield from rows
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        if t0 is not None:
+            # Includes the time the consumer spent between batches (e.g. streaming to the client)
+            _observer(sql, params, time.perf_counter() - t0, n)
+
+
+def query_row(conn, sql, params=None):
+    t0 = time.perf_counter() if _observer else None
+    cur, owned = _execute(conn, sql, params)
+    # fetchall rather than fetchone: a cached prepared cursor must not be left with unread rows
+    rows = cur.fetchall()
+    if owned:
+        cur.close()
+    if t0 is not None:
+        _observer(sql, params, time.perf_counter() - t0, len(rows))
+    return rows[0] if rows else None
+
+
 def query_scalar(conn, sql, params=None, default=None):
-    cur = conn.cursor()
-    cur.execute(sql, params or ())
-    row = cur.fetchone()
-    cur.close()
+    row = query_row(conn, sql, params)
     if not row:
         return default
     return row[0]
 
 
 def exec_sql(conn, sql, params=None):
-    cur = conn.cursor()
-    cur.execute(sql, params or ())
-    cur.close()
-    # Ensure data-changing statements persist even if autocommit is toggled
-    try:
+    """
+    Run one data-changing statement and return its affected-row count. Committed at once
+    when it opened a transaction (autocommit off); left alone inside a caller's transaction.
+    """
+    was_open = conn.in_transaction
+    t0 = time.perf_counter() if _observer else None
+    cur, owned = _execute(conn, sql, params)
+    rows = cur.rowcount
+    if owned:
+        cur.close()
+    if t0 is not None:
+        _observer(sql, params, time.perf_counter() - t0, rows)
+    if not was_open and conn.in_transaction:
         conn.commit()
-    except Exception:
-        pass
+        if _captures:
+            _trip()
+    return rows
+
+
+def _run_batch(conn, statements, dictionary):
+    # One COM_QUERY for all statements (the server's multi-statement support), then one result per statement
+    statements = list(statements)
+    sql = ';\n'.join(s for s, _ in statements)
+    params = [p for _, args in statements for p in (args or ())]
+    if _captures:
+        for i, (s, args) in enumerate(statements):
+            _capture(s, args, 1 if i == 0 else 0)
+    t0 = time.perf_counter() if _observer else None
+    cur = conn.cursor(dictionary=dictionary)
+    out = []
+    try:
+        cur.execute(sql, params)
+        while True:
+            out.append(cur.fetchall() if cur.with_rows else cur.rowcount)
+            if not cur.nextset():
+                break
+    finally:
+        cur.close()
+    if t0 is not None:
+        _observer(sql, params, time.perf_counter() - t0, sum(len(r) if isinstance(r, list) else r for r in out))
+    return out
+
+
+def query_batch(conn, statements):
+    """
+    Run independent reads [(sql, params), ...] in one round-trip and return their rows
+    (lists of dicts), in order. Each statement must produce exactly one result set.
+    """
+    return _run_batch(conn, statements, True)
+
+
+def exec_batch(conn, statements):
+    """
+    Run data-changing statements [(sql, params), ...] in one round-trip and return their
+    affected-row counts. A failing statement stops the rest but not the ones before it,
+    so call this inside transactional().
+    """
+    return _run_batch(conn, statements, False)
+
+
+def call_proc(conn, name, args=()):
+    """
+    CALL a stored procedure in one round-trip and return its result sets as
+    lists of dict rows. The procedure owns its transaction; nothing is committed here.
+    """
+    sql = f"CALL {name}({','.join(['%s'] * len(args))})"
+    if _captures:
+        _capture(sql, args)
+    t0 = time.perf_counter() if _observer else None
+    cur = conn.cursor(dictionary=True)
+    sets = []
+    try:
+        cur.execute(sql, tuple(args))
+        while True:
+            if cur.with_rows:
+                sets.append(cur.fetchall())
+            if not cur.nextset():
+                break
+    finally:
+        cur.close()
+    if t0 is not None:
+        _observer(sql, args, time.perf_counter() - t0, sum(len(s) for s in sets))
+    return sets
+
+
+# Lock conflicts worth retrying: InnoDB rolled the transaction back (deadlock) or the
+# statement gave up waiting for a row lock
+RETRY_ERRNOS = (1213, 1205)
+_retry_lock = threading.Lock()
+_retry_stats = dict(retries=0, gave_up=0)
+
+
+def run_with_retries(fn, attempts=None, base_delay=None):
+    """
+    Call fn() and call it again after a deadlock or lock wait timeout, sleeping with
+    exponential backoff and full jitter in between (DB_RETRY_ATTEMPTS tries in total,
+    default 5; first backoff up to DB_RETRY_BASE_MS, default 10). fn must be safe to
+    re-run from the start, i.e. do all its writes in one transaction.
+    """
+    attempts = attempts or int(os.environ.get('DB_RETRY_ATTEMPTS', '5'))
+    base = base_delay if base_delay is not None else float(os.environ.get('DB_RETRY_BASE_MS', '10')) / 1000.0
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except mysql.Error as e:
+            if e.errno not in RETRY_ERRNOS:
+                raise
+            with _retry_lock:
+                _retry_stats['gave_up' if attempt == attempts else 'retries'] += 1
+            if attempt == attempts:
+                raise
+        time.sleep(random.uniform(0, base * 2 ** (attempt - 1)))
+
+
+def retry_stats():
+    with _retry_lock:
+        return dict(_retry_stats)
 
 
 @contextmanager
 def transactional(conn):
     try:
         conn.start_transaction()
+        if _captures:
+            _trip()
         yield
         conn.commit()
     except Exception:
         conn.rollback()
         raise
+    finally:
+        if _captures:
+            _trip()
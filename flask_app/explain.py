@@ -0,0 +1,82 @@
+import re
+from .cache import get_cache
+from .db import capture_statements, query_all
+
+# GET pages crawled by `flask explain-check`; one entry per distinct query shape
+ROUTES = [
+    '/',
+    '/ministry', '/ministry?q=DEF00', '/ministry?q=officer', '/ministry?after=DEF001',
+    '/departments', '/departments?q=DPT00', '/departments?q=command',
+    '/vendors', '/vendors?q=VEN00', '/vendors?q=systems',
+    '/products', '/products?q=PRO00', '/products?q=radar', '/products?after=PRO0001',
+    '/requests', '/requests?sort=desc', '/requests?q=REQ000', '/requests?q=Pending', '/requests?q=DPT001',
+    '/logs', '/logs?q=BUD000', '/logs?q=DPT001',
+    '/analytics',
+]
+
+# Tables whose full scans are expected: bounded reference tables and reports that list every row
+ALLOW_FULL_SCAN = {
+    'DEPARTMENT': 'one row per department; dashboard and KPI reports list them all',
+    'MINISTRY': 'one row per official',
+    'SPEND_ROLLUP': 'a few rows per department/vendor/category/day',
+    'ID_SEQUENCE': 'one row per prefix',
+    'VENDOR': 'the vendor performance report lists every vendor',
+}
+
+
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+([A-Z_]+)(?:\s+(?:AS\s+)?(?!WHERE|LEFT|JOIN|ON|GROUP|ORDER|LIMIT|HAVING)([a-z]\w*))?', re.IGNORECASE)
+
+
+def _aliases(sql):
+    # EXPLAIN reports the alias ("pr"); map it back to the table name ("PROCUREMENT_REQUEST")
+    out = {}
+    for table, alias in _TABLE_RE.findall(sql):
+        out[table.upper()] = table.upper()
+        if alias:
+            out[alias.upper()] = table.upper()
+    return out
+
+
+def collect_statements(app, routes=ROUTES):
+    """Run every route through the test client (query cache off) and return the distinct SELECTs issued."""
+    cache = get_cache()
+    ttl, cache.ttl = cache.ttl, 0
+    seen = {}
+    try:
+        client = app.test_client()
+        with capture_statements() as log:
+            for route in routes:
+                before = len(log)
+                resp = client.get(route)
+                if resp.status_code >= 500:
+                    raise RuntimeError(f'GET {route} returned {resp.status_code}')
+                for sql, params in log[before:]:
+                    key = (' '.join(sql.split()), params)
+                    if key[0].upper().startswith('SELECT') and 'information_schema' not in key[0]:
+                        seen.setdefault(key, route)
+    finally:
+        cache.ttl = ttl
+    return [(route, sql, params) for (sql, params), route in seen.items()]
+
+
+def explain_statements(conn, statements, allow=ALLOW_FULL_SCAN, min_rows=1000):
+    """
+    EXPLAIN each (route, sql, params). Returns (report, failures): one report row per
+    plan row, and the subset that are full table scans (type=ALL) of a table that is
+    not allow-listed and is estimated at `min_rows` rows or more. Tiny tables are
+    skipped because the optimizer rightly scans them even when an index exists, so
+    run the check against a realistically sized database.
+    """
+    report, failures = [], []
+    for route, sql, params in statements:
+        aliases = _aliases(sql)
+        for row in query_all(conn, 'EXPLAIN ' + sql, params):
+            table = row.get('table') or ''
+            table = aliases.get(table.upper(), table)
+            entry = dict(route=route, table=table, type=row.get('type'), key=row.get('key'),
+                         rows=row.get('rows'), extra=row.get('Extra'), sql=sql)
+            report.append(entry)
+            if (row.get('type') == 'ALL' and not table.startswith('<')
+                    and table.upper() not in allow and (row.get('rows') or 0) >= min_rows):
+                failures.append(entry)
+    return report, failures
@@ -0,0 +1,98 @@
+from .reports import parse_period, period_filter
+from .search import ENTITIES, LOG_PREFIXES, REQUEST_PREFIXES, entity_search, id_search
+
+# CSV exports of the list pages, by name. The pages stream them right away; a background export
+# (jobs.py) is queued with just the name and the page's filter arguments and rebuilds its query
+# here, so no SQL is ever stored in the JOB table.
+
+REQUEST_COLUMNS = ["Request_ID", "Dept_ID", "Item_ID", "Vendor_ID", "Quantity", "Total_Cost", "Status",
+                   "Date_of_Request", "Approval_Authority", "Date_of_Approval"]
+REQUEST_SELECT = (
+    "SELECT pr.Request_ID, pr.Dept_ID, pr.Item_ID, pr.Vendor_ID, pr.Quantity, pr.Total_Cost, pr.Status, "
+    "pr.Date_of_Request, COALESCE(m.Name, pr.Approval_Authority) AS Approval_Authority, pr.Date_of_Approval "
+    "FROM PROCUREMENT_REQUEST pr "
+    "LEFT JOIN MINISTRY m ON pr.Approval_Authority = m.Admin_ID "
+)
+LOG_COLUMNS = ["Log_ID", "Category", "Dept_ID", "Request_ID", "Admin_ID", "Amount", "Timestamp"]
+
+
+def _search_query(entity, columns):
+    # Full (unpaged) search-box query of a master data page
+    def build(args):
+        sel = f"SELECT {','.join(columns)} FROM {entity}"
+        key = ENTITIES[entity]['id']
+        q = args.get('q', '')
+        if not q:
+            return sel + f" ORDER BY {key}", ()
+        plan = entity_search(entity, q)
+        order = plan.order if plan.ranked else key
+        return sel + f" WHERE {plan.where} ORDER BY {order}", plan.params + plan.order_params
+    return build
+
+
+def request_filter(q):
+    """WHERE clause (without the keyword) and params of the Requests page search box; ('', ()) for none."""
+    if not q:
+        return '', ()
+    plan = id_search(q, REQUEST_PREFIXES, ('pr.Request_ID', 'pr.Dept_ID'), status_col='pr.Status')
+    return plan.where, plan.params
+
+
+def _request_query(args):
+    where, params = request_filter(args.get('q', ''))
+    order = 'ASC' if args.get('sort', '').lower() == 'asc' else 'DESC'
+    return REQUEST_SELECT + (f"WHERE {where} " if where else "") + f"ORDER BY pr.Request_ID {order}", params
+
+
+def log_query(args):
+    """Budget log entries matching ?q= and ?from=/?to=, newest first, as (sql, params) without a LIMIT."""
+    sql = f"SELECT {','.join(LOG_COLUMNS)} FROM BUDGET_LOG"
+    conds, params = [], []
+    q = args.get('q', '').strip()
+    if q:
+        plan = id_search(q, LOG_PREFIXES, ('Admin_ID', 'Dept_ID'))
+        conds.append(f"({plan.where})")
+        params.extend(plan.params)
+    period = parse_period(args)
+    if period:
+        # A Timestamp range lets MySQL prune to the monthly partitions it covers
+        where, period_params = period_filter('Timestamp', period)
+        conds.append(where)
+        params.extend(period_params)
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    return sql + " ORDER BY Timestamp DESC, Log_ID DESC", params
+
+
+def _search_export(entity, filename, columns):
+    return filename, columns, ('q',), _search_query(entity, columns)
+
+
+# Name -> (file name, columns, filter arguments taken from the page, build(args) -> (sql, params))
+EXPORTS = {
+    'ministry': _search_export('MINISTRY', 'ministry.csv', [
+        "Admin_ID", "Name", "Role", "Email", "Phone", "Current_Budget", "Timestamp"]),
+    'departments': _search_export('DEPARTMENT', 'departments.csv', [
+        "Dept_ID", "Name", "Location", "Budget_Allocation", "Current_Budget", "Email", "Region", "Timestamp"]),
+    'vendors': _search_export('VENDOR', 'vendors.csv', [
+        "Vendor_ID", "Company", "Category", "Country", "Email", "Phone", "Blacklisted", "Contract_Expiry_Date"]),
+    'products': _search_export('PRODUCT', 'products.csv', [
+        "Item_ID", "Name", "Category", "Unit_Cost", "Manufacturer", "Country_of_Origin", "Imported",
+        "Stock_Available", "Vendor_ID"]),
+    'requests': ('requests.csv', REQUEST_COLUMNS, ('q', 'sort'), _request_query),
+    'budget_log': ('budget_log.csv', LOG_COLUMNS, ('q', 'from', 'to'), log_query),
+}
+
+
+def export_args(name, source):
+    """The filter arguments export `name` takes, read from `source` (the page's request.args)."""
+    return {k: source.get(k, '').strip() for k in EXPORTS[name][2]}
+
+
+def export_query(name, args):
+    """(file name, columns, sql, params) of export `name` filtered by `args` (see export_args)."""
+    if name not in EXPORTS:
+        raise ValueError(f'Unknown export: {name}')
+    filename, columns, _, build = EXPORTS[name]
+    sql, params = build(args)
+    return filename, columns, sql, params
@@ -0,0 +1,127 @@
+import json
+import os
+from .db import exec_sql, query_batch, query_scalar
+
+# Change feed (migrations/0010_change_feed.sql): triggers append a CHANGE_FEED row for every change
+# to requests, budget log entries, product stock/cost and vendor blacklisting, and consumers read
+# forward from the last Change_ID they saw. AUTO_INCREMENT values are handed out before commit, so
+# a transaction still open can commit a position below one already served. A read therefore stops
+# at the first missing position while any transaction that has written rows and started before the
+# change after the gap is still open (information_schema.innodb_trx, which needs the PROCESS
+# privilege): that transaction may own the gap, however long it runs. Once no such transaction is
+# left, nothing can fill the gap any more (it was rolled back, or compacted away) and it is skipped.
+# Read from the primary: a replica's gaps fill in on its own schedule.
+
+ENTITIES = ('REQUEST', 'BUDGET_LOG', 'PRODUCT', 'VENDOR')
+OPS = {'I': 'insert', 'U': 'update', 'D': 'delete'}
+
+
+class FeedGone(RuntimeError):
+    """The position is older than what retention kept; the consumer must resync from the list endpoints."""
+
+    def __init__(self, purged_through, head):
+        super().__init__(f'Changes up to {purged_through} were purged; resync and resume from {head}')
+        self.purged_through = purged_through
+        self.head = head
+
+
+def head(conn):
+    """Position of the newest change (0 when the feed is empty): where a freshly synced consumer starts."""
+    return int(query_scalar(conn, "SELECT COALESCE(MAX(Change_ID), 0) FROM CHANGE_FEED", None, 0))
+
+
+def read_changes(conn, since, limit=500, entities=None):
+    """
+    Up to `limit` changes after position `since`, oldest first, as (changes, position, more):
+    `position` is where the next read resumes and `more` says a full batch was read, so there may be
+    more to fetch right away. Changes of other `entities` are skipped but still advance the position.
+    Raises FeedGone when `since` is behind the retention horizon.
+    """
+    # Ages (microseconds before NOW(6)) rather than times: trx_started has whole seconds only, which
+    # can only overstate the writer's age, so the comparison below errs towards waiting
+    state, writers, rows = query_batch(conn, [
+        ("SELECT Purged_Through FROM CHANGE_FEED_STATE WHERE Id = 1", None),
+        ("SELECT TIMESTAMPDIFF(MICROSECOND, MIN(trx_started), NOW(6)) AS Age "
+         "FROM information_schema.innodb_trx WHERE trx_rows_modified > 0", None),
+        ("SELECT Change_ID, Entity, Entity_ID, Op, Data, Changed_At, "
+         "TIMESTAMPDIFF(MICROSECOND, Changed_At, NOW(6)) AS Age "
+         "FROM CHANGE_FEED WHERE Change_ID > %s ORDER BY Change_ID LIMIT %s", (since, limit)),
+    ])
+    purged = int(state[0]['Purged_Through']) if state else 0
+    if since < purged:
+        raise FeedGone(purged, head(conn))
+    oldest_writer = writers[0]['Age'] if writers else None
+    out, position, more = [], since, len(rows) == limit
+    for r in rows:
+        if r['Change_ID'] != position + 1 and oldest_writer is not None and oldest_writer >= r['Age']:
+            # A writer older than this change is still open and may commit a position below it:
+            # serve from here on a later read
+            more = False
+            break
+        position = r['Change_ID']
+        if entities and r['Entity'] not in entities:
+            continue
+        data = r['Data']
+        out.append(dict(position=position, entity=r['Entity'], id=r['Entity_ID'], op=OPS.get(r['Op'], r['Op']),
+                        at=r['Changed_At'], data=json.loads(data) if data else None))
+    return out, position, more
+
+
+def _first_newer_than(conn, seconds):
+    # Change_IDs follow Changed_At closely enough to cut at the first change of the last `seconds`.
+    # The cutoff is taken on the server's clock, the one Changed_At was stamped with.
+    first = query_scalar(conn, (
+        "SELECT Change_ID FROM CHANGE_FEED WHERE Changed_At >= NOW(6) - INTERVAL %s SECOND "
+        "ORDER BY Changed_At LIMIT 1"
+    ), (int(seconds),))
+    return int(first) if first is not None else head(conn) + 1
+
+
+def purge(conn, retain_days=None, compact_hours=None, chunk=10000):
+    """
+    Keep CHANGE_FEED bounded. Changes older than `retain_days` (FEED_RETENTION_DAYS, default 7)
+    are deleted, and readers still behind them get FeedGone. Among changes older than
+    `compact_hours` (FEED_COMPACT_HOURS, default 24), only the newest one of each row is kept, so
+    a consumer that far behind catches up on final states. Deletes run `chunk` positions at a
+    time, each in its own autocommit statement. Returns dict(purged=, compacted=).
+    """
+    retain_days = float(os.environ.get('FEED_RETENTION_DAYS', '7') if retain_days is None else retain_days)
+    compact_hours = float(os.environ.get('FEED_COMPACT_HOURS', '24') if compact_hours is None else compact_hours)
+    done = dict(purged=0, compacted=0)
+    if retain_days > 0:
+        keep_from = _first_newer_than(conn, retain_days * 86400)
+        # Horizon first: a reader must never be served from a range that is being deleted
+        exec_sql(conn, "UPDATE CHANGE_FEED_STATE SET Purged_Through = GREATEST(Purged_Through, %s) WHERE Id = 1",
+                 (keep_from - 1,))
+        while True:
+            n = exec_sql(conn, "DELETE FROM CHANGE_FEED WHERE Change_ID < %s ORDER BY Change_ID LIMIT %s",
+                         (keep_from, chunk))
+            done['purged'] += n
+            if n < chunk:
+                break
+    if compact_hours > 0:
+        upto = _first_newer_than(conn, compact_hours * 3600) - 1
+        lo = int(query_scalar(conn, "SELECT GREATEST(Compacted_Through, Purged_Through) FROM CHANGE_FEED_STATE "
+                                    "WHERE Id = 1", None, 0))
+        while lo < upto:
+            hi = min(lo + chunk, upto)
+            done['compacted'] += exec_sql(conn, (
+                "DELETE f FROM CHANGE_FEED f JOIN CHANGE_FEED n "
+                "ON n.Entity = f.Entity AND n.Entity_ID = f.Entity_ID AND n.Change_ID > f.Change_ID "
+                "WHERE f.Change_ID > %s AND f.Change_ID <= %s"
+            ), (lo, hi))
+            exec_sql(conn, "UPDATE CHANGE_FEED_STATE SET Compacted_Through = %s WHERE Id = 1", (hi,))
+            lo = hi
+    return done
+
+
+def status(conn):
+    """Head, retention horizons and size of the feed."""
+    state, span = query_batch(conn, [
+        ("SELECT Purged_Through, Compacted_Through, Updated_At FROM CHANGE_FEED_STATE WHERE Id = 1", None),
+        ("SELECT COUNT(*) AS Changes, MIN(Change_ID) AS First, MAX(Change_ID) AS Head, MIN(Changed_At) AS Oldest "
+         "FROM CHANGE_FEED", None),
+    ])
+    out = dict(state[0]) if state else dict(Purged_Through=0, Compacted_Through=0, Updated_At=None)
+    out.update(span[0])
+    return out
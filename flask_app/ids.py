@@ -0,0 +1,104 @@
+import os
+import threading
+from .db import get_pool
+
+# Prefix -> (table, id column, zero-padded width of the numeric part)
+ID_FORMATS = {
+    'DEF': ('MINISTRY', 'Admin_ID', 3),
+    'DPT': ('DEPARTMENT', 'Dept_ID', 3),
+    'VEN': ('VENDOR', 'Vendor_ID', 3),
+    'PRO': ('PRODUCT', 'Item_ID', 4),
+    'REQ': ('PROCUREMENT_REQUEST', 'Request_ID', 7),
+    'BUD': ('BUDGET_LOG', 'Log_ID', 7),
+}
+
+# Request IDs back the "Newest first" ordering, so they are handed out one at a
+# time by default; log IDs are never sorted on alone and can come in blocks.
+DEFAULT_BLOCKS = {'BUD': 32}
+
+
+class IdAllocator:
+    """
+    Hands out IDs from the ID_SEQUENCE table (see migrations/0001_id_sequence.sql).
+
+    Numbers are reserved in blocks on a separate autocommit connection, so the
+    counter row is locked only for the duration of one UPDATE and never for the
+    caller's transaction. Reserved-but-unused numbers are lost on restart (gaps).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._pid = os.getpid()
+
+    def block_size(self, prefix):
+        return max(1, int(os.environ.get(f'ID_BLOCK_{prefix}', DEFAULT_BLOCKS.get(prefix, 1))))
+
+    def next_id(self, prefix):
+        return self.reserve(prefix, 1)[0]
+
+    def reserve(self, prefix, n):
+        width = ID_FORMATS[prefix][2]
+        nums = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # Blocks cached before a fork would be handed out twice
+                self._blocks.clear()
+                self._pid = os.getpid()
+            while len(nums) < n:
+                nxt, end = self._blocks.get(prefix, (0, 0))
+                if nxt >= end:
+                    size = max(self.block_size(prefix), n - len(nums))
+                    nxt = self._fetch_block(prefix, size)
+                    end = nxt + size
+                take = min(end - nxt, n - len(nums))
+                nums.extend(range(nxt, nxt + take))
+                self._blocks[prefix] = (nxt + take, end)
+        return [f"{prefix}{v:0{width}d}" for v in nums]
+
+    def reserve_range(self, prefix, n):
+        """Reserve n consecutive numbers straight from ID_SEQUENCE (bulk loads); returns a range."""
+        start = self._fetch_block(prefix, n)
+        return range(start, start + n)
+
+    def _fetch_block(self, prefix, size):
+        pool = get_pool()
+        conn = pool.acquire()
+        try:
+            cur = conn.cursor()
+            for _ in range(2):
+                cur.execute(
+                    "UPDATE ID_SEQUENCE SET Next_Value = LAST_INSERT_ID(Next_Value) + %s WHERE Prefix=%s",
+                    (size, prefix),
+                )
+                if cur.rowcount:
+                    cur.execute("SELECT LAST_INSERT_ID()")
+                    start = int(cur.fetchone()[0])
+                    cur.close()
+                    return start
+                # Counter missing (migration not seeded for this prefix): seed from the table once
+                table, col, _ = ID_FORMATS[prefix]
+                cur.execute(
+                    f"INSERT IGNORE INTO ID_SEQUENCE (Prefix, Next_Value) "
+                    f"SELECT %s, COALESCE(MAX(CAST(SUBSTRING({col},4) AS UNSIGNED)),0)+1 FROM {table}",
+                    (prefix,),
+                )
+            cur.close()
+            raise RuntimeError(f'Could not allocate {prefix} IDs (is ID_SEQUENCE migrated?)')
+        finally:
+            pool.release(conn)
+
+
+allocator = IdAllocator()
+
+
+def next_id(prefix):
+    return allocator.next_id(prefix)
+
+
+def reserve_ids(prefix, n):
+    return allocator.reserve(prefix, n)
+
+
+def format_id(prefix, num):
+    return f"{prefix}{num:0{ID_FORMATS[prefix][2]}d}"
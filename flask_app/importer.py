@@ -0,0 +1,359 @@
+import csv
+import io
+import json
+import time
+from datetime import date
+from .cache import invalidate
+from .db import query_all
+from .ids import ID_FORMATS, reserve_ids
+from . import money
+
+# Rows validated, staged and merged per round
+CHUNK = 5000
+
+VENDOR_CATEGORIES = ('Vehicles', 'Ammunition', 'IT & Communication', 'Cybersecurity',
+                     'Uniforms & Gear', 'Medical', 'Others')
+PRODUCT_CATEGORIES = (
+    'Tanks', 'Armored Trucks', 'Fighter Jets', 'Submarines', 'Drones', 'Transport Aircraft',
+    'Rifles', 'Missiles', 'Artillery System', 'Air-defence systems',
+    'Radios', 'Satellite Phones', 'Secure Routers', 'Command Servers', 'Radar installations',
+    'Firewalls', 'Threat monitoring platforms', 'Data centers',
+    'Helmets', 'Defence suits', 'Uniform',
+    'First-aid kits', 'Medical drones', 'Surgical instruments',
+    'Others',
+)
+_CATEGORY_ALIASES = {
+    'threat intelligence platform': 'Threat monitoring platforms',
+    'boots': 'Uniform',
+    'field hospitals': 'Others',
+    'miscellaneous': 'Others',
+}
+_PRODUCT_CATEGORY_MAP = {c.lower(): c for c in PRODUCT_CATEGORIES}
+_VENDOR_CATEGORY_MAP = {c.lower(): c for c in VENDOR_CATEGORIES}
+
+
+def normalize_category(cat):
+    """Python twin of the SQL normalize_category() function (F4), so rows can be checked before loading."""
+    key = (cat or '').strip().lower()
+    return _PRODUCT_CATEGORY_MAP.get(key) or _CATEGORY_ALIASES.get(key) or 'Others'
+
+
+class Reject(ValueError):
+    pass
+
+
+def _text(v, n, field):
+    v = (v or '').strip() if isinstance(v, str) or v is None else str(v).strip()
+    if len(v) > n:
+        raise Reject(f'{field} longer than {n} characters')
+    return v or None
+
+
+def _decimal(v, field, digits, places):
+    try:
+        return money.parse(v, digits, places, field)
+    except ValueError as e:
+        raise Reject(str(e))
+
+
+def _int(v, field):
+    if v in (None, ''):
+        return None
+    try:
+        n = int(str(v).strip())
+    except ValueError:
+        raise Reject(f'{field} is not an integer')
+    if n < 0:
+        raise Reject(f'{field} is negative')
+    return n
+
+
+def _bool(v):
+    if isinstance(v, bool) or v is None:
+        return v
+    v = str(v).strip().lower()
+    return v in ('1', 'true', 'yes', 'y', 'on') if v else None
+
+
+def _date(v, field):
+    if v in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(str(v).strip()[:10])
+    except ValueError:
+        raise Reject(f'{field} is not a YYYY-MM-DD date')
+
+
+def _clean_vendor(r):
+    cat = _VENDOR_CATEGORY_MAP.get((r.get('Category') or '').strip().lower())
+    if not cat:
+        raise Reject('Category must be one of ' + ', '.join(VENDOR_CATEGORIES))
+    company = _text(r.get('Company'), 100, 'Company')
+    if not company:
+        raise Reject('Company is required')
+    email = _text(r.get('Email'), 100, 'Email')
+    return dict(Company=company, Category=cat, Country=_text(r.get('Country'), 50, 'Country'),
+                Email=email.lower() if email else None, Phone=_text(r.get('Phone'), 20, 'Phone'),
+                Contract_Expiry_Date=_date(r.get('Contract_Expiry_Date'), 'Contract_Expiry_Date'))
+
+
+def _clean_product(r):
+    name = _text(r.get('Name'), 100, 'Name')
+    if not name:
+        raise Reject('Name is required')
+    cost = _decimal(r.get('Unit_Cost'), 'Unit_Cost', 12, 2)
+    if cost is None:
+        raise Reject('Unit_Cost is required')
+    vendor = _text(r.get('Vendor_ID'), 6, 'Vendor_ID')
+    if not vendor:
+        raise Reject('Vendor_ID is required')
+    cat = (r.get('Category') or '').strip()
+    return dict(Name=name, Category=normalize_category(cat) if cat else None, Unit_Cost=cost,
+                Manufacturer=_text(r.get('Manufacturer'), 100, 'Manufacturer'),
+                Country_of_Origin=_text(r.get('Country_of_Origin'), 50, 'Country_of_Origin'),
+                Imported=_bool(r.get('Imported')), Stock_Available=_int(r.get('Stock_Available'), 'Stock_Available'),
+                Vendor_ID=vendor.upper())
+
+
+def _clean_department(r):
+    name = _text(r.get('Name'), 100, 'Name')
+    if not name:
+        raise Reject('Name is required')
+    email = _text(r.get('Email'), 100, 'Email')
+    if not email:
+        raise Reject('Email is required')
+    alloc = _decimal(r.get('Budget_Allocation'), 'Budget_Allocation', 20, 8)
+    current = _decimal(r.get('Current_Budget'), 'Current_Budget', 20, 8)
+    return dict(Name=name, Location=_text(r.get('Location'), 100, 'Location'), Budget_Allocation=alloc,
+                Current_Budget=current, Email=email.lower(),
+                Region=_text(r.get('Region'), 50, 'Region'))
+
+
+def _check_vendors(conn, rows):
+    # Products must point at a known, non-blacklisted vendor: one lookup per chunk
+    ids = sorted({r['Vendor_ID'] for _, r in rows})
+    found = {v['Vendor_ID']: v['Blacklisted'] for v in query_all(conn, (
+        f"SELECT Vendor_ID, Blacklisted FROM VENDOR WHERE Vendor_ID IN ({','.join(['%s'] * len(ids))})"), ids)}
+    bad = {}
+    for line, r in rows:
+        if r['Vendor_ID'] not in found:
+            bad[line] = f"Unknown Vendor_ID {r['Vendor_ID']}"
+        elif found[r['Vendor_ID']]:
+            bad[line] = f"Vendor {r['Vendor_ID']} is blacklisted"
+    return bad
+
+
+def _check_department_emails(conn, rows):
+    # Email is UNIQUE on DEPARTMENT: refuse rows that would collide with another department
+    emails = sorted({r['Email'] for _, r in rows})
+    owner = {d['Email'].lower(): d['Dept_ID'] for d in query_all(conn, (
+        f"SELECT Dept_ID, Email FROM DEPARTMENT WHERE Email IN ({','.join(['%s'] * len(emails))})"), emails)}
+    bad, seen = {}, {}
+    for line, r in rows:
+        other = owner.get(r['Email'])
+        if other and other != r['Dept_ID']:
+            bad[line] = f"Email {r['Email']} already belongs to {other}"
+        elif seen.setdefault(r['Email'], r['Dept_ID']) != r['Dept_ID']:
+            bad[line] = f"Email {r['Email']} is also used by {seen[r['Email']]} in this import"
+    return bad
+
+
+# kind -> table, key column, ID prefix, columns (besides the key), row cleaner, batch checks and
+# SQL used for a column when inserting new rows. Blacklisting is not importable on purpose.
+KINDS = {
+    'vendors': dict(table='VENDOR', key='Vendor_ID', prefix='VEN', clean=_clean_vendor, checks=(),
+                    columns=('Company', 'Category', 'Country', 'Email', 'Phone', 'Contract_Expiry_Date')),
+    'products': dict(table='PRODUCT', key='Item_ID', prefix='PRO', clean=_clean_product, checks=(_check_vendors,),
+                     insert={'Category': "COALESCE(s.Category, 'Others')", 'Imported': 'COALESCE(s.Imported, FALSE)'},
+                     columns=('Name', 'Category', 'Unit_Cost', 'Manufacturer', 'Country_of_Origin', 'Imported',
+                              'Stock_Available', 'Vendor_ID')),
+    'departments': dict(table='DEPARTMENT', key='Dept_ID', prefix='DPT', clean=_clean_department,
+                        checks=(_check_department_emails,),
+                        insert={'Current_Budget': 'COALESCE(s.Current_Budget, s.Budget_Allocation)'},
+                        columns=('Name', 'Location', 'Budget_Allocation', 'Current_Budget', 'Email', 'Region')),
+}
+
+
+def read_records(stream, fmt):
+    """Yield (line number, {column: value}) from a CSV or JSONL text stream, one row at a time."""
+    if fmt == 'jsonl':
+        for n, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    rec = json.loads(line)
+                except ValueError as e:
+                    yield n, e
+                    continue
+                yield n, rec if isinstance(rec, dict) else ValueError('not a JSON object')
+        return
+    reader = csv.DictReader(stream)
+    for rec in reader:
+        yield reader.line_num, rec
+
+
+def _canonical(rec, names):
+    # Accept any header case: vendor_id / VENDOR_ID / Vendor_ID
+    return {names.get(str(k).strip().lower(), k): v for k, v in rec.items() if k is not None}
+
+
+class ImportResult:
+    def __init__(self, kind):
+        self.kind = kind
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def as_dict(self, max_rejects=1000):
+        return dict(kind=self.kind, read=self.read, inserted=self.inserted, updated=self.updated,
+                    rejected=len(self.rejected), seconds=round(self.seconds, 3),
+                    rows_per_sec=round(self.rows_per_sec, 1),
+                    rejects=[dict(line=l, id=k, reason=m) for l, k, m in sorted(self.rejected, key=lambda x: x[0])[:max_rejects]])
+
+
+class Importer:
+    """
+    Chunked bulk upsert of master data.
+
+    Each chunk is cleaned row by row, checked against the database in one query per
+    rule, written to a session TEMPORARY staging table (executemany, or LOAD DATA
+    LOCAL INFILE with infile=True) and merged with a single INSERT ... SELECT ...
+    ON DUPLICATE KEY UPDATE. Rows without an ID get one from ID_SEQUENCE; rows with
+    an existing ID update that row, leaving columns that are blank in the file as
+    they are. Bad rows are reported, never loaded.
+    """
+
+    def __init__(self, conn, kind, infile=False, chunk=CHUNK):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown import kind: {kind}')
+        self.conn = conn
+        self.kind = kind
+        self.spec = KINDS[kind]
+        self.infile = infile
+        self.chunk = chunk
+        self.cols = (self.spec['key'],) + self.spec['columns']
+        self.stage = f"stg_{self.spec['table'].lower()}"
+        self._names = {c.lower(): c for c in self.cols}
+
+    def run(self, records):
+        result = ImportResult(self.kind)
+        t0 = time.perf_counter()
+        self._create_stage()
+        try:
+            batch = []
+            for line, rec in records:
+                result.read += 1
+                batch.append((line, rec))
+                if len(batch) >= self.chunk:
+                    self._chunk(batch, result)
+                    batch = []
+            if batch:
+                self._chunk(batch, result)
+        finally:
+            self._execute(f"DROP TEMPORARY TABLE IF EXISTS {self.stage}")
+        result.seconds = time.perf_counter() - t0
+        if result.inserted or result.updated:
+            invalidate(self.spec['table'], 'REF_' + self.spec['table'])
+        return result
+
+    def _execute(self, sql, params=()):
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        cur.close()
+
+    def _create_stage(self):
+        # Same column types as the target; no indexes, FKs or triggers
+        self._execute(f"DROP TEMPORARY TABLE IF EXISTS {self.stage}")
+        self._execute(f"CREATE TEMPORARY TABLE {self.stage} AS SELECT {', '.join(self.cols)} "
+                      f"FROM {self.spec['table']} LIMIT 0")
+
+    def _chunk(self, batch, result):
+        key, prefix = self.spec['key'], self.spec['prefix']
+        width = 3 + ID_FORMATS[prefix][2]
+        good, by_key = [], {}
+        for line, rec in batch:
+            if isinstance(rec, Exception):
+                result.rejected.append((line, None, f'Unreadable row: {rec}'))
+                continue
+            rec = _canonical(rec, self._names)
+            rid = (str(rec.get(key) or '')).strip().upper() or None
+            try:
+                if rid and (len(rid) > width or not rid.startswith(prefix)):
+                    raise Reject(f'{key} must look like {prefix}{"0" * ID_FORMATS[prefix][2]}')
+                row = self.spec['clean'](rec)
+            except Reject as e:
+                result.rejected.append((line, rid, str(e)))
+                continue
+            row[key] = rid
+            if rid in by_key:
+                # Later rows for the same ID win; the earlier one is reported
+                prev = by_key[rid]
+                result.rejected.append((good[prev][0], rid, f'Superseded by line {line}'))
+                good[prev] = None
+            if rid:
+                by_key[rid] = len(good)
+            good.append((line, row))
+        good = [g for g in good if g is not None]
+        new = [r for _, r in good if not r[key]]
+        if new:
+            for r, nid in zip(new, reserve_ids(prefix, len(new))):
+                r[key] = nid
+        for check in self.spec['checks']:
+            if not good:
+                break
+            bad = check(self.conn, good)
+            if bad:
+                result.rejected.extend((line, r[key], bad[line]) for line, r in good if line in bad)
+                good = [(line, r) for line, r in good if line not in bad]
+        if not good:
+            return
+        keys = [r[key] for _, r in good]
+        existing = {r[key] for r in query_all(self.conn, (
+            f"SELECT {key} FROM {self.spec['table']} WHERE {key} IN ({','.join(['%s'] * len(keys))})"), keys)}
+        self._stage([[r[c] for c in self.cols] for _, r in good])
+        # Updates read the staged row itself (s.col), so blank cells keep the current value
+        # rather than picking up the insert-only defaults
+        table = self.spec['table']
+        updates = ', '.join(f'{table}.{c} = COALESCE(s.{c}, {table}.{c})' for c in self.spec['columns'])
+        exprs = self.spec.get('insert', {})
+        self._execute(f"INSERT INTO {table} ({', '.join(self.cols)}) "
+                      f"SELECT {', '.join(exprs.get(c, 's.' + c) for c in self.cols)} FROM {self.stage} s "
+                      f"ON DUPLICATE KEY UPDATE {updates}")
+        self.conn.commit()
+        self._execute(f"TRUNCATE TABLE {self.stage}")
+        result.updated += len(existing)
+        result.inserted += len(good) - len(existing)
+
+    def _stage(self, rows):
+        if self.infile:
+            from .datagen import load_rows
+            load_rows(self.conn, self.stage, self.cols, rows)
+            return
+        cur = self.conn.cursor()
+        # mysql-connector rewrites this into multi-row INSERTs
+        cur.executemany(f"INSERT INTO {self.stage} ({', '.join(self.cols)}) "
+                        f"VALUES ({', '.join(['%s'] * len(self.cols))})", rows)
+        cur.close()
+
+
+def detect_format(filename, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def import_stream(conn, kind, stream, fmt='csv', infile=False):
+    """Import from a text stream (file, upload wrapper); returns an ImportResult."""
+    return Importer(conn, kind, infile=infile).run(read_records(stream, fmt))
+
+
+def import_upload(conn, kind, storage, infile=False):
+    """Import a werkzeug FileStorage without reading it into memory."""
+    fmt = detect_format(storage.filename or '')
+    stream = io.TextIOWrapper(storage.stream, encoding='utf-8-sig', newline='')
+    return import_stream(conn, kind, stream, fmt, infile=infile)
@@ -0,0 +1,227 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from flask import Response, g, has_app_context, has_request_context, request, before_render_template, template_rendered
+from . import db
+
+log = logging.getLogger('flask_app.slow_query')
+
+# Request latency buckets (seconds) for /metrics
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b|%s")
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """SQL with literals and placeholders replaced by ?, IN-lists folded: one entry per query shape."""
+    s = _LITERAL_RE.sub('?', ' '.join(sql.split()))
+    return _IN_LIST_RE.sub('(?+)', s)
+
+
+class Metrics:
+    """Per-route request histograms and per-fingerprint statement totals, kept in process."""
+
+    def __init__(self, slow_ms=200.0, explain=True, keep_slow=100):
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.queries = {}
+        self.slow = deque(maxlen=keep_slow)
+        self._explained = {}
+
+    def observe_statement(self, sql, params, seconds, rows):
+        fp = fingerprint(sql)
+        with self.lock:
+            q = self.queries.get(fp)
+            if q is None:
+                q = self.queries[fp] = dict(count=0, seconds=0.0, max=0.0, rows=0)
+            q['count'] += 1
+            q['seconds'] += seconds
+            q['rows'] += max(rows or 0, 0)
+            q['max'] = max(q['max'], seconds)
+        if has_app_context():
+            st = g.get('_inst')
+            if st is not None:
+                st['queries'] += 1
+                st['db'] += seconds
+                st['rows'] += max(rows or 0, 0)
+        if seconds * 1000.0 >= self.slow_ms:
+            self._slow(fp, sql, params, seconds, rows)
+
+    def _slow(self, fp, sql, params, seconds, rows):
+        route = request.path if has_request_context() else None
+        entry = dict(at=time.strftime('%Y-%m-%dT%H:%M:%S'), ms=round(seconds * 1000.0, 2), rows=rows,
+                     route=route, fingerprint=fp, plan=None)
+        if self.explain and sql.lstrip().upper().startswith('SELECT'):
+            entry['plan'] = self._explain(fp, sql, params)
+        with self.lock:
+            self.slow.append(entry)
+        log.warning('slow query %.1f ms rows=%s route=%s: %s', entry['ms'], rows, route, fp)
+        if entry['plan']:
+            for p in entry['plan']:
+                log.warning('  plan: table=%s type=%s key=%s rows=%s extra=%s',
+                            p.get('table'), p.get('type'), p.get('key'), p.get('rows'), p.get('Extra'))
+
+    def _explain(self, fp, sql, params):
+        # At most one EXPLAIN per query shape per minute, on a separate pooled connection
+        # (the caller's connection may be mid-transaction or streaming)
+        now = time.monotonic()
+        with self.lock:
+            if now - self._explained.get(fp, -60.0) < 60.0:
+                return None
+            self._explained[fp] = now
+        pool = db.get_pool()
+        conn = pool.acquire()
+        try:
+            cur = conn.cursor(dictionary=True)
+            cur.execute('EXPLAIN ' + sql, params or ())
+            plan = cur.fetchall()
+            cur.close()
+            return plan
+        except Exception as e:
+            return [dict(error=str(e))]
+        finally:
+            pool.release(conn)
+
+    def observe_request(self, route, method, seconds, st):
+        key = (route, method)
+        with self.lock:
+            r = self.routes.get(key)
+            if r is None:
+                r = self.routes[key] = dict(buckets=[0] * len(BUCKETS), count=0, sum=0.0,
+                                            queries=0, db=0.0, render=0.0)
+            for i, le in enumerate(BUCKETS):
+                if seconds <= le:
+                    r['buckets'][i] += 1
+            r['count'] += 1
+            r['sum'] += seconds
+            r['queries'] += st['queries']
+            r['db'] += st['db']
+            r['render'] += st['render']
+
+    def top_queries(self, n=20):
+        with self.lock:
+            items = [dict(fingerprint=fp, **q) for fp, q in self.queries.items()]
+        items.sort(key=lambda q: q['seconds'], reverse=True)
+        return items[:n]
+
+
+_metrics = None
+
+
+def get_metrics():
+    return _metrics
+
+
+def _before_request():
+    g._inst = dict(t0=time.perf_counter(), queries=0, db=0.0, rows=0, render=0.0)
+
+
+def _before_render(sender, template, context, **extra):
+    st = g.get('_inst')
+    if st is not None:
+        st['render_t0'] = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    st = g.get('_inst')
+    if st is not None and 'render_t0' in st:
+        st['render'] += time.perf_counter() - st.pop('render_t0')
+
+
+def _after_request(response):
+    st = g.get('_inst')
+    if st is None:
+        return response
+    total = time.perf_counter() - st['t0']
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    _metrics.observe_request(route, request.method, total, st)
+    # Streamed responses (CSV export) report only what ran before the first byte
+    response.headers['X-DB-Queries'] = str(st['queries'])
+    response.headers['X-DB-Time-ms'] = f"{st['db'] * 1000.0:.2f}"
+    response.headers['Server-Timing'] = (
+        f'db;dur={st["db"] * 1000.0:.2f};desc="{st["queries"]} queries", '
+        f'render;dur={st["render"] * 1000.0:.2f}, '
+        f'app;dur={max(total - st["db"] - st["render"], 0.0) * 1000.0:.2f}, '
+        f'total;dur={total * 1000.0:.2f}'
+    )
+    return response
+
+
+def init_instrumentation(app):
+    """
+    Turn on statement timing, per-request totals (X-DB-* and Server-Timing headers),
+    the slow-query log and the request histograms behind /metrics when DB_INSTRUMENT=1.
+    When off nothing is registered and the db helpers skip timing entirely.
+    """
+    global _metrics
+    if os.environ.get('DB_INSTRUMENT', '0').lower() not in ('1', 'true', 'yes', 'on'):
+        return False
+    _metrics = Metrics(slow_ms=float(os.environ.get('DB_SLOW_MS', '200')),
+                       explain=os.environ.get('DB_SLOW_EXPLAIN', '1') != '0')
+    db.set_observer(_metrics.observe_statement)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    return True
+
+
+def _label(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics(pool, cache):
+    """Prometheus text exposition (format 0.0.4) of request, pool and cache metrics."""
+    out = []
+
+    def metric(name, kind, help_, samples):
+        out.append(f'# HELP {name} {help_}')
+        out.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lbl = ','.join(f'{k}="{_label(v)}"' for k, v in labels)
+            out.append(f'{name}{{{lbl}}} {value}' if lbl else f'{name} {value}')
+
+    m = _metrics
+    if m is not None:
+        with m.lock:
+            routes = {k: dict(v, buckets=list(v['buckets'])) for k, v in m.routes.items()}
+            slow = len(m.slow)
+        hist = []
+        for (route, method), r in sorted(routes.items()):
+            base = (('route', route), ('method', method))
+            for le, n in zip(BUCKETS, r['buckets']):
+                hist.append((base + (('le', le),), n))
+            hist.append((base + (('le', '+Inf'),), r['count']))
+        out.append('# HELP http_request_duration_seconds Request latency by route.')
+        out.append('# TYPE http_request_duration_seconds histogram')
+        for labels, value in hist:
+            lbl = ','.join(f'{k}="{_label(v)}"' for k, v in labels)
+            out.append(f'http_request_duration_seconds_bucket{{{lbl}}} {value}')
+        for (route, method), r in sorted(routes.items()):
+            lbl = f'route="{_label(route)}",method="{method}"'
+            out.append(f'http_request_duration_seconds_sum{{{lbl}}} {r["sum"]:.6f}')
+            out.append(f'http_request_duration_seconds_count{{{lbl}}} {r["count"]}')
+        metric('http_request_db_queries_total', 'counter', 'Statements issued, by route.',
+               [((('route', k[0]), ('method', k[1])), r['queries']) for k, r in sorted(routes.items())])
+        metric('http_request_db_seconds_total', 'counter', 'Time spent in statements, by route.',
+               [((('route', k[0]), ('method', k[1])), f"{r['db']:.6f}") for k, r in sorted(routes.items())])
+        metric('http_request_render_seconds_total', 'counter', 'Time spent rendering templates, by route.',
+               [((('route', k[0]), ('method', k[1])), f"{r['render']:.6f}") for k, r in sorted(routes.items())])
+        metric('db_slow_queries_recent', 'gauge', 'Slow statements kept in the in-memory log.', [((), slow)])
+    metric('db_pool_in_use', 'gauge', 'Checked-out connections.', [((), pool['in_use'])])
+    metric('db_pool_idle', 'gauge', 'Idle pooled connections.', [((), pool['idle'])])
+    metric('db_pool_checkouts_total', 'counter', 'Connection checkouts.', [((), pool['checkouts'])])
+    metric('db_pool_timeouts_total', 'counter', 'Checkouts that timed out.', [((), pool['timeouts'])])
+    metric('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.',
+           [((), f"{pool['wait_total']:.6f}")])
+    metric('cache_hits_total', 'counter', 'Query cache hits.', [((), cache['hits'])])
+    metric('cache_misses_total', 'counter', 'Query cache misses.', [((), cache['misses'])])
+    return Response('\n'.join(out) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,337 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from .cache import invalidate
+from .db import exec_sql, get_pool, iter_rows, query_all, query_row, query_scalar, transactional
+from .exports import export_query
+from . import refdata
+from .reconcile import reconcile, summary, write_report
+from .workflow import CHUNK, run_batch
+
+log = logging.getLogger('flask_app.jobs')
+
+# Background jobs (JOB table, migrations/0008). Web routes enqueue and return at once; worker threads
+# claim queued jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of threads or processes can
+# share the queue. A worker uses two pooled connections: one for the job's own statements and one for
+# the JOB row (claim, progress, result), which an unbuffered export cursor would otherwise block.
+# Every job kind is safe to run again from the start, so a job whose worker died is simply requeued.
+
+
+def jobs_dir():
+    """Where result files go (JOBS_DIR, default <tmp>/defense_db_jobs); shared by web and worker processes."""
+    path = os.environ.get('JOBS_DIR') or os.path.join(tempfile.gettempdir(), 'defense_db_jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class Progress:
+    """
+    Handed to job handlers; writes Progress/Total at most every JOBS_PROGRESS_SECONDS. While the
+    handler runs, a timer thread also bumps the heartbeat every JOBS_HEARTBEAT_SECONDS (default 30),
+    so a long step between progress calls does not get the job requeued under it. Every write is
+    limited to this worker's attempt: once the job was requeued, this attempt no longer touches it.
+    """
+
+    def __init__(self, conn, job_id, worker, attempt):
+        self.conn = conn
+        self.job_id = job_id
+        self.worker = worker
+        self.attempt = attempt
+        self.done = 0
+        self.interval = float(os.environ.get('JOBS_PROGRESS_SECONDS', '1'))
+        self._last = 0.0
+        # The status connection is shared by the handler's thread and the heartbeat thread
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._beat = None
+
+    def _update(self, sets, params=()):
+        with self._lock:
+            return exec_sql(self.conn, (
+                f"UPDATE JOB SET {sets}, Heartbeat_At=NOW(6) "
+                "WHERE Job_ID=%s AND Worker=%s AND Attempts=%s AND Status='running'"
+            ), tuple(params) + (self.job_id, self.worker, self.attempt))
+
+    def total(self, n):
+        self._update("Total=%s", (n,))
+
+    def __call__(self, done):
+        self.done = done
+        if time.monotonic() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self._update("Progress=%s", (self.done,))
+        self._last = time.monotonic()
+
+    def start(self):
+        interval = float(os.environ.get('JOBS_HEARTBEAT_SECONDS', '30'))
+        self._beat = threading.Thread(target=self._heartbeat, args=(interval,), daemon=True,
+                                      name=f'job-{self.job_id}-heartbeat')
+        self._beat.start()
+
+    def _heartbeat(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self._update("Progress=Progress")
+            except Exception:
+                log.exception('job %s heartbeat failed', self.job_id)
+
+    def stop(self):
+        self._stop.set()
+        if self._beat is not None:
+            self._beat.join()
+
+    def finish(self, state, message, path):
+        """Record the outcome; False when the job was requeued meanwhile and this attempt no longer owns it."""
+        return bool(self._update("Status=%s, Message=%s, Result_Path=%s, Progress=%s, Finished_At=NOW(6)",
+                                 (state, message, path, self.done)))
+
+
+def _export(conn, params, progress):
+    # Same columns/SQL the synchronous export would stream, rebuilt from the export's name and
+    # filters (exports.py) and written to a result file instead
+    filename, columns, sql, sql_params = export_query(params['export'], params.get('args', {}))
+    batch = int(os.environ.get('EXPORT_BATCH_ROWS', '2000'))
+    name = f"job-{progress.job_id}-{filename}" + ('.gz' if params.get('gzip') else '')
+    path = os.path.join(jobs_dir(), name)
+    rows = iter_rows(conn, sql, sql_params, batch)
+    next(rows)
+    opener = gzip.open if params.get('gzip') else open
+    n = 0
+    # Per attempt: a requeued job's earlier attempt may still be writing its own copy
+    part = f'{path}.{progress.attempt}.part'
+    with opener(part, 'wt', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(columns)
+        for r in rows:
+            w.writerow(r)
+            n += 1
+            if n % batch == 0:
+                progress(n)
+    os.replace(part, path)
+    progress(n)
+    return f'{n} rows exported', path
+
+
+def _write_report(job_id, report):
+    path = os.path.join(jobs_dir(), f'job-{job_id}-report.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Request_ID', 'OK', 'Message'])
+        w.writerows((r['request_id'], int(r['ok']), r['message']) for r in report)
+    return path
+
+
+def _batch(conn, params, progress):
+    action, ids = params['action'], params['request_ids']
+    progress.total(len(ids))
+    report = []
+    for i in range(0, len(ids), CHUNK):
+        report.extend(run_batch(conn, action, ids[i:i + CHUNK], params['admin_id'], params.get('backend', 'python')))
+        progress(len(report))
+    ok = sum(1 for r in report if r['ok'])
+    if ok:
+        invalidate('PROCUREMENT_REQUEST', 'DEPARTMENT', 'PRODUCT', 'BUDGET_LOG')
+    done = {'approve': 'Approved', 'reject': 'Rejected', 'cancel': 'Cancelled'}[action]
+    return f'{done} {ok} of {len(report)} requests', _write_report(progress.job_id, report)
+
+
+def _blacklist(conn, params, progress):
+    # Blacklist the vendor, then reject every Pending request still addressed to it. New requests
+    # for a blacklisted vendor are refused, so the cascade cannot miss any that arrive meanwhile.
+    vid, aid = params['vendor_id'], params['admin_id']
+    if refdata.admin_name(conn, aid) is None:
+        raise RuntimeError('Unknown Admin_ID')
+    if refdata.vendor_blacklisted(conn, vid) is None:
+        raise RuntimeError('Unknown Vendor_ID')
+    exec_sql(conn, "UPDATE VENDOR SET Blacklisted=TRUE WHERE Vendor_ID=%s", (vid,))
+    invalidate('VENDOR', 'REF_VENDOR')
+    progress.total(query_scalar(conn, "SELECT COUNT(*) FROM PROCUREMENT_REQUEST WHERE Vendor_ID=%s AND Status='Pending'", (vid,), 0))
+    report, after = [], ''
+    while True:
+        ids = [r['Request_ID'] for r in query_all(conn, (
+            "SELECT Request_ID FROM PROCUREMENT_REQUEST WHERE Vendor_ID=%s AND Status='Pending' AND Request_ID > %s "
+            "ORDER BY Request_ID LIMIT %s"
+        ), (vid, after, CHUNK))]
+        if not ids:
+            break
+        after = ids[-1]
+        report.extend(run_batch(conn, 'reject', ids, aid, params.get('backend', 'python')))
+        invalidate('PROCUREMENT_REQUEST')
+        progress(len(report))
+    ok = sum(1 for r in report if r['ok'])
+    return f'Vendor {vid} blacklisted, {ok} pending requests rejected', _write_report(progress.job_id, report) if report else None
+
+
+def _reconcile(conn, params, progress):
+    report = reconcile(conn, correct=params.get('correct', False), admin_id=params.get('admin_id'), progress=progress)
+    path = os.path.join(jobs_dir(), f'job-{progress.job_id}-reconcile.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        write_report(report, f)
+    return summary(report), path
+
+
+# Kind -> handler(conn, params, progress) returning (message, result file path or None)
+KINDS = {
+    'export': _export,
+    'batch': _batch,
+    'blacklist': _blacklist,
+    'reconcile': _reconcile,
+}
+
+
+def enqueue(conn, kind, params):
+    """Queue a job and return its Job_ID. `params` must be JSON-serializable (dates become strings)."""
+    if kind not in KINDS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    cur = conn.cursor()
+    cur.execute("INSERT INTO JOB (Kind, Params) VALUES (%s, %s)", (kind, json.dumps(params, default=str)))
+    job_id = cur.lastrowid
+    cur.close()
+    conn.commit()
+    return job_id
+
+
+def get_job(conn, job_id):
+    rows = query_all(conn, (
+        "SELECT Job_ID, Kind, Status, Progress, Total, Message, Result_Path, Worker, Attempts, "
+        "Created_At, Started_At, Finished_At FROM JOB WHERE Job_ID=%s"
+    ), (job_id,))
+    return rows[0] if rows else None
+
+
+def recent_jobs(conn, limit=50):
+    return query_all(conn, (
+        "SELECT Job_ID, Kind, Status, Progress, Total, Message, Result_Path, Created_At, Started_At, Finished_At "
+        "FROM JOB ORDER BY Job_ID DESC LIMIT %s"
+    ), (limit,))
+
+
+def job_stats(conn, minutes=60):
+    """Queue depth per status, and throughput and queue/run latency of jobs finished in the last `minutes`."""
+    counts = {r['Status']: r['n'] for r in query_all(conn, "SELECT Status, COUNT(*) n FROM JOB GROUP BY Status")}
+    finished = query_all(conn, (
+        "SELECT Kind, COUNT(*) AS jobs, "
+        "AVG(TIMESTAMPDIFF(MICROSECOND, Created_At, Started_At)) / 1e6 AS avg_queue_s, "
+        "MAX(TIMESTAMPDIFF(MICROSECOND, Created_At, Started_At)) / 1e6 AS max_queue_s, "
+        "AVG(TIMESTAMPDIFF(MICROSECOND, Started_At, Finished_At)) / 1e6 AS avg_run_s, "
+        "SUM(Status='failed') AS failed "
+        "FROM JOB WHERE Finished_At >= NOW(6) - INTERVAL %s MINUTE GROUP BY Kind ORDER BY Kind"
+    ), (minutes,))
+    oldest = query_scalar(conn, "SELECT TIMESTAMPDIFF(MICROSECOND, MIN(Created_At), NOW(6)) / 1e6 FROM JOB WHERE Status='queued'")
+    return dict(
+        counts=counts,
+        oldest_queued_s=_seconds(oldest),
+        window_minutes=minutes,
+        jobs_per_minute=round(sum(r['jobs'] for r in finished) / minutes, 3),
+        by_kind=[dict(kind=r['Kind'], jobs=int(r['jobs']), failed=int(r['failed'] or 0),
+                      avg_queue_s=_seconds(r['avg_queue_s']), max_queue_s=_seconds(r['max_queue_s']),
+                      avg_run_s=_seconds(r['avg_run_s'])) for r in finished],
+    )
+
+
+def _seconds(v):
+    return None if v is None else round(float(v), 3)
+
+
+def requeue_stale(conn):
+    """Hand running jobs whose heartbeat stopped (JOBS_STALE_SECONDS) back to the queue, or fail them after JOBS_MAX_ATTEMPTS."""
+    stale = int(os.environ.get('JOBS_STALE_SECONDS', '300'))
+    attempts = int(os.environ.get('JOBS_MAX_ATTEMPTS', '3'))
+    exec_sql(conn, (
+        "UPDATE JOB SET Status = IF(Attempts >= %s, 'failed', 'queued'), Worker = NULL, "
+        "Message = IF(Attempts >= %s, 'Worker stopped responding', Message), "
+        "Finished_At = IF(Attempts >= %s, NOW(6), NULL) "
+        "WHERE Status='running' AND Heartbeat_At < NOW(6) - INTERVAL %s SECOND"
+    ), (attempts, attempts, attempts, stale))
+
+
+def claim(conn, worker):
+    """Mark the oldest queued job running for `worker`; (Job_ID, kind, params, attempt), or None when the queue is empty."""
+    with transactional(conn):
+        row = query_row(conn, (
+            "SELECT Job_ID, Kind, Params, Attempts FROM JOB WHERE Status='queued' ORDER BY Job_ID LIMIT 1 FOR UPDATE SKIP LOCKED"
+        ))
+        if row is None:
+            return None
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE JOB SET Status='running', Worker=%s, Attempts=Attempts+1, Started_At=NOW(6), Heartbeat_At=NOW(6) "
+            "WHERE Job_ID=%s", (worker, row[0]))
+        cur.close()
+    return row[0], row[1], json.loads(row[2]), row[3] + 1
+
+
+def run_one(pool, worker):
+    """Claim and run one job. Returns its Job_ID, or None when nothing was queued."""
+    status = pool.acquire()
+    try:
+        requeue_stale(status)
+        job = claim(status, worker)
+        if job is None:
+            return None
+        job_id, kind, params, attempt = job
+        progress = Progress(status, job_id, worker, attempt)
+        work = pool.acquire()
+        progress.start()
+        try:
+            message, path = KINDS[kind](work, params, progress)
+        except Exception as e:
+            log.exception('job %s (%s) failed', job_id, kind)
+            state, message, path = 'failed', str(e)[:500], None
+        else:
+            state = 'done'
+        finally:
+            progress.stop()
+            pool.release(work)
+        if not progress.finish(state, message, path):
+            log.warning('job %s was requeued while attempt %s ran; its outcome (%s) is dropped', job_id, attempt, state)
+        return job_id
+    finally:
+        pool.release(status)
+
+
+def run_worker(stop, poll=1.0):
+    """Run jobs until `stop` (a threading.Event) is set, polling every `poll` seconds while the queue is empty."""
+    worker = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'[:64]
+    while not stop.is_set():
+        try:
+            if run_one(get_pool(), worker) is None:
+                stop.wait(poll)
+        except Exception:
+            log.exception('job worker error')
+            stop.wait(poll)
+
+
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+
+
+def init_jobs(app):
+    """Start JOBS_WORKERS worker threads per web worker (default 0: run `flask jobs-worker` instead)."""
+    count = int(os.environ.get('JOBS_WORKERS', '0'))
+    if count <= 0:
+        return
+    poll = float(os.environ.get('JOBS_POLL_SECONDS', '1'))
+
+    @app.before_request
+    def _start_workers():
+        # Started lazily so each forked gunicorn worker gets its own threads
+        global _workers, _workers_pid
+        if _workers_pid == os.getpid():
+            return
+        with _workers_lock:
+            if _workers_pid != os.getpid():
+                _workers = [threading.Thread(target=run_worker, args=(threading.Event(),), kwargs=dict(poll=poll),
+                                             name=f'job-worker-{i}', daemon=True) for i in range(count)]
+                for t in _workers:
+                    t.start()
+                _workers_pid = os.getpid()
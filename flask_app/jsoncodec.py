@@ -0,0 +1,39 @@
+import datetime
+import json
+from decimal import Decimal
+
+# JSON for values that are stored outside the process and read back (analytics snapshots, the
+# shared Redis cache): unlike pickle, loading it never runs code. Decimal, date and datetime are
+# tagged on the way out so loads() gives back the same types; tuples come back as lists.
+
+
+def _encode(v):
+    if isinstance(v, Decimal):
+        return {'$decimal': format(v, 'f')}
+    if isinstance(v, datetime.datetime):
+        return {'$datetime': v.isoformat()}
+    if isinstance(v, datetime.date):
+        return {'$date': v.isoformat()}
+    raise TypeError(f'{type(v).__name__} is not JSON serializable')
+
+
+def _decode(d):
+    if len(d) == 1:
+        (tag, v), = d.items()
+        if tag == '$decimal':
+            return Decimal(v)
+        if tag == '$datetime':
+            return datetime.datetime.fromisoformat(v)
+        if tag == '$date':
+            return datetime.date.fromisoformat(v)
+    return d
+
+
+def dumps(value):
+    """`value` as JSON text; raises TypeError for types other than JSON's, Decimal, date and datetime."""
+    return json.dumps(value, default=_encode, separators=(',', ':'))
+
+
+def loads(raw):
+    """The value dumps() wrote (str or bytes); raises ValueError for anything else."""
+    return json.loads(raw, object_hook=_decode)
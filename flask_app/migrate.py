@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+from .db import query_all
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+_FILE_RE = re.compile(r'^(\d{4})_[\w-]+\.sql$')
+_DELIMITER_RE = re.compile(r'^\s*DELIMITER\s+(\S+)\s*$', re.IGNORECASE)
+# The connection is already on DB_NAME; a hard-coded USE in a script would switch away from it
+_USE_RE = re.compile(r'^\s*USE\s+\S+\s*$', re.IGNORECASE)
+
+
+def split_statements(text):
+    """
+    Split a mysql-client script into statements, honouring DELIMITER lines the
+    way the `mysql` CLI does. Full-line `#` / `--` comments and USE are dropped.
+    """
+    delim = ';'
+    out, buf = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        m = _DELIMITER_RE.match(line)
+        if m and not buf:
+            delim = m.group(1)
+            continue
+        if not buf and (not stripped or stripped.startswith('#') or stripped.startswith('-- ')):
+            continue
+        if buf and (stripped.startswith('#') or stripped.startswith('-- ')):
+            continue
+        buf.append(line)
+        if stripped.endswith(delim):
+            stmt = '\n'.join(buf).rstrip()[:-len(delim)].strip()
+            buf = []
+            if stmt and not _USE_RE.match(stmt):
+                out.append(stmt)
+    tail = '\n'.join(buf).strip()
+    if tail and not _USE_RE.match(tail):
+        out.append(tail)
+    return out
+
+
+def available(directory=MIGRATIONS_DIR):
+    """[(version, filename, path)] for every migration file, in version order."""
+    found = []
+    for name in sorted(os.listdir(directory)):
+        m = _FILE_RE.match(name)
+        if m:
+            found.append((m.group(1), name, os.path.join(directory, name)))
+    return found
+
+
+def _checksum(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def ensure_version_table(conn):
+    cur = conn.cursor()
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS SCHEMA_VERSION ("
+        " Version CHAR(4) NOT NULL PRIMARY KEY,"
+        " Name VARCHAR(200) NOT NULL,"
+        " Checksum CHAR(64) NOT NULL,"
+        " Applied_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    cur.close()
+
+
+def applied(conn):
+    ensure_version_table(conn)
+    return {r['Version']: r for r in query_all(conn, "SELECT Version, Name, Checksum, Applied_At FROM SCHEMA_VERSION")}
+
+
+def status(conn, directory=MIGRATIONS_DIR):
+    """One {'version', 'name', 'state'} per file: applied, pending or modified (edited after applying)."""
+    done = applied(conn)
+    out = []
+    for version, name, path in available(directory):
+        row = done.get(version)
+        if row is None:
+            state = 'pending'
+        elif row['Checksum'] != _checksum(path):
+            state = 'modified'
+        else:
+            state = 'applied'
+        out.append(dict(version=version, name=name, state=state))
+    return out
+
+
+def _record(conn, version, name, path):
+    cur = conn.cursor()
+    cur.execute("INSERT INTO SCHEMA_VERSION (Version, Name, Checksum) VALUES (%s,%s,%s)",
+                (version, name, _checksum(path)))
+    cur.close()
+    conn.commit()
+
+
+def migrate(conn, directory=MIGRATIONS_DIR, target=None, baseline=None, echo=print):
+    """
+    Apply pending migrations in version order, up to and including `target`.
+
+    MySQL commits DDL implicitly, so a migration is not atomic: if a statement
+    fails the error names the file and statement, nothing is recorded for that
+    file, and it must be fixed up by hand before re-running. `baseline` records
+    every file up to that version as applied without running it (for databases
+    where they were applied with the mysql client).
+    """
+    done = applied(conn)
+    ran = []
+    for version, name, path in available(directory):
+        if version in done or (target and version > target):
+            continue
+        if baseline and version <= baseline:
+            _record(conn, version, name, path)
+            echo(f'{name}: marked as applied')
+            continue
+        with open(path, encoding='utf-8') as f:
+            statements = split_statements(f.read())
+        cur = conn.cursor()
+        for i, stmt in enumerate(statements, 1):
+            try:
+                cur.execute(stmt)
+                if cur.with_rows:
+                    cur.fetchall()
+            except Exception as e:
+                cur.close()
+                conn.rollback()
+                raise RuntimeError(f'{name}: statement {i} of {len(statements)} failed: {e}') from e
+        cur.close()
+        conn.commit()
+        _record(conn, version, name, path)
+        echo(f'{name}: applied ({len(statements)} statements)')
+        ran.append(version)
+    return ran
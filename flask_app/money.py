@@ -0,0 +1,80 @@
+from decimal import Context, Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Money is Decimal end to end; floats never touch an amount. Column scales:
+#   Unit_Cost DECIMAL(12,2), Total_Cost DECIMAL(15,2)                      -> cost()
+#   Current_Budget / Budget_Allocation / BUDGET_LOG.Amount DECIMAL(20,8)  -> amount()
+# Approvals and cancels compare and add Decimals directly: converting a value to integer "units"
+# (amount * 10**8) costs more than the Decimal operation it would replace (see bench-money). Units
+# are for long sums such as the reconcile audit's, which then stay exact however many rows they add.
+
+COST_PLACES = 2
+AMOUNT_PLACES = 8
+ZERO = Decimal(0)
+
+# Shared by every quantize: half up, and 38 digits so DECIMAL(24,8) sums are never rounded
+CONTEXT = Context(prec=38, rounding=ROUND_HALF_UP)
+_ONE = Decimal(1)
+
+_COST_Q = Decimal(1).scaleb(-COST_PLACES)
+_AMOUNT_Q = Decimal(1).scaleb(-AMOUNT_PLACES)
+
+
+def to_decimal(v):
+    """Decimal for a DB value (Decimal/int/None); str/float go through their shortest repr."""
+    if isinstance(v, Decimal):
+        return v
+    if v is None:
+        return ZERO
+    if isinstance(v, int):
+        return Decimal(v)
+    return Decimal(str(v))
+
+
+def cost(v):
+    """A price or request total at Total_Cost's scale (2 places, half up)."""
+    return to_decimal(v).quantize(_COST_Q, context=CONTEXT)
+
+
+def amount(v):
+    """A budget or log amount at DECIMAL(20,8) scale."""
+    return to_decimal(v).quantize(_AMOUNT_Q, context=CONTEXT)
+
+
+def line_total(unit_cost, qty):
+    """Unit_Cost * Quantity, as trg_request_bi's calc_total_cost() stores it."""
+    return cost(to_decimal(unit_cost) * int(qty))
+
+
+def to_units(v):
+    """Exact integer count of 1e-8 units."""
+    return int(to_decimal(v).scaleb(AMOUNT_PLACES, CONTEXT).quantize(_ONE, context=CONTEXT))
+
+
+def from_units(n):
+    return Decimal(n).scaleb(-AMOUNT_PLACES, CONTEXT)
+
+
+def sum_units(values):
+    """Sum of many amounts, added as integers."""
+    return sum(to_units(v) for v in values)
+
+
+def parse(text, digits=20, places=AMOUNT_PLACES, field='Amount'):
+    """
+    Amount typed into a form or file (thousands separators allowed) -> Decimal at `places`,
+    None when blank. Raises ValueError for non-numbers, negatives and values too wide for
+    DECIMAL(digits, places).
+    """
+    if text in (None, ''):
+        return None
+    try:
+        d = Decimal(str(text).strip().replace(',', ''))
+    except InvalidOperation:
+        raise ValueError(f'{field} is not a number')
+    if not d.is_finite():
+        raise ValueError(f'{field} is not a number')
+    if d < 0:
+        raise ValueError(f'{field} is negative')
+    if d >= Decimal(10) ** (digits - places):
+        raise ValueError(f'{field} is too large')
+    return d.quantize(_ONE.scaleb(-places), context=CONTEXT)
@@ -0,0 +1,187 @@
+from .db import iter_rows, query_all, query_scalar
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+# Ranked results can't be keyset-paged; deep offsets are capped instead
+MAX_OFFSET = 10000
+
+
+class Page:
+    def __init__(self, rows, limit, next_cursor=None, prev_cursor=None, total=None, args=None):
+        self.rows = rows
+        self.limit = limit
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        # Extra query args (q, sort, ...) carried over into next/prev links
+        self.args = args or {}
+        # Set for offset-paged (ranked search) results instead of cursors
+        self.offset = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def next_args(self):
+        key = 'offset' if self.offset is not None else 'after'
+        return dict(self.args, limit=self.limit, **{key: self.next_cursor})
+
+    @property
+    def prev_args(self):
+        key = 'offset' if self.offset is not None else 'before'
+        return dict(self.args, limit=self.limit, **{key: self.prev_cursor})
+
+
+class RowStream:
+    """
+    Rows of one query as dicts, read from an unbuffered cursor `batch` rows at a time while a
+    template iterates them, so a page never holds its whole result. At most `limit` rows are
+    yielded; an extra row read past that only sets `more`. After iteration, len(), `first` and
+    `last` describe what was shown. The query runs here, so SQL errors surface before the
+    response starts; the connection can run nothing else until the rows are consumed.
+    """
+
+    def __init__(self, conn, sql, params=(), limit=None, batch=200):
+        self._rows = iter_rows(conn, sql, params, batch)
+        self.columns = next(self._rows)
+        self.limit = limit
+        self.count = 0
+        self.first = self.last = None
+        self.more = False
+
+    def __iter__(self):
+        cols = self.columns
+        # Read to the end even past `limit` (one row at most) so the connection stays reusable
+        for r in self._rows:
+            if self.limit is not None and self.count >= self.limit:
+                self.more = True
+                continue
+            row = dict(zip(cols, r))
+            if self.first is None:
+                self.first = row
+            self.last = row
+            self.count += 1
+            yield row
+
+    def __len__(self):
+        return self.count
+
+
+class StreamPage(Page):
+    """A Page whose rows are a RowStream; its cursors are known once the rows have been rendered."""
+
+    def __init__(self, rows, key=None, after='', offset=None):
+        self.rows = rows
+        self.limit = rows.limit
+        self.total = None
+        self.args = {}
+        self.offset = offset
+        self._col = key.split('.')[-1] if key else None
+        self._after = after
+
+    @property
+    def next_cursor(self):
+        if not self.rows.more:
+            return None
+        if self.offset is not None:
+            return self.offset + self.limit if self.offset + self.limit <= MAX_OFFSET else None
+        return self.rows.last[self._col]
+
+    @property
+    def prev_cursor(self):
+        if self.offset is not None:
+            return max(0, self.offset - self.limit) if self.offset else None
+        return self.rows.first[self._col] if self._after and self.rows.first else None
+
+
+def page_args(args):
+    after = args.get('after', '').strip()
+    before = args.get('before', '').strip()
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return after, before, max(1, min(limit, MAX_LIMIT))
+
+
+def offset_arg(args):
+    try:
+        return max(0, min(int(args.get('offset', 0)), MAX_OFFSET))
+    except ValueError:
+        return 0
+
+
+def keyset_page(conn, select_sql, key, where='', params=(), order='ASC', after='', before='', limit=DEFAULT_LIMIT,
+                stream=False):
+    """
+    Fetch one page of `select_sql` ordered by the unique column `key`.
+
+    `after` continues past the last key of the previous page, `before` walks back
+    from the first key of the current one. Only limit+1 rows are read either way,
+    so the cost is proportional to the page size, not to the table size.
+    With `stream`, forward pages come back as a StreamPage (backward ones are read
+    in reverse and have to be buffered).
+    """
+    desc = order.upper() == 'DESC'
+    conds = [f"({where})"] if where else []
+    params = list(params)
+    if before:
+        conds.append(f"{key} {'>' if desc else '<'} %s")
+        params.append(before)
+        walk = 'ASC' if desc else 'DESC'
+    else:
+        if after:
+            conds.append(f"{key} {'<' if desc else '>'} %s")
+            params.append(after)
+        walk = 'DESC' if desc else 'ASC'
+    sql = select_sql
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    sql += f" ORDER BY {key} {walk} LIMIT %s"
+    params.append(limit + 1)
+    if stream and not before:
+        return StreamPage(RowStream(conn, sql, params, limit), key, after)
+    rows = query_all(conn, sql, params)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+    col = key.split('.')[-1]
+    next_cursor = prev_cursor = None
+    if rows:
+        if before:
+            next_cursor = rows[-1][col]
+            prev_cursor = rows[0][col] if more else None
+        else:
+            next_cursor = rows[-1][col] if more else None
+            prev_cursor = rows[0][col] if after else None
+    return Page(rows, limit, next_cursor, prev_cursor)
+
+
+def approx_count(conn, table):
+    # InnoDB's row estimate from the data dictionary; never scans the table
+    return query_scalar(conn, (
+        "SELECT TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    ), (table,))
+
+
+def ranked_page(conn, select_sql, where, params, order_sql, order_params=(), offset=0, limit=DEFAULT_LIMIT,
+                stream=False):
+    """One page of a relevance-ordered result (e.g. FULLTEXT score), paged by offset."""
+    sql = select_sql + f" WHERE {where} ORDER BY {order_sql} LIMIT %s OFFSET %s"
+    if stream:
+        return StreamPage(RowStream(conn, sql, list(params) + list(order_params) + [limit + 1, offset], limit),
+                          offset=offset)
+    rows = query_all(conn, sql, list(params) + list(order_params) + [limit + 1, offset])
+    more = len(rows) > limit
+    page = Page(rows[:limit], limit,
+                next_cursor=offset + limit if more and offset + limit <= MAX_OFFSET else None,
+                prev_cursor=max(0, offset - limit) if offset else None)
+    page.offset = offset
+    return page
@@ -0,0 +1,191 @@
+import datetime
+from .db import query_all, query_scalar, transactional
+
+# Monthly RANGE-partitioned tables (migrations/0006). Partitions are named pYYYYMM and hold rows
+# before the first day of the following month; `pmax` catches everything past the last month.
+MONTHLY = {
+    'BUDGET_LOG': dict(
+        bound="UNIX_TIMESTAMP('{} 00:00:00')", maxvalue='MAXVALUE',
+        first="SELECT MIN(Timestamp) FROM BUDGET_LOG"),
+    'BUDGET_LOG_ARCHIVE': dict(
+        bound="UNIX_TIMESTAMP('{} 00:00:00')", maxvalue='MAXVALUE',
+        first=None),
+    'PROCUREMENT_REQUEST_ARCHIVE': dict(
+        bound="'{}'", maxvalue='(MAXVALUE)',
+        first="SELECT MIN(Date_of_Request) FROM PROCUREMENT_REQUEST WHERE Status='Rejected'"),
+}
+
+REQUEST_COLUMNS = ("Request_ID, Dept_ID, Item_ID, Vendor_ID, Quantity, Total_Cost, Status, "
+                   "Date_of_Request, Approval_Authority, Date_of_Approval")
+
+
+def month_start(d):
+    return datetime.date(d.year, d.month, 1)
+
+
+def add_months(d, n):
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return datetime.date(y, m + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def _month_of(name):
+    return datetime.datetime.strptime(name[1:], '%Y%m').date()
+
+
+def list_partitions(conn, table):
+    """[(name, month or None for pmax, approx rows)] in partition order."""
+    rows = query_all(conn, (
+        "SELECT PARTITION_NAME AS name, TABLE_ROWS AS est FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), (table,))
+    if not rows:
+        raise RuntimeError(f"{table} is not partitioned; apply migration 0006 first")
+    return [(r['name'], None if r['name'] == 'pmax' else _month_of(r['name']), r['est'] or 0) for r in rows]
+
+
+def _definition(table, month):
+    spec = MONTHLY[table]
+    bound = spec['bound'].format(add_months(month, 1).isoformat())
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ({bound})"
+
+
+def _split_pmax(conn, table, months):
+    parts = [_definition(table, m) for m in months]
+    parts.append(f"PARTITION pmax VALUES LESS THAN {MONTHLY[table]['maxvalue']}")
+    cur = conn.cursor()
+    cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({', '.join(parts)})")
+    cur.close()
+
+
+def ensure_partitions(conn, table, ahead=3, today=None):
+    """
+    Split `pmax` so `table` has one partition per month up to `ahead` months past today.
+    The first run starts at the month of the oldest row, which copies existing history once;
+    later runs only split the (normally empty) pmax. Returns the names of the new partitions.
+    """
+    today = today or datetime.date.today()
+    existing = [m for _, m, _ in list_partitions(conn, table) if m]
+    if existing:
+        start = add_months(existing[-1], 1)
+    else:
+        first = query_scalar(conn, MONTHLY[table]['first']) if MONTHLY[table]['first'] else None
+        start = month_start(first or today)
+    end = add_months(month_start(today), ahead)
+    months = []
+    while start <= end:
+        months.append(start)
+        start = add_months(start, 1)
+    if months:
+        _split_pmax(conn, table, months)
+    return [partition_name(m) for m in months]
+
+
+def _summarize(cur, name):
+    # Overwrites the partition's days, so re-running after a failure is harmless
+    cur.execute(
+        "INSERT INTO BUDGET_LOG_SUMMARY (Day, Dept_ID, Category, Amount, Entries) "
+        f"SELECT DATE(Timestamp), COALESCE(Dept_ID,''), COALESCE(Category,''), SUM(Amount), COUNT(*) "
+        f"FROM BUDGET_LOG PARTITION ({name}) GROUP BY DATE(Timestamp), COALESCE(Dept_ID,''), COALESCE(Category,'') "
+        "ON DUPLICATE KEY UPDATE Amount = VALUES(Amount), Entries = VALUES(Entries)"
+    )
+
+
+def _finish_exchange(conn):
+    """
+    An archive run that stopped between its two exchanges leaves a month's rows only in
+    BUDGET_LOG_XCHG. Move them on into BUDGET_LOG_ARCHIVE before the table is reused; it is only
+    ever dropped empty.
+    """
+    if not query_scalar(conn, "SELECT COUNT(*) FROM information_schema.TABLES "
+                              "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'BUDGET_LOG_XCHG'"):
+        return
+    # The newest row names the month: the lowest partition may also hold older rows
+    last = query_scalar(conn, "SELECT MAX(Timestamp) FROM BUDGET_LOG_XCHG")
+    if last is not None:
+        month = month_start(last)
+        name = partition_name(month)
+        if name not in {n for n, _, _ in list_partitions(conn, 'BUDGET_LOG_ARCHIVE')}:
+            _split_pmax(conn, 'BUDGET_LOG_ARCHIVE', [month])
+        if query_scalar(conn, f"SELECT COUNT(*) FROM BUDGET_LOG_ARCHIVE PARTITION ({name})"):
+            raise RuntimeError(f"BUDGET_LOG_XCHG holds {name} rows but BUDGET_LOG_ARCHIVE {name} is not empty; "
+                               "merge them by hand before retiring more months")
+        cur = conn.cursor()
+        cur.execute(f"ALTER TABLE BUDGET_LOG_ARCHIVE EXCHANGE PARTITION {name} WITH TABLE BUDGET_LOG_XCHG")
+        cur.close()
+    if query_scalar(conn, "SELECT COUNT(*) FROM BUDGET_LOG_XCHG"):
+        raise RuntimeError("BUDGET_LOG_XCHG still holds rows; move them by hand before retiring more months")
+    cur = conn.cursor()
+    cur.execute("DROP TABLE BUDGET_LOG_XCHG")
+    cur.close()
+
+
+def retire_partitions(conn, before, mode='archive'):
+    """
+    Take BUDGET_LOG months older than `before` out of the live table, oldest first.
+    Their per-day totals go to BUDGET_LOG_SUMMARY either way; then
+      archive: the partition is swapped into BUDGET_LOG_ARCHIVE (EXCHANGE PARTITION, no row copy)
+      compact: the partition is dropped, keeping only the summary rows
+    Returns [(partition, approx rows)] retired.
+    """
+    if mode not in ('archive', 'compact'):
+        raise ValueError(f"Unknown mode: {mode}")
+    cutoff = month_start(before)
+    live = list_partitions(conn, 'BUDGET_LOG')
+    # Keep the newest bounded month whatever `before` says: ensure_partitions continues after it, and
+    # with only pmax left its next run would split pmax again from the oldest live row. The lowest
+    # partition may hold rows older than its month too; those are retired along with it.
+    bounded = [p for p in live if p[1]]
+    old = [p for p in bounded[:-1] if p[1] < cutoff]
+    done = []
+    if mode == 'archive':
+        _finish_exchange(conn)
+    for name, month, est in old:
+        with transactional(conn):
+            cur = conn.cursor()
+            _summarize(cur, name)
+            cur.close()
+        cur = conn.cursor()
+        if mode == 'archive':
+            archived = {n for n, _, _ in list_partitions(conn, 'BUDGET_LOG_ARCHIVE')}
+            if name not in archived:
+                _split_pmax(conn, 'BUDGET_LOG_ARCHIVE', [month])
+            cur.execute("CREATE TABLE BUDGET_LOG_XCHG LIKE BUDGET_LOG")
+            cur.execute("ALTER TABLE BUDGET_LOG_XCHG REMOVE PARTITIONING")
+            cur.execute(f"ALTER TABLE BUDGET_LOG EXCHANGE PARTITION {name} WITH TABLE BUDGET_LOG_XCHG")
+            cur.execute(f"ALTER TABLE BUDGET_LOG_ARCHIVE EXCHANGE PARTITION {name} WITH TABLE BUDGET_LOG_XCHG")
+            cur.execute("DROP TABLE BUDGET_LOG_XCHG")
+        cur.execute(f"ALTER TABLE BUDGET_LOG DROP PARTITION {name}")
+        cur.close()
+        done.append((name, est))
+    return done
+
+
+def archive_rejected(conn, months=12, chunk=5000, today=None):
+    """
+    Move Rejected requests decided more than `months` months ago into PROCUREMENT_REQUEST_ARCHIVE,
+    `chunk` rows per transaction. Returns the number of requests moved.
+    """
+    cutoff = add_months(month_start(today or datetime.date.today()), -months)
+    ensure_partitions(conn, 'PROCUREMENT_REQUEST_ARCHIVE', ahead=0, today=today)
+    moved = 0
+    while True:
+        ids = [r['Request_ID'] for r in query_all(conn, (
+            "SELECT Request_ID FROM PROCUREMENT_REQUEST "
+            "WHERE Status='Rejected' AND COALESCE(Date_of_Approval, Date_of_Request) < %s "
+            "ORDER BY Request_ID LIMIT %s"
+        ), (cutoff, chunk))]
+        if not ids:
+            return moved
+        marks = ','.join(['%s'] * len(ids))
+        with transactional(conn):
+            cur = conn.cursor()
+            cur.execute(f"INSERT INTO PROCUREMENT_REQUEST_ARCHIVE ({REQUEST_COLUMNS}) "
+                        f"SELECT {REQUEST_COLUMNS} FROM PROCUREMENT_REQUEST WHERE Request_ID IN ({marks})", ids)
+            cur.execute(f"DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID IN ({marks})", ids)
+            cur.close()
+        moved += len(ids)
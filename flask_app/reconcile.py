@@ -0,0 +1,254 @@
+import datetime
+import json
+import os
+import time
+from decimal import Decimal
+from .cache import invalidate
+from .db import query_all, query_row, query_scalar, transactional
+from .ids import reserve_ids
+from .partitions import list_partitions
+from . import money, refdata
+
+# Ledger audit. Two invariants are checked:
+#   departments: Current_Budget = Budget_Allocation - SUM(BUDGET_LOG.Amount)
+#   requests:    the net of a request's log entries is its Total_Cost when Approved, else 0
+#                (a cancelled request is deleted and leaves a Procurement entry plus its negative Reversal)
+# The ledger includes the months `flask partitions` retired: archived months are read from
+# BUDGET_LOG_ARCHIVE, compacted ones only survive as BUDGET_LOG_SUMMARY days. Those days still count
+# towards department totals, but they no longer say which request an amount belongs to, so requests
+# that may have entries in them are not checked (requests_unchecked).
+# The ledger is summed in chunks on the server and only totals and mismatches come back:
+# department totals one BUDGET_LOG partition at a time, request totals one Request_ID range of
+# RECONCILE_CHUNK requests at a time, each chunk inside a consistent snapshot. Sums are exact DECIMALs,
+# added up here as integer 1e-8 units. Memory is one total per department plus the mismatches.
+
+LOG_INSERT = "INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)"
+
+
+def _in_range(col, hi):
+    return f"{col} > %s" + (f" AND {col} <= %s" if hi is not None else "")
+
+
+def _write_corrections(conn, admin_id, entries):
+    """[(Dept_ID, Request_ID, units)] -> one Adjustment entry each."""
+    log_ids = reserve_ids('BUD', len(entries))
+    with transactional(conn):
+        cur = conn.cursor()
+        cur.executemany(LOG_INSERT, [(lid, 'Adjustment', did, rid, admin_id, money.from_units(u))
+                                     for lid, (did, rid, u) in zip(log_ids, entries)])
+        cur.close()
+
+
+def _ledger(where, retired):
+    # Log entries matching `where` (with its params once per table), live and archived
+    sql = f"SELECT Request_ID, Dept_ID, Category, Amount FROM BUDGET_LOG WHERE {where}"
+    if retired is not None:
+        sql += f" UNION ALL SELECT Request_ID, Dept_ID, Category, Amount FROM BUDGET_LOG_ARCHIVE WHERE {where}"
+    return sql
+
+
+def _check_requests(conn, chunk, report, progress, admin_id, retired):
+    products, lo = {}, ''
+    compacted = retired['compacted_through'] if retired else None
+    tables = 1 if retired is None else 2
+    # With compacted days, only requests made after the last of them (a day later, for time zones)
+    # are known to have all their entries, and a deleted request's entries are only checked while
+    # its Procurement entry is still there
+    checkable = "COALESCE(r.Date_of_Request > %s, FALSE)" if compacted else "TRUE"
+    after = (compacted + datetime.timedelta(days=1),) if compacted else ()
+    while True:
+        # Upper key of this chunk; None for the last one, which also takes log entries past the last request
+        hi = query_scalar(conn, "SELECT Request_ID FROM PROCUREMENT_REQUEST WHERE Request_ID > %s "
+                                "ORDER BY Request_ID LIMIT 1 OFFSET %s", (lo, chunk - 1))
+        args = (lo,) if hi is None else (lo, hi)
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        try:
+            n, unchecked = query_row(conn, (
+                f"SELECT COUNT(*), COALESCE(SUM(NOT {checkable}), 0) FROM PROCUREMENT_REQUEST r "
+                f"WHERE {_in_range('r.Request_ID', hi)}"
+            ), after + args)
+            bad = query_all(conn, (
+                "SELECT r.Request_ID, r.Dept_ID, r.Item_ID, r.Status, "
+                "IF(r.Status = 'Approved', COALESCE(r.Total_Cost, 0), 0) AS Expected, COALESCE(l.Logged, 0) AS Logged "
+                "FROM PROCUREMENT_REQUEST r LEFT JOIN ("
+                f"  SELECT Request_ID, SUM(Amount) AS Logged FROM ({_ledger(_in_range('Request_ID', hi), retired)}) e "
+                "  GROUP BY Request_ID"
+                ") l ON l.Request_ID = r.Request_ID "
+                f"WHERE {_in_range('r.Request_ID', hi)} AND {checkable} "
+                "AND COALESCE(l.Logged, 0) <> IF(r.Status = 'Approved', COALESCE(r.Total_Cost, 0), 0) "
+                "ORDER BY r.Request_ID"
+            ), args * tables + args + after)
+            # Entries of requests that no longer exist (cancelled) must net to zero
+            gone = query_all(conn, (
+                "SELECT l.Request_ID, MIN(l.Dept_ID) AS Dept_ID, NULL AS Item_ID, NULL AS Status, 0 AS Expected, "
+                f"SUM(l.Amount) AS Logged FROM ({_ledger(_in_range('Request_ID', hi), retired)}) l "
+                "WHERE NOT EXISTS (SELECT 1 FROM PROCUREMENT_REQUEST r WHERE r.Request_ID = l.Request_ID) "
+                "GROUP BY l.Request_ID HAVING SUM(l.Amount) <> 0 "
+                + ("AND SUM(l.Category = 'Procurement') > 0 " if compacted else "") +
+                "ORDER BY l.Request_ID"
+            ), args * tables)
+        finally:
+            conn.commit()
+        fixes = []
+        for r in bad + gone:
+            diff = money.to_units(r['Expected']) - money.to_units(r['Logged'])
+            fixes.append((r['Dept_ID'], r['Request_ID'], diff))
+            if r['Item_ID'] is not None:
+                products[r['Item_ID']] = products.get(r['Item_ID'], 0) + diff
+            if len(report['requests']) < report['sample']:
+                report['requests'].append(dict(r, Expected=money.amount(r['Expected']), Logged=money.amount(r['Logged'])))
+        report['requests_mismatched'] += len(fixes)
+        if fixes and admin_id:
+            _write_corrections(conn, admin_id, fixes)
+            report['corrections'] += len(fixes)
+        report['requests_checked'] += int(n) - int(unchecked)
+        report['requests_unchecked'] += int(unchecked)
+        if progress:
+            progress(report['requests_checked'])
+        if hi is None:
+            break
+        lo = hi
+    report['products'] = _product_rows(conn, {i: d for i, d in products.items() if d})
+
+
+def _product_rows(conn, diffs):
+    # Only products whose requests disagree with the ledger. Stock has no opening balance to check
+    # against, so their approved quantity and current stock are reported alongside.
+    out = []
+    items = sorted(diffs)
+    for i in range(0, len(items), 1000):
+        part = items[i:i + 1000]
+        rows = query_all(conn, (
+            "SELECT p.Item_ID, p.Stock_Available, COALESCE(SUM(r.Quantity), 0) AS Approved_Quantity, "
+            "COALESCE(SUM(r.Total_Cost), 0) AS Approved_Spend FROM PRODUCT p "
+            "LEFT JOIN PROCUREMENT_REQUEST r ON r.Item_ID = p.Item_ID AND r.Status = 'Approved' "
+            f"WHERE p.Item_ID IN ({','.join(['%s'] * len(part))}) GROUP BY p.Item_ID, p.Stock_Available"
+        ), part)
+        found = {r['Item_ID']: r for r in rows}
+        for iid in part:
+            r = found.get(iid) or dict(Item_ID=iid, Stock_Available=None, Approved_Quantity=None, Approved_Spend=None)
+            r['Difference'] = money.from_units(diffs[iid])
+            out.append(r)
+    return out
+
+
+def _log_partitions(conn):
+    try:
+        return [name for name, _, _ in list_partitions(conn, 'BUDGET_LOG')]
+    except RuntimeError:
+        return [None]
+
+
+def _retired(conn):
+    """
+    The months `flask partitions` took out of BUDGET_LOG, or None before migration 0006:
+    dict(archived=[(partition, first day, last day)] of the BUDGET_LOG_ARCHIVE partitions holding rows,
+    compacted_through=last BUDGET_LOG_SUMMARY day that is not archived, or None).
+    """
+    try:
+        parts = list_partitions(conn, 'BUDGET_LOG_ARCHIVE')
+    except RuntimeError:
+        return None
+    archived = []
+    for name, _, _ in parts:
+        first, last = query_row(conn, f"SELECT MIN(Timestamp), MAX(Timestamp) FROM BUDGET_LOG_ARCHIVE PARTITION ({name})")
+        if first is not None:
+            archived.append((name, first.date(), last.date()))
+    where, params = _not_archived(archived)
+    compacted = query_scalar(conn, f"SELECT MAX(Day) FROM BUDGET_LOG_SUMMARY WHERE {where}", params)
+    return dict(archived=archived, compacted_through=compacted)
+
+
+def _not_archived(archived):
+    # BUDGET_LOG_SUMMARY days that are not also in BUDGET_LOG_ARCHIVE, i.e. were compacted
+    return (" AND ".join(["NOT (Day BETWEEN %s AND %s)"] * len(archived)) or "TRUE",
+            [d for _, first, last in archived for d in (first, last)])
+
+
+def _check_departments(conn, report, progress, admin_id, retired):
+    # DEPARTMENT and every partition are read in one snapshot, so budgets and log entries written
+    # together by an approval or cancel are seen together
+    parts = _log_partitions(conn)
+    sources = [f"BUDGET_LOG PARTITION ({p})" if p else "BUDGET_LOG" for p in parts]
+    if retired:
+        sources += [f"BUDGET_LOG_ARCHIVE PARTITION ({p})" for p, _, _ in retired['archived']]
+    totals = {}
+    conn.start_transaction(consistent_snapshot=True, readonly=True)
+    try:
+        depts = query_all(conn, "SELECT Dept_ID, Budget_Allocation, Current_Budget FROM DEPARTMENT ORDER BY Dept_ID")
+        for source in sources:
+            for r in query_all(conn, f"SELECT Dept_ID, SUM(Amount) AS Logged, COUNT(*) AS n FROM {source} GROUP BY Dept_ID"):
+                totals[r['Dept_ID']] = totals.get(r['Dept_ID'], 0) + money.to_units(r['Logged'])
+                report['log_rows'] += int(r['n'])
+            if progress:
+                progress(report['requests_checked'] + report['log_rows'])
+        if retired and retired['compacted_through']:
+            where, params = _not_archived(retired['archived'])
+            for r in query_all(conn, (
+                "SELECT NULLIF(Dept_ID, '') AS Dept_ID, SUM(Amount) AS Logged, SUM(Entries) AS n "
+                f"FROM BUDGET_LOG_SUMMARY WHERE {where} GROUP BY Dept_ID"
+            ), params):
+                totals[r['Dept_ID']] = totals.get(r['Dept_ID'], 0) + money.to_units(r['Logged'])
+                report['log_rows'] += int(r['n'])
+    finally:
+        conn.commit()
+    fixes = []
+    for d in depts:
+        logged = totals.pop(d['Dept_ID'], 0)
+        if d['Budget_Allocation'] is None or d['Current_Budget'] is None:
+            report['departments_unchecked'] += 1
+            continue
+        report['departments_checked'] += 1
+        expected = money.to_units(d['Budget_Allocation']) - money.to_units(d['Current_Budget'])
+        if logged != expected:
+            fixes.append((d['Dept_ID'], None, expected - logged))
+            report['departments'].append(dict(d, Logged=money.from_units(logged), Expected=money.from_units(expected),
+                                              Difference=money.from_units(expected - logged)))
+    # Entries whose department is gone (or NULL) belong to no budget
+    report['unknown_departments'] = [dict(Dept_ID=k, Logged=money.from_units(u))
+                                     for k, u in sorted(totals.items(), key=lambda t: t[0] or '') if u]
+    if fixes and admin_id:
+        _write_corrections(conn, admin_id, fixes)
+        report['corrections'] += len(fixes)
+
+
+def reconcile(conn, correct=False, admin_id=None, chunk=None, sample=100, progress=None):
+    """
+    Audit the ledger and return a report of every department and product that does not balance,
+    plus up to `sample` mismatched requests. With `correct`, Adjustment entries signed by
+    `admin_id` are written so that each request nets to its Total_Cost and each department's log
+    total to Budget_Allocation - Current_Budget (Current_Budget is taken as the truth). Needs
+    migration 0009, which stops the log trigger from zeroing negative corrections.
+    """
+    if correct and not admin_id:
+        raise ValueError('Corrections need an Admin_ID')
+    if correct and refdata.admin_name(conn, admin_id) is None:
+        raise ValueError('Unknown Admin_ID')
+    chunk = max(int(chunk or os.environ.get('RECONCILE_CHUNK', '50000')), 1)
+    report = dict(chunk=chunk, sample=sample, corrections=0,
+                  requests_checked=0, requests_unchecked=0, requests_mismatched=0, requests=[], products=[],
+                  log_rows=0, departments_checked=0, departments_unchecked=0, departments=[], unknown_departments=[])
+    t0 = time.perf_counter()
+    admin = admin_id if correct else None
+    retired = _retired(conn)
+    # Requests first, so department totals include any request-level corrections just written
+    _check_requests(conn, chunk, report, progress, admin, retired)
+    _check_departments(conn, report, progress, admin, retired)
+    if report['corrections']:
+        invalidate('BUDGET_LOG', 'DEPARTMENT')
+    report['seconds'] = round(time.perf_counter() - t0, 3)
+    del report['sample']
+    return report
+
+
+def summary(report):
+    return (f"{len(report['departments'])} of {report['departments_checked']} departments and "
+            f"{report['requests_mismatched']} of {report['requests_checked']} requests out of balance "
+            f"({report['log_rows']} log rows, {report['seconds']}s); {report['corrections']} corrections written"
+            + (f"; {report['requests_unchecked']} requests from compacted months not checked"
+               if report['requests_unchecked'] else ''))
+
+
+def write_report(report, f):
+    """The report as JSON, amounts in plain notation (0.00000000 rather than 0E-8)."""
+    json.dump(report, f, indent=1, default=lambda v: format(v, 'f') if isinstance(v, Decimal) else str(v))
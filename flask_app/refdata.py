@@ -0,0 +1,258 @@
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from decimal import Decimal
+from .cache import get_cache
+from .db import iter_rows, query_all, query_row, query_scalar
+from . import money
+
+# Compact in-process snapshots of the reference data the forms and write paths look up:
+# officials, department IDs, product -> (vendor, unit cost) and vendor blacklist flags.
+# A snapshot is immutable once built and replaced wholesale, so threads share it without locks.
+# Each table is versioned by its REF_<TABLE> cache tag (bumped by the routes that create or change
+# these rows, not by budget/stock updates) and reloaded at least every REFDATA_TTL seconds so
+# changes made through other workers show up. Lookups that miss a snapshot fall back to the database.
+
+_ID_RE = re.compile(r'^([A-Z]+)(\d+)$')
+
+
+class IdColumn:
+    """
+    Sorted IDs of one table. When all IDs are <PREFIX><digits> of one prefix and width
+    (DPT001, PRO0001, ...) they are kept as an array of ints, otherwise as a tuple of strings.
+    """
+
+    __slots__ = ('prefix', 'width', 'nums', 'strs')
+
+    @classmethod
+    def build(cls, ids):
+        """(column, order): `order[i]` is the input position of the column's i-th ID."""
+        col = cls()
+        col.prefix = col.width = col.nums = col.strs = None
+        parsed = [_ID_RE.match(i or '') for i in ids]
+        shapes = {(m.group(1), len(m.group(2))) for m in parsed if m}
+        if ids and len(shapes) == 1 and all(parsed) and shapes.pop()[1] <= 9:
+            col.prefix, col.width = parsed[0].group(1), len(parsed[0].group(2))
+            nums = [int(m.group(2)) for m in parsed]
+            order = sorted(range(len(ids)), key=nums.__getitem__)
+            col.nums = array('I', (nums[i] for i in order))
+        else:
+            order = sorted(range(len(ids)), key=ids.__getitem__)
+            col.strs = tuple(ids[i] for i in order)
+        return col, order
+
+    def __len__(self):
+        return len(self.nums) if self.nums is not None else len(self.strs)
+
+    def __getitem__(self, i):
+        if self.nums is not None:
+            return f'{self.prefix}{self.nums[i]:0{self.width}d}'
+        return self.strs[i]
+
+    def find(self, key):
+        """Position of `key`, or -1."""
+        if self.nums is not None:
+            m = _ID_RE.match(key or '')
+            if not m or m.group(1) != self.prefix or len(m.group(2)) != self.width:
+                return -1
+            n = int(m.group(2))
+            i = bisect_left(self.nums, n)
+            return i if i < len(self.nums) and self.nums[i] == n else -1
+        i = bisect_left(self.strs, key)
+        return i if i < len(self.strs) and self.strs[i] == key else -1
+
+    def starting_with(self, q, limit=20):
+        """Positions of the first `limit` IDs that start with `q`."""
+        if self.nums is not None:
+            q = q.upper()
+            if len(q) <= len(self.prefix):
+                if not self.prefix.startswith(q):
+                    return range(0)
+                lo, hi = 0, 10 ** self.width
+            else:
+                digits = q[len(self.prefix):]
+                if not q.startswith(self.prefix) or not digits.isdigit() or len(digits) > self.width:
+                    return range(0)
+                scale = 10 ** (self.width - len(digits))
+                lo, hi = int(digits) * scale, (int(digits) + 1) * scale
+            i = bisect_left(self.nums, lo)
+            return range(i, min(bisect_left(self.nums, hi), i + limit))
+        i = bisect_left(self.strs, q)
+        j = i
+        while j < len(self.strs) and j - i < limit and self.strs[j].startswith(q):
+            j += 1
+        return range(i, j)
+
+
+class Officials:
+    __slots__ = ('ids', 'names')
+
+
+class Departments:
+    __slots__ = ('ids',)
+
+
+class Products:
+    # Vendor per product as an index into `vendor_keys`; Unit_Cost in cents
+    __slots__ = ('ids', 'vendor_keys', 'vendor', 'cost_cents')
+
+
+class Vendors:
+    __slots__ = ('ids', 'blacklisted')
+
+
+def _load_officials(conn):
+    rows = query_all(conn, "SELECT Admin_ID, Name FROM MINISTRY")
+    snap = Officials()
+    snap.ids, order = IdColumn.build([r['Admin_ID'] for r in rows])
+    snap.names = tuple(rows[i]['Name'] for i in order)
+    return snap
+
+
+def _load_departments(conn):
+    snap = Departments()
+    snap.ids, _ = IdColumn.build([r['Dept_ID'] for r in query_all(conn, "SELECT Dept_ID FROM DEPARTMENT")])
+    return snap
+
+
+def _load_products(conn):
+    # Streamed: up to millions of rows, kept as three flat arrays rather than row dicts
+    ids, vendor, cents, keys = [], array('i'), array('q'), {}
+    rows = iter_rows(conn, "SELECT Item_ID, Vendor_ID, Unit_Cost FROM PRODUCT", batch=10000)
+    next(rows)
+    for iid, vid, cost in rows:
+        ids.append(iid)
+        vendor.append(-1 if vid is None else keys.setdefault(vid, len(keys)))
+        cents.append(int(money.cost(cost).scaleb(money.COST_PLACES)))
+    snap = Products()
+    snap.ids, order = IdColumn.build(ids)
+    snap.vendor_keys = tuple(keys)
+    snap.vendor = array('i', (vendor[i] for i in order))
+    snap.cost_cents = array('q', (cents[i] for i in order))
+    return snap
+
+
+def _load_vendors(conn):
+    rows = query_all(conn, "SELECT Vendor_ID, Blacklisted FROM VENDOR")
+    snap = Vendors()
+    snap.ids, order = IdColumn.build([r['Vendor_ID'] for r in rows])
+    snap.blacklisted = bytes(1 if rows[i]['Blacklisted'] else 0 for i in order)
+    return snap
+
+
+# table -> (version tag, loader)
+TABLES = {
+    'MINISTRY': ('REF_MINISTRY', _load_officials),
+    'DEPARTMENT': ('REF_DEPARTMENT', _load_departments),
+    'PRODUCT': ('REF_PRODUCT', _load_products),
+    'VENDOR': ('REF_VENDOR', _load_vendors),
+}
+
+_snapshots = {}  # table -> (generation, loaded_at, snapshot)
+_build_locks = {t: threading.Lock() for t in TABLES}
+_stats = dict(hits=0, misses=0, builds=0)
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def snapshot(table, conn):
+    """Current snapshot of `table`, rebuilt with `conn` when its tag moved or it is older than REFDATA_TTL."""
+    tag, load = TABLES[table]
+    gen = get_cache().backend.generations([tag])[0]
+    ttl = float(os.environ.get('REFDATA_TTL', '300'))
+    cur = _snapshots.get(table)
+    if cur is not None and cur[0] == gen and time.monotonic() - cur[1] < ttl:
+        return cur[2]
+    lock = _build_locks[table]
+    # One thread rebuilds; the others keep serving the previous snapshot meanwhile
+    if not lock.acquire(blocking=cur is None):
+        return cur[2]
+    try:
+        cur = _snapshots.get(table)
+        if cur is None or cur[0] != gen or time.monotonic() - cur[1] >= ttl:
+            _snapshots[table] = cur = (gen, time.monotonic(), load(conn))
+            _count('builds')
+        return cur[2]
+    finally:
+        lock.release()
+
+
+def refdata_stats():
+    with _stats_lock:
+        s = dict(_stats)
+    now = time.monotonic()
+    s['tables'] = {t: dict(rows=len(snap.ids), age=round(now - loaded, 1)) for t, (_, loaded, snap) in _snapshots.items()}
+    return s
+
+
+def admin_name(conn, admin_id):
+    """Official's name, or None for an unknown Admin_ID."""
+    snap = snapshot('MINISTRY', conn)
+    i = snap.ids.find(admin_id)
+    if i >= 0:
+        _count('hits')
+        return snap.names[i] or admin_id
+    _count('misses')
+    row = query_row(conn, "SELECT Name FROM MINISTRY WHERE Admin_ID=%s", (admin_id,))
+    return None if row is None else (row[0] or admin_id)
+
+
+def officials(conn):
+    """[{'Admin_ID', 'Name'}] ordered by name, for select boxes."""
+    snap = snapshot('MINISTRY', conn)
+    rows = [dict(Admin_ID=snap.ids[i], Name=snap.names[i]) for i in range(len(snap.ids))]
+    return sorted(rows, key=lambda o: (o['Name'] or '', o['Admin_ID']))
+
+
+def department_exists(conn, dept_id):
+    if snapshot('DEPARTMENT', conn).ids.find(dept_id) >= 0:
+        _count('hits')
+        return True
+    _count('misses')
+    return bool(query_scalar(conn, "SELECT COUNT(*) FROM DEPARTMENT WHERE Dept_ID=%s", (dept_id,), 0))
+
+
+def product(conn, item_id):
+    """(Vendor_ID, Unit_Cost) of a product, or None for an unknown Item_ID."""
+    snap = snapshot('PRODUCT', conn)
+    i = snap.ids.find(item_id)
+    if i >= 0:
+        _count('hits')
+        v = snap.vendor[i]
+        return (None if v < 0 else snap.vendor_keys[v]), Decimal(snap.cost_cents[i]).scaleb(-money.COST_PLACES)
+    _count('misses')
+    return query_row(conn, "SELECT Vendor_ID, Unit_Cost FROM PRODUCT WHERE Item_ID=%s", (item_id,))
+
+
+def vendor_blacklisted(conn, vendor_id):
+    """Blacklist flag, or None for an unknown Vendor_ID."""
+    snap = snapshot('VENDOR', conn)
+    i = snap.ids.find(vendor_id)
+    if i >= 0:
+        _count('hits')
+        return bool(snap.blacklisted[i])
+    _count('misses')
+    flag = query_scalar(conn, "SELECT Blacklisted FROM VENDOR WHERE Vendor_ID=%s", (vendor_id,))
+    return None if flag is None else bool(flag)
+
+
+# Autocomplete: kind -> snapshot table
+AUTOCOMPLETE = {'departments': 'DEPARTMENT', 'products': 'PRODUCT', 'officials': 'MINISTRY', 'vendors': 'VENDOR'}
+
+
+def autocomplete(conn, kind, q, limit=20):
+    """[{'value', 'label'}] of IDs starting with `q` (officials also match on name)."""
+    snap = snapshot(AUTOCOMPLETE[kind], conn)
+    q = q.strip()
+    if kind == 'officials':
+        ql = q.lower()
+        hits = [i for i in range(len(snap.ids)) if snap.ids[i].lower().startswith(ql) or ql in (snap.names[i] or '').lower()]
+        return [dict(value=snap.ids[i], label=f'{snap.names[i]} ({snap.ids[i]})') for i in hits[:limit]]
+    return [dict(value=snap.ids[i], label=snap.ids[i]) for i in snap.ids.starting_with(q, limit)]
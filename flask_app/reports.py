@@ -0,0 +1,257 @@
+import datetime
+from .cache import cached
+from .db import query_all, query_batch, query_row
+
+# Read models shared by the HTML pages and the JSON API (same SQL, same cache entries).
+# The analytics ones take an optional `period` = (start, end) of dates, end exclusive, either side
+# may be None. Without one they read the SPEND_ROLLUP running totals; with one they aggregate only
+# the BUDGET_LOG partitions (and BUDGET_LOG_SUMMARY days) inside it.
+
+DASHBOARD_METRICS = [
+    ("Departments", "SELECT COUNT(*) FROM DEPARTMENT"),
+    ("Vendors", "SELECT COUNT(*) FROM VENDOR"),
+    ("Products", "SELECT COUNT(*) FROM PRODUCT"),
+    ("Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST"),
+    ("Approved Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST WHERE Status='Approved'"),
+    ("Pending Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST WHERE Status='Pending'"),
+    ("Rejected Requests", "SELECT COUNT(*) FROM PROCUREMENT_REQUEST WHERE Status='Rejected'"),
+    ("Total Ministry Budget", "SELECT COALESCE(SUM(Current_Budget),0) FROM MINISTRY"),
+    ("Total Dept Budget", "SELECT COALESCE(SUM(Current_Budget),0) FROM DEPARTMENT"),
+]
+
+
+# All nine metrics as scalar subqueries of one SELECT
+METRICS_SQL = "SELECT " + ", ".join(f"COALESCE(({q}),0) AS m{i}" for i, (_, q) in enumerate(DASHBOARD_METRICS))
+
+# Department spend vs remaining; spend comes from the SPEND_ROLLUP running totals
+SPEND_SQL = (
+    "SELECT d.Dept_ID, d.Name, "
+    "COALESCE(r.Amount,0) AS Spent, "
+    "COALESCE(d.Current_Budget,0) AS Remaining "
+    "FROM DEPARTMENT d "
+    "LEFT JOIN SPEND_ROLLUP r ON r.Dimension='DEPT' AND r.Dim_Key=d.Dept_ID "
+    "ORDER BY Spent DESC, d.Dept_ID LIMIT 15"
+)
+
+METRICS_TAGS = ('DEPARTMENT', 'VENDOR', 'PRODUCT', 'PROCUREMENT_REQUEST', 'MINISTRY')
+SPEND_TAGS = ('DEPARTMENT', 'BUDGET_LOG')
+
+
+def _metrics(values):
+    return [(name, v) for (name, _), v in zip(DASHBOARD_METRICS, values)]
+
+
+def dashboard_metrics(conn):
+    return cached('dashboard.metrics', METRICS_TAGS, lambda: _metrics(query_row(conn, METRICS_SQL)))
+
+
+def dashboard_spend(conn):
+    return cached('dashboard.spend', SPEND_TAGS, lambda: query_all(conn, SPEND_SQL))
+
+
+def dashboard_data(conn):
+    """(metrics, spend) for the dashboard page; on a cache miss both reads go out in one round-trip."""
+    def load():
+        metrics, spend = query_batch(conn, [(METRICS_SQL, None), (SPEND_SQL, None)])
+        return _metrics(metrics[0].values()), spend
+    return cached('dashboard', tuple(dict.fromkeys(METRICS_TAGS + SPEND_TAGS)), load)
+
+
+def parse_period(args):
+    """(start, end) from ?from=YYYY-MM-DD&to=YYYY-MM-DD (both inclusive); None when neither is usable."""
+    def day(name):
+        try:
+            return datetime.date.fromisoformat(args.get(name, '').strip())
+        except ValueError:
+            return None
+    start, last = day('from'), day('to')
+    if start is None and last is None:
+        return None
+    return start, last + datetime.timedelta(days=1) if last else None
+
+
+def period_filter(col, period):
+    """SQL condition and params restricting `col` to `period`."""
+    conds, params = [], []
+    if period and period[0]:
+        conds.append(f"{col} >= %s")
+        params.append(period[0])
+    if period and period[1]:
+        conds.append(f"{col} < %s")
+        params.append(period[1])
+    return " AND ".join(conds) or "1=1", params
+
+
+def _key(name, period):
+    return name if not period else f"{name}@{period[0] or ''}..{period[1] or ''}"
+
+
+def _period_spend(period):
+    # Department spend within the period: live log months plus the summaries of retired ones
+    log_where, log_params = period_filter('Timestamp', period)
+    sum_where, sum_params = period_filter('Day', period)
+    sql = (
+        "SELECT Dept_ID, SUM(Amount) AS Amount FROM ("
+        f" SELECT Dept_ID, Amount FROM BUDGET_LOG WHERE {log_where}"
+        f" UNION ALL SELECT Dept_ID, Amount FROM BUDGET_LOG_SUMMARY WHERE {sum_where}"
+        ") s GROUP BY Dept_ID"
+    )
+    return sql, log_params + sum_params
+
+
+def dept_kpis(conn, period=None):
+    # Department KPIs with joins + conditional aggregates + rolled-up spend
+    if period:
+        return cached(_key('analytics.dept_kpis', period), ('DEPARTMENT', 'PROCUREMENT_REQUEST', 'BUDGET_LOG'),
+                      lambda: _dept_kpis_period(conn, period))
+    return cached('analytics.dept_kpis', ('DEPARTMENT', 'PROCUREMENT_REQUEST', 'BUDGET_LOG'), lambda: dept_kpis_rows(conn))
+
+
+def _key_filter(col, keys):
+    if keys is None:
+        return "", ()
+    return f"WHERE {col} IN ({','.join(['%s'] * len(keys))})", tuple(keys)
+
+
+def dept_kpis_rows(conn, dept_ids=None):
+    """Uncached department KPIs, optionally only for `dept_ids` (incremental snapshot refresh)."""
+    where, params = _key_filter('d.Dept_ID', dept_ids)
+    return query_all(conn, f"""
+        SELECT d.Dept_ID, d.Name,
+               COUNT(pr.Request_ID) AS Total_Requests,
+               SUM(CASE WHEN pr.Status='Approved' THEN 1 ELSE 0 END) AS Approved,
+               SUM(CASE WHEN pr.Status='Rejected' THEN 1 ELSE 0 END) AS Rejected,
+               SUM(CASE WHEN pr.Status='Pending'  THEN 1 ELSE 0 END) AS Pending,
+               COALESCE(r.Amount,0) AS Total_Spend,
+               AVG(pr.Total_Cost) AS Avg_Request_Cost,
+               MAX(pr.Total_Cost) AS Max_Request_Cost
+        FROM DEPARTMENT d
+        LEFT JOIN SPEND_ROLLUP r ON r.Dimension='DEPT' AND r.Dim_Key=d.Dept_ID
+        LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Dept_ID = d.Dept_ID
+        {where}
+        GROUP BY d.Dept_ID, d.Name, r.Amount
+        ORDER BY Total_Spend DESC, d.Dept_ID
+    """, params)
+
+
+def _dept_kpis_period(conn, period):
+    spend_sql, spend_params = _period_spend(period)
+    req_where, req_params = period_filter('pr.Date_of_Request', period)
+    return query_all(conn, f"""
+        SELECT d.Dept_ID, d.Name,
+               COUNT(pr.Request_ID) AS Total_Requests,
+               SUM(CASE WHEN pr.Status='Approved' THEN 1 ELSE 0 END) AS Approved,
+               SUM(CASE WHEN pr.Status='Rejected' THEN 1 ELSE 0 END) AS Rejected,
+               SUM(CASE WHEN pr.Status='Pending'  THEN 1 ELSE 0 END) AS Pending,
+               COALESCE(r.Amount,0) AS Total_Spend,
+               AVG(pr.Total_Cost) AS Avg_Request_Cost,
+               MAX(pr.Total_Cost) AS Max_Request_Cost
+        FROM DEPARTMENT d
+        LEFT JOIN ({spend_sql}) r ON r.Dept_ID = d.Dept_ID
+        LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Dept_ID = d.Dept_ID AND {req_where}
+        GROUP BY d.Dept_ID, d.Name, r.Amount
+        ORDER BY Total_Spend DESC, d.Dept_ID
+    """, spend_params + req_params)
+
+
+def category_spend(conn, period=None):
+    # Category spend using join PR->PRODUCT and only approved requests
+    req_where, req_params = period_filter('pr.Date_of_Request', period)
+    return cached(_key('analytics.cat_spend', period), ('PRODUCT', 'PROCUREMENT_REQUEST'), lambda: query_all(conn, f"""
+        SELECT p.Category,
+               COUNT(pr.Request_ID) AS Requests,
+               SUM(CASE WHEN pr.Status='Approved' THEN pr.Total_Cost ELSE 0 END) AS Approved_Spend,
+               AVG(p.Unit_Cost) AS Avg_Unit_Cost
+        FROM PRODUCT p
+        LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Item_ID = p.Item_ID AND {req_where}
+        GROUP BY p.Category
+        ORDER BY Approved_Spend DESC, p.Category
+    """, req_params))
+
+
+def vendor_performance(conn, period=None):
+    # Vendor performance: product_count (subquery) + approved spend (rollup)
+    if period:
+        appr_where, appr_params = period_filter('Date_of_Approval', period)
+        return cached(_key('analytics.vendor_perf', period), ('VENDOR', 'PRODUCT', 'PROCUREMENT_REQUEST'),
+                      lambda: query_all(conn, f"""
+            SELECT v.Vendor_ID, v.Company,
+                   (SELECT COUNT(*) FROM PRODUCT px WHERE px.Vendor_ID = v.Vendor_ID) AS Product_Count,
+                   COALESCE(r.Amount,0) AS Total_Spend
+            FROM VENDOR v
+            LEFT JOIN (
+                SELECT Vendor_ID, SUM(Total_Cost) AS Amount FROM PROCUREMENT_REQUEST
+                WHERE Status='Approved' AND {appr_where} GROUP BY Vendor_ID
+            ) r ON r.Vendor_ID = v.Vendor_ID
+            ORDER BY Total_Spend DESC, Product_Count DESC
+        """, appr_params))
+    return cached('analytics.vendor_perf', ('VENDOR', 'PRODUCT', 'PROCUREMENT_REQUEST'), lambda: vendor_performance_rows(conn))
+
+
+def vendor_performance_rows(conn, vendor_ids=None):
+    """Uncached vendor performance, optionally only for `vendor_ids` (incremental snapshot refresh)."""
+    where, params = _key_filter('v.Vendor_ID', vendor_ids)
+    return query_all(conn, f"""
+        SELECT v.Vendor_ID, v.Company,
+               (SELECT COUNT(*) FROM PRODUCT px WHERE px.Vendor_ID = v.Vendor_ID) AS Product_Count,
+               COALESCE(r.Amount,0) AS Total_Spend
+        FROM VENDOR v
+        LEFT JOIN SPEND_ROLLUP r ON r.Dimension='VENDOR' AND r.Dim_Key=v.Vendor_ID
+        {where}
+        ORDER BY Total_Spend DESC, Product_Count DESC
+    """, params)
+
+
+def above_average_departments(conn, period=None):
+    # Departments whose spend is above average department spend (nested subquery + HAVING)
+    if period:
+        spend_sql, spend_params = _period_spend(period)
+        return cached(_key('analytics.above_avg_dept', period), ('DEPARTMENT', 'BUDGET_LOG'), lambda: query_all(conn, f"""
+            WITH spend AS (
+                SELECT d.Dept_ID, d.Name, COALESCE(r.Amount,0) AS Spend
+                FROM DEPARTMENT d LEFT JOIN ({spend_sql}) r ON r.Dept_ID = d.Dept_ID
+            )
+            SELECT Dept_ID, Name, Spend FROM spend
+            WHERE Spend > (SELECT AVG(Spend) FROM spend)
+            ORDER BY Spend DESC
+        """, spend_params))
+    return cached('analytics.above_avg_dept', ('DEPARTMENT', 'BUDGET_LOG'), lambda: query_all(conn, """
+        SELECT d.Dept_ID, d.Name, COALESCE(r.Amount,0) AS Spend
+        FROM DEPARTMENT d
+        LEFT JOIN SPEND_ROLLUP r ON r.Dimension='DEPT' AND r.Dim_Key=d.Dept_ID
+        HAVING Spend > (
+            SELECT AVG(COALESCE(r2.Amount,0))
+            FROM DEPARTMENT d2
+            LEFT JOIN SPEND_ROLLUP r2 ON r2.Dimension='DEPT' AND r2.Dim_Key=d2.Dept_ID
+        )
+        ORDER BY Spend DESC
+    """))
+
+
+def high_value_approvals(conn, period=None):
+    # High value approvals with join to vendor + ministry via budget_log
+    appr_where, appr_params = period_filter('pr.Date_of_Approval', period)
+    # An approval's log entry is written when it is approved, so only log months from the start can match
+    log_where, log_params = period_filter('bl.Timestamp', period and (period[0], None))
+    return cached(_key('analytics.high_value', period), ('PROCUREMENT_REQUEST', 'VENDOR', 'BUDGET_LOG', 'MINISTRY'),
+                  lambda: query_all(conn, f"""
+        SELECT pr.Request_ID, pr.Dept_ID, pr.Item_ID, pr.Vendor_ID, pr.Total_Cost,
+               v.Company AS Vendor, m.Name AS Approved_By, pr.Date_of_Approval
+        FROM PROCUREMENT_REQUEST pr
+        LEFT JOIN VENDOR v ON v.Vendor_ID = pr.Vendor_ID
+        LEFT JOIN BUDGET_LOG bl ON bl.Request_ID = pr.Request_ID AND {log_where}
+        LEFT JOIN MINISTRY m ON m.Admin_ID = bl.Admin_ID
+        WHERE pr.Status='Approved' AND {appr_where}
+        ORDER BY pr.Total_Cost DESC
+        LIMIT 20
+    """, log_params + appr_params))
+
+
+# Analytics page sections, by template variable name
+ANALYTICS = {
+    'dept_kpis': dept_kpis,
+    'cat_spend': category_spend,
+    'vendor_perf': vendor_performance,
+    'above_avg_dept': above_average_departments,
+    'high_value': high_value_approvals,
+}
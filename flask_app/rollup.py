@@ -0,0 +1,46 @@
+from .db import transactional
+
+# Same definitions as the triggers in migrations/0002_spend_rollup.sql. Log months retired by
+# `flask partitions` only survive as BUDGET_LOG_SUMMARY days, so DEPT/DAY include those too.
+REBUILD_SQL = [
+    "DELETE FROM SPEND_ROLLUP",
+    """
+    INSERT INTO SPEND_ROLLUP (Dimension, Dim_Key, Amount, Entries)
+    SELECT 'DEPT', Dept_ID, COALESCE(SUM(Amount),0), SUM(Entries) FROM (
+        SELECT Dept_ID, Amount, 1 AS Entries FROM BUDGET_LOG WHERE Dept_ID IS NOT NULL
+        UNION ALL
+        SELECT Dept_ID, Amount, Entries FROM BUDGET_LOG_SUMMARY WHERE Dept_ID <> ''
+    ) s GROUP BY Dept_ID
+    """,
+    """
+    INSERT INTO SPEND_ROLLUP (Dimension, Dim_Key, Amount, Entries)
+    SELECT 'DAY', DATE_FORMAT(Day, '%Y-%m-%d') AS Day, COALESCE(SUM(Amount),0), SUM(Entries) FROM (
+        SELECT DATE(Timestamp) AS Day, Amount, 1 AS Entries FROM BUDGET_LOG
+        UNION ALL
+        SELECT Day, Amount, Entries FROM BUDGET_LOG_SUMMARY
+    ) s GROUP BY Day
+    """,
+    """
+    INSERT INTO SPEND_ROLLUP (Dimension, Dim_Key, Amount, Entries)
+    SELECT 'VENDOR', Vendor_ID, COALESCE(SUM(Total_Cost),0), COUNT(*)
+    FROM PROCUREMENT_REQUEST WHERE Status='Approved' AND Vendor_ID IS NOT NULL GROUP BY Vendor_ID
+    """,
+    """
+    INSERT INTO SPEND_ROLLUP (Dimension, Dim_Key, Amount, Entries)
+    SELECT 'CATEGORY', p.Category, COALESCE(SUM(pr.Total_Cost),0), COUNT(*)
+    FROM PROCUREMENT_REQUEST pr JOIN PRODUCT p ON p.Item_ID = pr.Item_ID
+    WHERE pr.Status='Approved' GROUP BY p.Category
+    """,
+]
+
+
+def rebuild_rollups(conn):
+    """Recompute SPEND_ROLLUP from BUDGET_LOG/PROCUREMENT_REQUEST in one transaction."""
+    with transactional(conn):
+        cur = conn.cursor()
+        for sql in REBUILD_SQL:
+            cur.execute(sql)
+        cur.execute("SELECT Dimension, COUNT(*) FROM SPEND_ROLLUP GROUP BY Dimension")
+        counts = dict(cur.fetchall())
+        cur.close()
+    return counts
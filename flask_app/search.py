@@ -0,0 +1,80 @@
+import re
+
+# Prefixed IDs such as PRO0042 / REQ000123 (three letters, at least one digit)
+ID_RE = re.compile(r'^[A-Za-z]{3}\d+$')
+# InnoDB FULLTEXT defaults: innodb_ft_min_token_size=3 plus the built-in stopword list
+MIN_TOKEN = 3
+STOPWORDS = {
+    'about', 'are', 'com', 'for', 'from', 'how', 'that', 'the', 'this', 'was',
+    'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www',
+}
+
+# Text columns must match the FULLTEXT indexes in migrations/0003_search_indexes.sql
+ENTITIES = {
+    'MINISTRY': dict(id='Admin_ID', text=('Name', 'Role', 'Email')),
+    'DEPARTMENT': dict(id='Dept_ID', text=('Name', 'Region')),
+    'VENDOR': dict(id='Vendor_ID', text=('Company', 'Category', 'Country')),
+    'PRODUCT': dict(id='Item_ID', text=('Name', 'Category', 'Manufacturer')),
+}
+
+# Which ID column a prefix refers to on the ID-only search pages
+REQUEST_PREFIXES = {'REQ': 'pr.Request_ID', 'DPT': 'pr.Dept_ID', 'PRO': 'pr.Item_ID', 'VEN': 'pr.Vendor_ID'}
+LOG_PREFIXES = {'BUD': 'Log_ID', 'REQ': 'Request_ID', 'DPT': 'Dept_ID', 'DEF': 'Admin_ID'}
+STATUSES = ('Pending', 'Approved', 'Rejected')
+
+
+class SearchPlan:
+    """
+    WHERE clause for a search box query.
+
+    `ranked` plans carry an ORDER BY (relevance) and are paged by offset; the
+    others filter on an indexed ID column and keep keyset pagination.
+    """
+
+    def __init__(self, where, params, order=None, order_params=()):
+        self.where = where
+        self.params = tuple(params)
+        self.order = order
+        self.order_params = tuple(order_params)
+
+    @property
+    def ranked(self):
+        return self.order is not None
+
+
+def prefix_like(q):
+    # Escape LIKE wildcards so only the trailing % is a wildcard: a PK range scan
+    return q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def boolean_query(q):
+    # Every usable word must appear, as a prefix: "arm truck" -> "+arm* +truck*"
+    words = re.findall(r'\w+', q.lower())
+    words = [w for w in words if len(w) >= MIN_TOKEN and w not in STOPWORDS]
+    return ' '.join(f'+{w}*' for w in words)
+
+
+def entity_search(entity, q):
+    spec = ENTITIES[entity]
+    if ID_RE.match(q):
+        return SearchPlan(f"{spec['id']} LIKE %s", (prefix_like(q.upper()),))
+    terms = boolean_query(q)
+    if not terms:
+        # Nothing FULLTEXT can match (too short / stopwords): prefix on the ID and first text column
+        like = prefix_like(q)
+        return SearchPlan(f"{spec['id']} LIKE %s OR {spec['text'][0]} LIKE %s", (like, like))
+    match = f"MATCH({','.join(spec['text'])}) AGAINST (%s IN BOOLEAN MODE)"
+    return SearchPlan(match, (terms,), order=f"{match} DESC, {spec['id']}", order_params=(terms,))
+
+
+def id_search(q, prefixes, fallback_cols, status_col=None):
+    # ID-only pages (requests, logs): route each query shape to one indexed column
+    if status_col:
+        for st in STATUSES:
+            if st.lower().startswith(q.lower()):
+                return SearchPlan(f"{status_col} = %s", (st,))
+    like = prefix_like(q.upper())
+    col = prefixes.get(q[:3].upper())
+    if col:
+        return SearchPlan(f"{col} LIKE %s", (like,))
+    return SearchPlan(" OR ".join(f"{c} LIKE %s" for c in fallback_cols), (like,) * len(fallback_cols))
@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+import time
+from .cache import bypass_cache
+from .db import get_pool, query_all, query_scalar
+from . import jsoncodec
+from .reports import ANALYTICS, dept_kpis_rows, vendor_performance_rows
+
+log = logging.getLogger('flask_app.analytics')
+
+LOCK_NAME = 'defense_db.analytics_refresh'
+# ANALYTICS_SNAPSHOT row (no data) stamped at the end of every full rebuild, so the refreshers of
+# all web workers can tell when any of them last did one
+FULL_REBUILD = '_full_rebuild'
+
+# Sections an incremental refresh rebuilds row by row: section -> (ANALYTICS_DIRTY dimension,
+# key column, loader for a list of keys, sort key matching the section's ORDER BY).
+# The other sections are recomputed whole whenever anything is dirty.
+INCREMENTAL = {
+    'dept_kpis': ('DEPT', 'Dept_ID', dept_kpis_rows,
+                  lambda r: (-(r['Total_Spend'] or 0), r['Dept_ID'])),
+    'vendor_perf': ('VENDOR', 'Vendor_ID', vendor_performance_rows,
+                    lambda r: (-(r['Total_Spend'] or 0), -(r['Product_Count'] or 0), r['Vendor_ID'])),
+}
+
+KEYS_PER_QUERY = 500
+
+
+def load_snapshots(conn):
+    """{section: dict(rows, as_of, mode)} for every section refreshed so far."""
+    out = {}
+    for r in query_all(conn, "SELECT Section, Data, Mode, Refreshed_At FROM ANALYTICS_SNAPSHOT WHERE Section <> %s",
+                       (FULL_REBUILD,)):
+        try:
+            rows = jsoncodec.loads(r['Data'])
+        except ValueError:
+            # Written in an older format: served live until the next refresh rebuilds it whole
+            continue
+        out[r['Section']] = dict(rows=rows, as_of=r['Refreshed_At'], mode=r['Mode'])
+    return out
+
+
+def _save(conn, section, rows, mode, seconds):
+    cur = conn.cursor()
+    cur.execute(
+        "REPLACE INTO ANALYTICS_SNAPSHOT (Section, Data, Row_Count, Mode, Seconds, Refreshed_At) "
+        "VALUES (%s, %s, %s, %s, %s, NOW(6))",
+        (section, jsoncodec.dumps(rows), len(rows), mode, round(seconds, 3)),
+    )
+    cur.close()
+
+
+def _marks(conn, sql, marks):
+    cur = conn.cursor()
+    for i in range(0, len(marks), KEYS_PER_QUERY):
+        chunk = marks[i:i + KEYS_PER_QUERY]
+        cur.execute(sql.format(','.join(['(%s,%s)'] * len(chunk))), [v for m in chunk for v in m])
+    cur.close()
+
+
+def refresh(conn, full=False, full_every=None):
+    """
+    Recompute the analytics snapshots. Incremental (default) consumes ANALYTICS_DIRTY:
+    the marked departments/vendors are re-read and merged into their sections, and the
+    whole-table sections are recomputed only if anything was marked. `full` rebuilds all,
+    unless `full_every` is given and some process already did a full rebuild within that
+    many seconds; the run is then incremental.
+    Returns {section: (mode, rows, seconds)}, or None if another process is refreshing.
+    """
+    if not query_scalar(conn, "SELECT GET_LOCK(%s, 0)", (LOCK_NAME,)):
+        return None
+    try:
+        if full and full_every and query_scalar(conn, (
+            "SELECT COUNT(*) FROM ANALYTICS_SNAPSHOT "
+            "WHERE Section = %s AND Mode = 'full' AND Refreshed_At >= NOW(6) - INTERVAL %s SECOND"
+        ), (FULL_REBUILD, full_every)):
+            full = False
+        started = time.perf_counter()
+        current = load_snapshots(conn)
+        marks = [(r['Dimension'], r['Dim_Key']) for r in query_all(conn, "SELECT Dimension, Dim_Key FROM ANALYTICS_DIRTY")]
+        if not full and not marks and all(name in current for name in ANALYTICS):
+            return {}
+        # Consume the marks before reading, so anything written from here on marks again
+        _marks(conn, "DELETE FROM ANALYTICS_DIRTY WHERE (Dimension, Dim_Key) IN ({})", marks)
+        done = {}
+        try:
+            for name, load in ANALYTICS.items():
+                t0 = time.perf_counter()
+                if not full and name in current and name in INCREMENTAL:
+                    dim, key, load_keys, sort_key = INCREMENTAL[name]
+                    keys = sorted({k for d, k in marks if d == dim})
+                    if not keys:
+                        continue
+                    fresh = []
+                    for i in range(0, len(keys), KEYS_PER_QUERY):
+                        fresh.extend(load_keys(conn, keys[i:i + KEYS_PER_QUERY]))
+                    changed = set(keys)
+                    rows = [r for r in current[name]['rows'] if r[key] not in changed] + fresh
+                    rows.sort(key=sort_key)
+                    mode = 'incremental'
+                elif full or name not in current or marks:
+                    with bypass_cache():
+                        rows = load(conn)
+                    mode = 'full'
+                else:
+                    continue
+                seconds = time.perf_counter() - t0
+                _save(conn, name, rows, mode, seconds)
+                done[name] = (mode, len(rows), seconds)
+            if full:
+                _save(conn, FULL_REBUILD, [], 'full', time.perf_counter() - started)
+        except Exception:
+            # Put the consumed marks back so the next run retries them
+            _marks(conn, "INSERT IGNORE INTO ANALYTICS_DIRTY (Dimension, Dim_Key) VALUES {}", marks)
+            raise
+        return done
+    finally:
+        query_scalar(conn, "SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+
+
+def pending_age(conn):
+    """Seconds since the oldest unconsumed change mark, or None when nothing is marked."""
+    return query_scalar(conn, "SELECT TIMESTAMPDIFF(MICROSECOND, MIN(Marked_At), NOW(6)) / 1e6 FROM ANALYTICS_DIRTY")
+
+
+def run_refresher(stop, interval=900.0, delay=10.0, poll=5.0):
+    """
+    Refresh loop: a full rebuild every `interval` seconds, and an incremental one once the
+    oldest pending change is `delay` seconds old, so a burst of writes is folded into one run.
+    A full rebuild that another process (another web worker's refresher) already did within
+    `interval` is not repeated. Runs until `stop` (a threading.Event) is set.
+    """
+    last_full = 0.0
+    while not stop.is_set():
+        pool = get_pool()
+        conn = None
+        try:
+            conn = pool.acquire()
+            full = time.monotonic() - last_full >= interval
+            age = None if full else pending_age(conn)
+            if full or (age is not None and age >= delay):
+                done = refresh(conn, full=full, full_every=interval)
+                if done is not None and full:
+                    last_full = time.monotonic()
+                if done:
+                    log.info('analytics refreshed: %s', ', '.join(f'{n} {m} {r} rows {s:.2f}s' for n, (m, r, s) in done.items()))
+        except Exception:
+            log.exception('analytics refresh failed')
+        finally:
+            if conn is not None:
+                pool.release(conn)
+        stop.wait(poll)
+
+
+_refresher = None
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+
+def init_snapshots(app):
+    """Start the in-process refresher (one thread per worker) when ANALYTICS_REFRESH_INTERVAL is set."""
+    interval = float(os.environ.get('ANALYTICS_REFRESH_INTERVAL', '0'))
+    if interval <= 0:
+        return
+    settings = dict(interval=interval,
+                    delay=float(os.environ.get('ANALYTICS_REFRESH_DELAY', '10')),
+                    poll=float(os.environ.get('ANALYTICS_REFRESH_POLL', '5')))
+
+    @app.before_request
+    def _start_refresher():
+        # Started lazily so each forked gunicorn worker gets its own thread
+        global _refresher, _refresher_pid
+        if _refresher_pid == os.getpid():
+            return
+        with _refresher_lock:
+            if _refresher_pid != os.getpid():
+                _refresher = threading.Thread(target=run_refresher, args=(threading.Event(),), kwargs=settings,
+                                              name='analytics-refresh', daemon=True)
+                _refresher.start()
+                _refresher_pid = os.getpid()
@@ -0,0 +1,433 @@
+import json
+from .db import call_proc, exec_batch, exec_sql, query_all, query_batch, query_scalar, run_with_retries, transactional
+from .ids import next_id, reserve_ids
+from . import money, refdata
+
+# Requests handled per transaction; keeps lock sets and IN-lists bounded
+CHUNK = 500
+
+# python: the statements below, one round-trip each (or one per batch); procedures: one CALL per action
+# (stored procedures from migrations/0005_workflow_procedures.sql); optimistic: like python, but
+# approvals take no FOR UPDATE locks and deadlocks/lock timeouts are retried (see _approve_conditional)
+BACKENDS = ('python', 'procedures', 'optimistic')
+
+# MYSQL_ERRNO raised by the workflow procedures -> the message the Python path uses
+PROCEDURE_ERRORS = {
+    5001: 'Unknown Request_ID',
+    5002: 'Unknown Admin_ID',
+    5003: 'Only Pending can be approved',
+    5004: 'Only Pending can be rejected',
+    5005: 'Only Approved can be cancelled',
+    5006: 'Insufficient department budget',
+    5007: 'Insufficient stock',
+    5008: 'No supplier found for selected product',
+    5009: 'Product has no linked vendor',
+    5010: 'Vendor is blacklisted',
+    5011: 'Unknown Dept_ID',
+    5012: 'Invalid input for new request',
+    5013: 'Unknown batch action',
+    5014: 'ID_SEQUENCE is not migrated',
+    5015: 'Unknown Vendor_ID',
+}
+
+
+def _ph(n):
+    return ','.join(['%s'] * n)
+
+
+def _case(key, mapping):
+    # CASE <key> WHEN k1 THEN v1 ... END, for one-statement multi-row updates
+    keys = sorted(k for k in mapping if k is not None)
+    sql = f"CASE {key} " + " ".join(["WHEN %s THEN %s"] * len(keys)) + " END"
+    params = [x for k in keys for x in (k, mapping[k])]
+    return sql, params, keys
+
+
+def _adjust(conn, table, key, column, sign, deltas):
+    # column = column +/- delta per key, all keys in one UPDATE
+    case, params, keys = _case(key, deltas)
+    if keys:
+        exec_sql(conn, f"UPDATE {table} SET {column} = {column} {sign} {case} "
+                       f"WHERE {key} IN ({_ph(len(keys))})", params + keys)
+
+
+def _unit_total(conn, item_id, qty):
+    # For requests stored without a Total_Cost: priced from the cached Unit_Cost
+    product = refdata.product(conn, item_id)
+    return money.line_total(product[1] if product else 0, qty)
+
+
+def _call(conn, name, args):
+    try:
+        return call_proc(conn, name, args)
+    except Exception as e:
+        msg = PROCEDURE_ERRORS.get(getattr(e, 'errno', None))
+        if msg is None:
+            raise
+        raise RuntimeError(msg) from e
+
+
+def create_request(conn, dept_id, item_id, qty, backend='python'):
+    """Create a Pending request for `qty` of `item_id`; the vendor is the product's. Returns (request_id, vendor_id)."""
+    if backend == 'procedures':
+        row = _call(conn, 'create_procurement_request', (dept_id, item_id, qty))[0][0]
+        return row['Request_ID'], row['Vendor_ID']
+    # Product, vendor and blacklist flag come from the in-process snapshots (no round-trip)
+    product = refdata.product(conn, item_id)
+    if product is None:
+        raise RuntimeError('No supplier found for selected product')
+    vid, unit_cost = product
+    if vid is None or vid == '':
+        raise RuntimeError('Product has no linked vendor')
+    if refdata.vendor_blacklisted(conn, vid):
+        raise RuntimeError('Vendor is blacklisted')
+    # Next Request_ID from the sequence table (no table scan or range lock)
+    rid = next_id('REQ')
+    with transactional(conn):
+        # A snapshot can be stale: the INSERT re-checks the blacklist flag itself, and
+        # trg_request_bi re-checks the product's vendor and recomputes Total_Cost
+        if not exec_sql(conn, """
+            INSERT INTO PROCUREMENT_REQUEST
+            (Request_ID, Dept_ID, Item_ID, Vendor_ID, Quantity, Total_Cost, Status, Date_of_Request)
+            SELECT %s,%s,%s,Vendor_ID,%s,%s,'Pending', NOW() FROM VENDOR WHERE Vendor_ID=%s AND NOT Blacklisted
+        """, (rid, dept_id, item_id, qty, money.line_total(unit_cost, qty), vid)):
+            raise RuntimeError('Vendor is blacklisted')
+    return rid, vid
+
+
+def act_on_request(conn, action, request_id, admin_id, backend='python'):
+    """Approve, reject or cancel one request. Raises RuntimeError with the user-facing message on failure."""
+    if action not in ('approve', 'reject', 'cancel'):
+        raise ValueError(f'Unknown action: {action}')
+    if backend == 'procedures':
+        if action == 'reject':
+            _call(conn, 'reject_request', (request_id, admin_id))
+        else:
+            # Log IDs come from this worker's reserved block, so the CALL never waits on ID_SEQUENCE
+            proc = 'approve_request' if action == 'approve' else 'cancel_request'
+            _call(conn, proc, (request_id, admin_id, reserve_ids('BUD', 1)[0]))
+        return
+    status = query_scalar(conn, "SELECT Status FROM PROCUREMENT_REQUEST WHERE Request_ID=%s", (request_id,))
+    if status is None:
+        raise RuntimeError('Unknown Request_ID')
+    if action == 'approve' and status != 'Pending':
+        raise RuntimeError('Only Pending can be approved')
+    # New semantics: cancel only for Approved (undo approval)
+    if action == 'cancel' and status != 'Approved':
+        raise RuntimeError('Only Approved can be cancelled')
+    if action == 'reject' and status != 'Pending':
+        raise RuntimeError('Only Pending can be rejected')
+    admin_name = refdata.admin_name(conn, admin_id)
+    if admin_name is None:
+        raise RuntimeError('Unknown Admin_ID')
+    if action == 'approve' and backend == 'optimistic':
+        log_id = reserve_ids('BUD', 1)[0]
+        if not run_with_retries(lambda: _approve_conditional(conn, request_id, admin_id, log_id)):
+            _approve_one(conn, request_id, admin_id)
+    elif action == 'approve':
+        _approve_one(conn, request_id, admin_id)
+    elif action == 'cancel' and backend == 'optimistic':
+        run_with_retries(lambda: _cancel_one(conn, request_id, admin_id))
+    elif action == 'cancel':
+        _cancel_one(conn, request_id, admin_id)
+    else:
+        exec_sql(conn, "UPDATE PROCUREMENT_REQUEST SET Status='Rejected', Date_of_Approval=NOW(), Approval_Authority=%s WHERE Request_ID=%s", (admin_name or admin_id, request_id))
+
+
+def _approve_one(conn, rid, aid):
+    # Admin name for Approval_Authority display
+    admin_name = refdata.admin_name(conn, aid) or aid
+    with transactional(conn):
+        r = query_all(conn, "SELECT Dept_ID, Item_ID, Vendor_ID, Quantity, COALESCE(Total_Cost,0) Total_Cost FROM PROCUREMENT_REQUEST WHERE Request_ID=%s FOR UPDATE", (rid,))
+        if not r:
+            raise RuntimeError('Request not found')
+        did, iid, qty, total = r[0]['Dept_ID'], r[0]['Item_ID'], int(r[0]['Quantity']), money.cost(r[0]['Total_Cost'])
+        if total == 0:
+            total = _unit_total(conn, iid, qty)
+        # Department then product, both locked in one round-trip
+        budget, stock = query_batch(conn, [
+            ("SELECT Current_Budget FROM DEPARTMENT WHERE Dept_ID=%s FOR UPDATE", (did,)),
+            ("SELECT Stock_Available FROM PRODUCT WHERE Item_ID=%s FOR UPDATE", (iid,)),
+        ])
+        # Effective budget: prefer Current_Budget; if NULL, compute allocation minus approved spend
+        budget = budget[0]['Current_Budget'] if budget else None
+        if budget is None:
+            budget = query_scalar(conn, (
+                "SELECT COALESCE(d.Budget_Allocation,0) - COALESCE(SUM(pr2.Total_Cost),0) "
+                "FROM DEPARTMENT d LEFT JOIN PROCUREMENT_REQUEST pr2 ON pr2.Dept_ID=d.Dept_ID AND pr2.Status='Approved' "
+                "WHERE d.Dept_ID=%s GROUP BY d.Dept_ID"
+            ), (did,), 0)
+        budget = money.amount(budget)
+        stock = int(stock[0]['Stock_Available'] or 0) if stock else 0
+        if budget < total:
+            raise RuntimeError('Insufficient department budget')
+        if stock < qty:
+            raise RuntimeError('Insufficient stock')
+        log_id = next_id('BUD')
+        exec_batch(conn, [
+            ("UPDATE PRODUCT SET Stock_Available = Stock_Available - %s WHERE Item_ID=%s", (qty, iid)),
+            ("UPDATE DEPARTMENT SET Current_Budget = Current_Budget - %s WHERE Dept_ID=%s", (total, did)),
+            ("INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)", (log_id, 'Procurement', did, rid, aid, total)),
+            ("UPDATE PROCUREMENT_REQUEST SET Status='Approved', Date_of_Approval=NOW(), Approval_Authority=%s, Total_Cost=%s WHERE Request_ID=%s", (admin_name, total, rid)),
+        ])
+
+
+class _NeedsLockingPath(Exception):
+    pass
+
+
+def _approve_conditional(conn, rid, aid, log_id):
+    """
+    Approve without reading under FOR UPDATE: each write is a conditional UPDATE whose
+    affected-row count is the check (the request must still be Pending, budget and stock must
+    cover it), so row locks are held only from the first write to the commit. Writes follow the
+    locking path's lock order (request, department, product) to avoid deadlocks with it.
+    Returns False when the department has no Current_Budget, which needs the locking path's
+    fallback computation.
+    """
+    r = query_all(conn, "SELECT Status, Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost,0) Total_Cost FROM PROCUREMENT_REQUEST WHERE Request_ID=%s", (rid,))
+    if not r:
+        raise RuntimeError('Request not found')
+    if r[0]['Status'] != 'Pending':
+        raise RuntimeError('Only Pending can be approved')
+    did, iid, qty = r[0]['Dept_ID'], r[0]['Item_ID'], int(r[0]['Quantity'])
+    total = money.cost(r[0]['Total_Cost'])
+    if total == 0:
+        total = _unit_total(conn, iid, qty)
+    admin_name = refdata.admin_name(conn, aid) or aid
+    try:
+        with transactional(conn):
+            if not exec_sql(conn, "UPDATE PROCUREMENT_REQUEST SET Status='Approved', Date_of_Approval=NOW(), Approval_Authority=%s, Total_Cost=%s WHERE Request_ID=%s AND Status='Pending'", (admin_name, total, rid)):
+                # Approved or rejected by someone else since the read above
+                raise RuntimeError('Only Pending can be approved')
+            # Affected rows count changed rows only (no CLIENT_FOUND_ROWS): deducting 0 would
+            # report 0 rows, and the locking path approves a zero total whatever the budget
+            if total != 0 and not exec_sql(conn, "UPDATE DEPARTMENT SET Current_Budget = Current_Budget - %s WHERE Dept_ID=%s AND Current_Budget >= %s", (total, did, total)):
+                if query_scalar(conn, "SELECT Current_Budget FROM DEPARTMENT WHERE Dept_ID=%s", (did,)) is None:
+                    raise _NeedsLockingPath()
+                raise RuntimeError('Insufficient department budget')
+            if not exec_sql(conn, "UPDATE PRODUCT SET Stock_Available = Stock_Available - %s WHERE Item_ID=%s AND Stock_Available >= %s", (qty, iid, qty)):
+                raise RuntimeError('Insufficient stock')
+            exec_sql(conn, "INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)", (log_id, 'Procurement', did, rid, aid, total))
+    except _NeedsLockingPath:
+        return False
+    return True
+
+
+def _cancel_one(conn, rid, aid):
+    # Undo an approved request fully
+    with transactional(conn):
+        # Lock the request and related rows
+        r = query_all(conn, "SELECT Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost,0) Total_Cost FROM PROCUREMENT_REQUEST WHERE Request_ID=%s FOR UPDATE", (rid,))
+        if not r:
+            raise RuntimeError('Request not found')
+        did, iid, qty, total = r[0]['Dept_ID'], r[0]['Item_ID'], int(r[0]['Quantity']), money.cost(r[0]['Total_Cost'])
+        # Restore stock and department budget, write the reversal entry (negative amount) and
+        # remove the approved request, all in one round-trip
+        writes = [
+            ("UPDATE PRODUCT SET Stock_Available = Stock_Available + %s WHERE Item_ID=%s", (qty, iid)),
+            ("UPDATE DEPARTMENT SET Current_Budget = Current_Budget + %s WHERE Dept_ID=%s", (total, did)),
+        ]
+        rev_amt = -abs(total)
+        if rev_amt != 0:
+            log_id = next_id('BUD')
+            writes.append(("INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)", (log_id, 'Reversal', did, rid, aid, rev_amt)))
+        writes.append(("DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID=%s", (rid,)))
+        exec_batch(conn, writes)
+
+
+def run_batch(conn, action, request_ids, admin_id, backend='python'):
+    """
+    Approve, reject or cancel many requests at once.
+
+    Returns one {'request_id', 'ok', 'message'} entry per distinct input ID, in
+    input order. Requests are processed in Request_ID order, CHUNK at a time, each
+    chunk in its own transaction; a failing request does not fail its chunk.
+    With the procedures backend each chunk is one CALL and each request its own transaction;
+    with the optimistic one a chunk that hits a deadlock or lock timeout is retried.
+    """
+    handler = {'approve': _approve, 'reject': _reject, 'cancel': _cancel}.get(action)
+    if handler is None:
+        raise ValueError(f'Unknown batch action: {action}')
+    ids = list(dict.fromkeys(r.strip() for r in request_ids if r and r.strip()))
+    if backend == 'procedures':
+        return _run_batch_procedure(conn, action, ids, admin_id)
+    results = {}
+    admin_name = refdata.admin_name(conn, admin_id)
+    if admin_name is None:
+        return [dict(request_id=rid, ok=False, message='Unknown Admin_ID') for rid in ids]
+    ordered = sorted(ids)
+    for i in range(0, len(ordered), CHUNK):
+        chunk = ordered[i:i + CHUNK]
+
+        def run_chunk():
+            with transactional(conn):
+                return handler(conn, chunk, admin_id, admin_name or admin_id)
+        try:
+            results.update(run_with_retries(run_chunk) if backend == 'optimistic' else run_chunk())
+        except Exception as e:
+            results.update({rid: str(e) for rid in chunk})
+    return [dict(request_id=rid, ok=results[rid] is None, message=results[rid] or 'OK') for rid in ids]
+
+
+def _run_batch_procedure(conn, action, ids, admin_id):
+    results = {}
+    ordered = sorted(ids)
+    for i in range(0, len(ordered), CHUNK):
+        chunk = ordered[i:i + CHUNK]
+        try:
+            sets = _call(conn, 'run_request_batch', (action, json.dumps(chunk), admin_id))
+        except Exception as e:
+            results.update({rid: str(e) for rid in chunk})
+            continue
+        for r in json.loads(sets[0][0]['Results']):
+            errno = r['errno']
+            results[r['request_id']] = None if not errno else PROCEDURE_ERRORS.get(errno, r['message'])
+    return [dict(request_id=rid, ok=results.get(rid, 'Unknown Request_ID') is None,
+                 message=results.get(rid, 'Unknown Request_ID') or 'OK') for rid in ids]
+
+
+def _lock_requests(conn, ids, want_status, err):
+    rows = query_all(conn, (
+        "SELECT Request_ID, Status, Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost,0) Total_Cost "
+        f"FROM PROCUREMENT_REQUEST WHERE Request_ID IN ({_ph(len(ids))}) ORDER BY Request_ID FOR UPDATE"
+    ), ids)
+    found = {r['Request_ID']: r for r in rows}
+    out, todo = {}, []
+    for rid in ids:
+        r = found.get(rid)
+        if r is None:
+            out[rid] = 'Unknown Request_ID'
+        elif r['Status'] != want_status:
+            out[rid] = err
+        else:
+            todo.append(r)
+    return out, todo
+
+
+def allocate(rows, budgets, products):
+    """
+    Which of the Pending `rows` to approve, in order, given department `budgets` ({Dept_ID:
+    Current_Budget}) and `products` ({Item_ID: row with Stock_Available and Unit_Cost}). Each approval
+    takes its total and quantity out of what the following rows can use; a zero Total_Cost is priced
+    from Unit_Cost. Touches no database. Returns (out, approved, spend, used): {Request_ID: None or
+    the refusal}, [(Request_ID, Dept_ID, total)], and the budget / stock to deduct per department / product.
+    """
+    budget_left = {d: money.to_decimal(b) for d, b in budgets.items()}
+    stock_left = {i: int(p['Stock_Available'] or 0) for i, p in products.items()}
+    out, approved, spend, used = {}, [], {}, {}
+    for r in rows:
+        rid, did, iid, qty = r['Request_ID'], r['Dept_ID'], r['Item_ID'], int(r['Quantity'])
+        total = money.cost(r['Total_Cost'])
+        if total == 0 and iid in products:
+            total = money.line_total(products[iid]['Unit_Cost'], qty)
+        if budget_left.get(did, money.ZERO) < total:
+            out[rid] = 'Insufficient department budget'
+            continue
+        if stock_left.get(iid, 0) < qty:
+            out[rid] = 'Insufficient stock'
+            continue
+        budget_left[did] -= total
+        stock_left[iid] -= qty
+        spend[did] = spend.get(did, money.ZERO) + total
+        used[iid] = used.get(iid, 0) + qty
+        approved.append((rid, did, total))
+        out[rid] = None
+    return out, approved, spend, used
+
+
+def release(rows):
+    """
+    What cancelling the Approved `rows` gives back, as (refund, restock, reversals): the budget per
+    Dept_ID, the stock per Item_ID and the negative Reversal entries [(Request_ID, Dept_ID, amount)].
+    Touches no database.
+    """
+    refund, restock, reversals = {}, {}, []
+    for r in rows:
+        total = money.cost(r['Total_Cost'])
+        refund[r['Dept_ID']] = refund.get(r['Dept_ID'], money.ZERO) + total
+        restock[r['Item_ID']] = restock.get(r['Item_ID'], 0) + int(r['Quantity'])
+        if total != 0:
+            reversals.append((r['Request_ID'], r['Dept_ID'], -abs(total)))
+    return refund, restock, reversals
+
+
+def _approve(conn, ids, admin_id, admin_name):
+    out, todo = _lock_requests(conn, ids, 'Pending', 'Only Pending can be approved')
+    if not todo:
+        return out
+    # Lock order matches the single-request path: request -> department -> product
+    depts = sorted({r['Dept_ID'] for r in todo})
+    budgets = {r['Dept_ID']: r['Current_Budget'] for r in query_all(conn, (
+        f"SELECT Dept_ID, Current_Budget FROM DEPARTMENT WHERE Dept_ID IN ({_ph(len(depts))}) "
+        "ORDER BY Dept_ID FOR UPDATE"
+    ), depts)}
+    missing = [d for d in depts if budgets.get(d) is None]
+    if missing:
+        # Same fallback as the single path: allocation minus approved spend
+        for r in query_all(conn, (
+            "SELECT d.Dept_ID, COALESCE(d.Budget_Allocation,0) - COALESCE(SUM(pr2.Total_Cost),0) AS Budget "
+            "FROM DEPARTMENT d LEFT JOIN PROCUREMENT_REQUEST pr2 ON pr2.Dept_ID=d.Dept_ID AND pr2.Status='Approved' "
+            f"WHERE d.Dept_ID IN ({_ph(len(missing))}) GROUP BY d.Dept_ID"
+        ), missing):
+            budgets[r['Dept_ID']] = r['Budget']
+    items = sorted({r['Item_ID'] for r in todo})
+    products = {r['Item_ID']: r for r in query_all(conn, (
+        f"SELECT Item_ID, Stock_Available, Unit_Cost FROM PRODUCT WHERE Item_ID IN ({_ph(len(items))}) "
+        "ORDER BY Item_ID FOR UPDATE"
+    ), items)}
+
+    decided, approved, spend, used = allocate(todo, budgets, products)
+    out.update(decided)
+    if not approved:
+        return out
+    totals = {rid: total for rid, _, total in approved}
+
+    _adjust(conn, 'PRODUCT', 'Item_ID', 'Stock_Available', '-', used)
+    _adjust(conn, 'DEPARTMENT', 'Dept_ID', 'Current_Budget', '-', spend)
+    log_ids = reserve_ids('BUD', len(approved))
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)",
+        [(lid, 'Procurement', did, rid, admin_id, total) for lid, (rid, did, total) in zip(log_ids, approved)],
+    )
+    cur.close()
+    case, params, keys = _case('Request_ID', totals)
+    exec_sql(conn, (
+        "UPDATE PROCUREMENT_REQUEST SET Status='Approved', Date_of_Approval=NOW(), Approval_Authority=%s, "
+        f"Total_Cost = {case} WHERE Request_ID IN ({_ph(len(keys))})"
+    ), [admin_name] + params + keys)
+    return out
+
+
+def _reject(conn, ids, admin_id, admin_name):
+    out, todo = _lock_requests(conn, ids, 'Pending', 'Only Pending can be rejected')
+    if todo:
+        keys = [r['Request_ID'] for r in todo]
+        exec_sql(conn, (
+            "UPDATE PROCUREMENT_REQUEST SET Status='Rejected', Date_of_Approval=NOW(), Approval_Authority=%s "
+            f"WHERE Request_ID IN ({_ph(len(keys))})"
+        ), [admin_name] + keys)
+        out.update({rid: None for rid in keys})
+    return out
+
+
+def _cancel(conn, ids, admin_id, admin_name):
+    out, todo = _lock_requests(conn, ids, 'Approved', 'Only Approved can be cancelled')
+    if not todo:
+        return out
+    refund, restock, reversals = release(todo)
+    _adjust(conn, 'DEPARTMENT', 'Dept_ID', 'Current_Budget', '+', refund)
+    _adjust(conn, 'PRODUCT', 'Item_ID', 'Stock_Available', '+', restock)
+    if reversals:
+        log_ids = reserve_ids('BUD', len(reversals))
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount) VALUES (%s,%s,%s,%s,%s,%s)",
+            [(lid, 'Reversal', did, rid, admin_id, amt) for lid, (rid, did, amt) in zip(log_ids, reversals)],
+        )
+        cur.close()
+    keys = [r['Request_ID'] for r in todo]
+    exec_sql(conn, f"DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID IN ({_ph(len(keys))})", keys)
+    out.update({rid: None for rid in keys})
+    return out
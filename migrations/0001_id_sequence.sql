@@ -0,0 +1,23 @@
+USE defense_db;
+
+# Per-prefix ID counters used by flask_app/ids.py.
+# Next_Value is the next unused numeric suffix; the app reserves blocks with
+# UPDATE ... SET Next_Value = LAST_INSERT_ID(Next_Value) + n, a single-row PK update.
+CREATE TABLE IF NOT EXISTS ID_SEQUENCE (
+    Prefix CHAR(3) NOT NULL PRIMARY KEY, # DEF, DPT, VEN, PRO, REQ, BUD
+    Next_Value BIGINT UNSIGNED NOT NULL
+);
+
+# Seed from existing data (one-time scan)
+INSERT IGNORE INTO ID_SEQUENCE (Prefix, Next_Value)
+SELECT 'DEF', COALESCE(MAX(CAST(SUBSTRING(Admin_ID,4) AS UNSIGNED)),0)+1 FROM MINISTRY;
+INSERT IGNORE INTO ID_SEQUENCE (Prefix, Next_Value)
+SELECT 'DPT', COALESCE(MAX(CAST(SUBSTRING(Dept_ID,4) AS UNSIGNED)),0)+1 FROM DEPARTMENT;
+INSERT IGNORE INTO ID_SEQUENCE (Prefix, Next_Value)
+SELECT 'VEN', COALESCE(MAX(CAST(SUBSTRING(Vendor_ID,4) AS UNSIGNED)),0)+1 FROM VENDOR;
+INSERT IGNORE INTO ID_SEQUENCE (Prefix, Next_Value)
+SELECT 'PRO', COALESCE(MAX(CAST(SUBSTRING(Item_ID,4) AS UNSIGNED)),0)+1 FROM PRODUCT;
+INSERT IGNORE INTO ID_SEQUENCE (Prefix, Next_Value)
+SELECT 'REQ', COALESCE(MAX(CAST(SUBSTRING(Request_ID,4) AS UNSIGNED)),0)+1 FROM PROCUREMENT_REQUEST;
+INSERT IGNORE INTO ID_SEQUENCE (Prefix, Next_Value)
+SELECT 'BUD', COALESCE(MAX(CAST(SUBSTRING(Log_ID,4) AS UNSIGNED)),0)+1 FROM BUDGET_LOG;
@@ -0,0 +1,88 @@
+USE defense_db;
+
+# Running spend totals so the dashboard/analytics read O(#departments) rows
+# instead of re-aggregating BUDGET_LOG on every page view.
+#   DEPT     - SUM(BUDGET_LOG.Amount) per Dept_ID
+#   DAY      - SUM(BUDGET_LOG.Amount) per DATE(Timestamp)
+#   VENDOR   - SUM(Total_Cost) of Approved requests per Vendor_ID
+#   CATEGORY - SUM(Total_Cost) of Approved requests per product Category
+# Rebuild from scratch with `flask --app flask_app rebuild-rollups`.
+CREATE TABLE IF NOT EXISTS SPEND_ROLLUP (
+    Dimension VARCHAR(10) NOT NULL,
+    Dim_Key VARCHAR(50) NOT NULL,
+    Amount DECIMAL(24,8) NOT NULL DEFAULT 0,
+    Entries INT NOT NULL DEFAULT 0,
+    Updated_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (Dimension, Dim_Key)
+);
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS rollup_add$$
+CREATE PROCEDURE rollup_add(
+  IN p_dim     VARCHAR(10),
+  IN p_key     VARCHAR(50),
+  IN p_amount  DECIMAL(24,8),
+  IN p_entries INT
+)
+BEGIN
+  IF p_key IS NOT NULL THEN
+    INSERT INTO SPEND_ROLLUP (Dimension, Dim_Key, Amount, Entries)
+    VALUES (p_dim, p_key, COALESCE(p_amount,0), p_entries)
+    ON DUPLICATE KEY UPDATE Amount = Amount + VALUES(Amount), Entries = Entries + VALUES(Entries);
+  END IF;
+END$$
+
+# BUDGET_LOG is append-only: every insert adds to its department and day
+DROP TRIGGER IF EXISTS trg_budgetlog_ai$$
+CREATE TRIGGER trg_budgetlog_ai
+AFTER INSERT ON BUDGET_LOG
+FOR EACH ROW
+BEGIN
+  CALL rollup_add('DEPT', NEW.Dept_ID, NEW.Amount, 1);
+  CALL rollup_add('DAY', DATE_FORMAT(NEW.Timestamp, '%Y-%m-%d'), NEW.Amount, 1);
+END$$
+
+# Vendor/category spend follows requests into and out of the Approved state
+DROP TRIGGER IF EXISTS trg_request_ai$$
+CREATE TRIGGER trg_request_ai
+AFTER INSERT ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  IF NEW.Status = 'Approved' THEN
+    CALL rollup_add('VENDOR', NEW.Vendor_ID, NEW.Total_Cost, 1);
+    CALL rollup_add('CATEGORY', (SELECT Category FROM PRODUCT WHERE Item_ID = NEW.Item_ID), NEW.Total_Cost, 1);
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_au$$
+CREATE TRIGGER trg_request_au
+AFTER UPDATE ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  IF OLD.Status = 'Approved' AND NOT (NEW.Status = 'Approved'
+      AND NEW.Total_Cost <=> OLD.Total_Cost AND NEW.Vendor_ID <=> OLD.Vendor_ID AND NEW.Item_ID <=> OLD.Item_ID) THEN
+    CALL rollup_add('VENDOR', OLD.Vendor_ID, -OLD.Total_Cost, -1);
+    CALL rollup_add('CATEGORY', (SELECT Category FROM PRODUCT WHERE Item_ID = OLD.Item_ID), -OLD.Total_Cost, -1);
+    IF NEW.Status = 'Approved' THEN
+      CALL rollup_add('VENDOR', NEW.Vendor_ID, NEW.Total_Cost, 1);
+      CALL rollup_add('CATEGORY', (SELECT Category FROM PRODUCT WHERE Item_ID = NEW.Item_ID), NEW.Total_Cost, 1);
+    END IF;
+  ELSEIF NOT (OLD.Status <=> 'Approved') AND NEW.Status = 'Approved' THEN
+    CALL rollup_add('VENDOR', NEW.Vendor_ID, NEW.Total_Cost, 1);
+    CALL rollup_add('CATEGORY', (SELECT Category FROM PRODUCT WHERE Item_ID = NEW.Item_ID), NEW.Total_Cost, 1);
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_ad$$
+CREATE TRIGGER trg_request_ad
+AFTER DELETE ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  IF OLD.Status = 'Approved' THEN
+    CALL rollup_add('VENDOR', OLD.Vendor_ID, -OLD.Total_Cost, -1);
+    CALL rollup_add('CATEGORY', (SELECT Category FROM PRODUCT WHERE Item_ID = OLD.Item_ID), -OLD.Total_Cost, -1);
+  END IF;
+END$$
+
+DELIMITER ;
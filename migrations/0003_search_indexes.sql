@@ -0,0 +1,8 @@
+USE defense_db;
+
+# FULLTEXT indexes backing the search boxes (see flask_app/search.py).
+# ID columns are searched by prefix on their primary keys; FK columns already carry indexes.
+ALTER TABLE MINISTRY ADD FULLTEXT INDEX ft_ministry_search (Name, Role, Email);
+ALTER TABLE DEPARTMENT ADD FULLTEXT INDEX ft_department_search (Name, Region);
+ALTER TABLE VENDOR ADD FULLTEXT INDEX ft_vendor_search (Company, Category, Country);
+ALTER TABLE PRODUCT ADD FULLTEXT INDEX ft_product_search (Name, Category, Manufacturer);
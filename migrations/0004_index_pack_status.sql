@@ -0,0 +1,97 @@
+USE defense_db;
+
+# Canonical request statuses are 'Pending' / 'Approved' / 'Rejected' (the DDL CHECK values).
+# The stored procedures used to write upper case; normalise on write so every query can
+# compare Status directly (and use the indexes below) instead of UPPER(Status).
+DELIMITER $$
+
+DROP TRIGGER IF EXISTS trg_request_bi$$
+CREATE TRIGGER trg_request_bi
+BEFORE INSERT ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  IF NEW.Quantity IS NULL OR NEW.Quantity <= 0 THEN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Quantity must be positive.';
+  END IF;
+
+  # Validate Vendor supplies Item
+  IF NOT EXISTS (
+      SELECT 1 FROM PRODUCT p
+      WHERE p.Item_ID = NEW.Item_ID AND p.Vendor_ID = NEW.Vendor_ID
+  ) THEN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Vendor does not supply the selected product.';
+  END IF;
+
+  # Compute total
+  SET NEW.Total_Cost = calc_total_cost(NEW.Item_ID, NEW.Quantity);
+
+  # Default and canonical status
+  SET NEW.Status = CASE UPPER(COALESCE(NEW.Status, 'PENDING'))
+    WHEN 'PENDING' THEN 'Pending'
+    WHEN 'APPROVED' THEN 'Approved'
+    WHEN 'REJECTED' THEN 'Rejected'
+    ELSE NEW.Status END;
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_bu$$
+CREATE TRIGGER trg_request_bu
+BEFORE UPDATE ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  SET NEW.Status = CASE UPPER(NEW.Status)
+    WHEN 'PENDING' THEN 'Pending'
+    WHEN 'APPROVED' THEN 'Approved'
+    WHEN 'REJECTED' THEN 'Rejected'
+    ELSE NEW.Status END;
+
+  # Once approved/rejected, lock identifiers & qty
+  IF OLD.Status IN ('Approved','Rejected') THEN
+    IF (NEW.Dept_ID <> OLD.Dept_ID) OR (NEW.Item_ID <> OLD.Item_ID) OR
+       (NEW.Vendor_ID <> OLD.Vendor_ID) OR (NEW.Quantity <> OLD.Quantity) THEN
+      SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Cannot change identifiers/quantity after finalization.';
+    END IF;
+  END IF;
+
+  # Recompute total cost if qty or item changed (still pending)
+  IF NEW.Status = 'Pending' AND (NEW.Item_ID <> OLD.Item_ID OR NEW.Quantity <> OLD.Quantity) THEN
+    SET NEW.Total_Cost = calc_total_cost(NEW.Item_ID, NEW.Quantity);
+  END IF;
+END$$
+
+DELIMITER ;
+
+# Fix rows already written in another case (one-time scan). A case-only change is not a
+# transition into or out of Approved, so the SPEND_ROLLUP triggers leave the totals alone.
+UPDATE PROCUREMENT_REQUEST
+SET Status = CASE UPPER(COALESCE(Status, 'PENDING'))
+    WHEN 'PENDING' THEN 'Pending'
+    WHEN 'APPROVED' THEN 'Approved'
+    WHEN 'REJECTED' THEN 'Rejected'
+    ELSE Status END
+WHERE Status IS NULL OR CAST(Status AS BINARY) NOT IN ('Pending', 'Approved', 'Rejected');
+
+# PROCUREMENT_REQUEST
+#   dashboard status counts, batch-approve budget fallback (Status, Dept_ID) -> SUM(Total_Cost)
+CREATE INDEX idx_pr_status_dept_cost ON PROCUREMENT_REQUEST (Status, Dept_ID, Total_Cost);
+#   analytics high-value approvals: WHERE Status='Approved' ORDER BY Total_Cost DESC LIMIT 20
+CREATE INDEX idx_pr_status_cost ON PROCUREMENT_REQUEST (Status, Total_Cost);
+#   analytics department KPIs: per-department status counts and AVG/MAX(Total_Cost), index-only
+CREATE INDEX idx_pr_dept_status_cost ON PROCUREMENT_REQUEST (Dept_ID, Status, Total_Cost);
+#   analytics category spend: PRODUCT -> requests by Item_ID, index-only
+CREATE INDEX idx_pr_item_status_cost ON PROCUREMENT_REQUEST (Item_ID, Status, Total_Cost);
+#   vendor blacklisting rejects that vendor's Pending requests
+CREATE INDEX idx_pr_vendor_status ON PROCUREMENT_REQUEST (Vendor_ID, Status);
+
+# BUDGET_LOG
+#   /logs: ORDER BY Timestamp DESC, Log_ID DESC LIMIT n
+CREATE INDEX idx_log_ts_id ON BUDGET_LOG (Timestamp, Log_ID);
+#   per-department spend over a date range (rollup rebuild, reconciliation)
+CREATE INDEX idx_log_dept_ts ON BUDGET_LOG (Dept_ID, Timestamp, Amount);
+
+# PRODUCT
+#   analytics category spend: GROUP BY Category with AVG(Unit_Cost); Item_ID rides along in the index
+CREATE INDEX idx_product_category ON PRODUCT (Category, Unit_Cost);
+
+# MINISTRY
+#   officials dropdown on /requests: ORDER BY Name
+CREATE INDEX idx_ministry_name ON MINISTRY (Name);
@@ -0,0 +1,356 @@
+USE defense_db;
+
+# Request lifecycle as one CALL per action (WORKFLOW_BACKEND=procedures, see flask_app/workflow.py).
+# Same rules, lock order and log entries as the Python path. Failures are raised with
+# SIGNAL ... SET MYSQL_ERRNO; workflow.PROCEDURE_ERRORS maps the codes back to the app's messages:
+#   5001 Unknown Request_ID               5008 No supplier found for selected product
+#   5002 Unknown Admin_ID                 5009 Product has no linked vendor
+#   5003 Only Pending can be approved     5010 Vendor is blacklisted
+#   5004 Only Pending can be rejected     5011 Unknown Dept_ID
+#   5005 Only Approved can be cancelled   5012 Quantity must be positive
+#   5006 Insufficient department budget   5013 Unknown batch action
+#   5007 Insufficient stock               5014 No ID_SEQUENCE counter for prefix
+#                                         5015 Unknown Vendor_ID
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS next_sequence_id$$
+CREATE PROCEDURE next_sequence_id(
+  IN  p_prefix CHAR(3),
+  OUT p_id     VARCHAR(10)
+)
+BEGIN
+  # Same counter as flask_app/ids.py; the row stays locked until the caller commits,
+  # so callers take it as late as possible
+  UPDATE ID_SEQUENCE SET Next_Value = LAST_INSERT_ID(Next_Value) + 1 WHERE Prefix = p_prefix;
+  IF ROW_COUNT() = 0 THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5014, MESSAGE_TEXT = 'No ID_SEQUENCE counter for prefix';
+  END IF;
+  SET p_id = CONCAT(p_prefix, LPAD(LAST_INSERT_ID(),
+                    CASE p_prefix WHEN 'REQ' THEN 7 WHEN 'BUD' THEN 7 WHEN 'PRO' THEN 4 ELSE 3 END, '0'));
+END$$
+
+DROP PROCEDURE IF EXISTS create_procurement_request$$
+CREATE PROCEDURE create_procurement_request(
+  IN p_dept_id VARCHAR(6),
+  IN p_item_id VARCHAR(7),
+  IN p_qty     INT
+)
+BEGIN
+  DECLARE v_request_id  VARCHAR(10);
+  DECLARE v_found       BOOLEAN DEFAULT FALSE;
+  DECLARE v_vendor      VARCHAR(6);
+  DECLARE v_blacklisted BOOLEAN;
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
+
+  IF p_qty IS NULL OR p_qty <= 0 THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5012, MESSAGE_TEXT = 'Quantity must be positive';
+  END IF;
+
+  START TRANSACTION;
+
+  IF NOT EXISTS(SELECT 1 FROM DEPARTMENT WHERE Dept_ID = p_dept_id) THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5011, MESSAGE_TEXT = 'Unknown Dept_ID';
+  END IF;
+
+  SELECT TRUE, Vendor_ID INTO v_found, v_vendor
+  FROM PRODUCT WHERE Item_ID = p_item_id
+  FOR UPDATE;
+  IF NOT v_found THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5008, MESSAGE_TEXT = 'No supplier found for selected product';
+  END IF;
+  IF v_vendor IS NULL OR v_vendor = '' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5009, MESSAGE_TEXT = 'Product has no linked vendor';
+  END IF;
+
+  SELECT Blacklisted INTO v_blacklisted
+  FROM VENDOR WHERE Vendor_ID = v_vendor
+  FOR UPDATE;
+  IF v_blacklisted THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5010, MESSAGE_TEXT = 'Vendor is blacklisted';
+  END IF;
+
+  CALL next_sequence_id('REQ', v_request_id);
+
+  # Total_Cost is filled in by trg_request_bi
+  INSERT INTO PROCUREMENT_REQUEST
+    (Request_ID, Dept_ID, Item_ID, Vendor_ID, Quantity, Status, Date_of_Request)
+  VALUES
+    (v_request_id, p_dept_id, p_item_id, v_vendor, p_qty, 'Pending', NOW());
+
+  COMMIT;
+  SELECT v_request_id AS Request_ID, v_vendor AS Vendor_ID;
+END$$
+
+DROP PROCEDURE IF EXISTS approve_request$$
+CREATE PROCEDURE approve_request(
+  IN p_request_id VARCHAR(10),
+  IN p_admin_id   VARCHAR(6),
+  IN p_log_id     VARCHAR(10)  # pre-reserved BUDGET_LOG ID, or NULL to take one from ID_SEQUENCE
+)
+BEGIN
+  DECLARE v_status     VARCHAR(20);
+  DECLARE v_dept       VARCHAR(6);
+  DECLARE v_item       VARCHAR(7);
+  DECLARE v_qty        INT;
+  DECLARE v_total      DECIMAL(20,2);
+  DECLARE v_admin_name VARCHAR(100);
+  DECLARE v_budget     DECIMAL(20,8);
+  DECLARE v_stock      INT;
+  DECLARE v_log_id     VARCHAR(10);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
+
+  START TRANSACTION;
+
+  SELECT Status, Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost, 0)
+    INTO v_status, v_dept, v_item, v_qty, v_total
+  FROM PROCUREMENT_REQUEST
+  WHERE Request_ID = p_request_id
+  FOR UPDATE;
+  IF v_status IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5001, MESSAGE_TEXT = 'Unknown Request_ID';
+  END IF;
+  IF v_status <> 'Pending' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5003, MESSAGE_TEXT = 'Only Pending can be approved';
+  END IF;
+
+  SELECT Name INTO v_admin_name FROM MINISTRY WHERE Admin_ID = p_admin_id;
+  IF v_admin_name IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
+  END IF;
+
+  IF v_total = 0 THEN
+    SELECT COALESCE(Unit_Cost, 0) * v_qty INTO v_total FROM PRODUCT WHERE Item_ID = v_item;
+  END IF;
+
+  # Lock order: request -> department -> product
+  SELECT Current_Budget INTO v_budget
+  FROM DEPARTMENT WHERE Dept_ID = v_dept
+  FOR UPDATE;
+  IF v_budget IS NULL THEN
+    # No running budget: allocation minus approved spend
+    SELECT COALESCE(d.Budget_Allocation, 0) - COALESCE(SUM(pr.Total_Cost), 0) INTO v_budget
+    FROM DEPARTMENT d
+    LEFT JOIN PROCUREMENT_REQUEST pr ON pr.Dept_ID = d.Dept_ID AND pr.Status = 'Approved'
+    WHERE d.Dept_ID = v_dept
+    GROUP BY d.Dept_ID;
+  END IF;
+
+  SELECT Stock_Available INTO v_stock
+  FROM PRODUCT WHERE Item_ID = v_item
+  FOR UPDATE;
+
+  IF COALESCE(v_budget, 0) < v_total THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5006, MESSAGE_TEXT = 'Insufficient department budget';
+  END IF;
+  IF COALESCE(v_stock, 0) < v_qty THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5007, MESSAGE_TEXT = 'Insufficient stock';
+  END IF;
+
+  UPDATE PRODUCT SET Stock_Available = Stock_Available - v_qty WHERE Item_ID = v_item;
+  UPDATE DEPARTMENT SET Current_Budget = Current_Budget - v_total WHERE Dept_ID = v_dept;
+  UPDATE PROCUREMENT_REQUEST
+  SET Status = 'Approved', Date_of_Approval = NOW(), Approval_Authority = v_admin_name, Total_Cost = v_total
+  WHERE Request_ID = p_request_id;
+
+  SET v_log_id = p_log_id;
+  IF v_log_id IS NULL THEN
+    CALL next_sequence_id('BUD', v_log_id);
+  END IF;
+  INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount)
+  VALUES (v_log_id, 'Procurement', v_dept, p_request_id, p_admin_id, v_total);
+
+  COMMIT;
+END$$
+
+DROP PROCEDURE IF EXISTS reject_request$$
+CREATE PROCEDURE reject_request(
+  IN p_request_id VARCHAR(10),
+  IN p_admin_id   VARCHAR(6)
+)
+BEGIN
+  DECLARE v_status     VARCHAR(20);
+  DECLARE v_admin_name VARCHAR(100);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
+
+  START TRANSACTION;
+
+  SELECT Status INTO v_status
+  FROM PROCUREMENT_REQUEST
+  WHERE Request_ID = p_request_id
+  FOR UPDATE;
+  IF v_status IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5001, MESSAGE_TEXT = 'Unknown Request_ID';
+  END IF;
+  IF v_status <> 'Pending' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5004, MESSAGE_TEXT = 'Only Pending can be rejected';
+  END IF;
+
+  SELECT Name INTO v_admin_name FROM MINISTRY WHERE Admin_ID = p_admin_id;
+  IF v_admin_name IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
+  END IF;
+
+  UPDATE PROCUREMENT_REQUEST
+  SET Status = 'Rejected', Date_of_Approval = NOW(), Approval_Authority = v_admin_name
+  WHERE Request_ID = p_request_id;
+
+  COMMIT;
+END$$
+
+DROP PROCEDURE IF EXISTS cancel_request$$
+CREATE PROCEDURE cancel_request(
+  IN p_request_id VARCHAR(10),
+  IN p_admin_id   VARCHAR(6),
+  IN p_log_id     VARCHAR(10)  # pre-reserved BUDGET_LOG ID, or NULL to take one from ID_SEQUENCE
+)
+BEGIN
+  DECLARE v_status VARCHAR(20);
+  DECLARE v_dept   VARCHAR(6);
+  DECLARE v_item   VARCHAR(7);
+  DECLARE v_qty    INT;
+  DECLARE v_total  DECIMAL(20,2);
+  DECLARE v_log_id VARCHAR(10);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
+
+  START TRANSACTION;
+
+  SELECT Status, Dept_ID, Item_ID, Quantity, COALESCE(Total_Cost, 0)
+    INTO v_status, v_dept, v_item, v_qty, v_total
+  FROM PROCUREMENT_REQUEST
+  WHERE Request_ID = p_request_id
+  FOR UPDATE;
+  IF v_status IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5001, MESSAGE_TEXT = 'Unknown Request_ID';
+  END IF;
+  IF v_status <> 'Approved' THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5005, MESSAGE_TEXT = 'Only Approved can be cancelled';
+  END IF;
+  IF NOT EXISTS(SELECT 1 FROM MINISTRY WHERE Admin_ID = p_admin_id) THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
+  END IF;
+
+  # Refund and restock (department before product, as in approve_request)
+  UPDATE DEPARTMENT SET Current_Budget = Current_Budget + v_total WHERE Dept_ID = v_dept;
+  UPDATE PRODUCT SET Stock_Available = Stock_Available + v_qty WHERE Item_ID = v_item;
+
+  IF v_total <> 0 THEN
+    SET v_log_id = p_log_id;
+    IF v_log_id IS NULL THEN
+      CALL next_sequence_id('BUD', v_log_id);
+    END IF;
+    INSERT INTO BUDGET_LOG (Log_ID, Category, Dept_ID, Request_ID, Admin_ID, Amount)
+    VALUES (v_log_id, 'Reversal', v_dept, p_request_id, p_admin_id, -ABS(v_total));
+  END IF;
+
+  DELETE FROM PROCUREMENT_REQUEST WHERE Request_ID = p_request_id;
+
+  COMMIT;
+END$$
+
+# Batch approve/reject/cancel: one CALL for many requests, each in its own transaction.
+# p_request_ids is a JSON array of Request_IDs; the result is one row with a JSON array of
+# {request_id, errno, message} (errno 0 = done), in Request_ID order.
+DROP PROCEDURE IF EXISTS run_request_batch$$
+CREATE PROCEDURE run_request_batch(
+  IN p_action      VARCHAR(10),
+  IN p_request_ids JSON,
+  IN p_admin_id    VARCHAR(6)
+)
+BEGIN
+  DECLARE v_done    BOOLEAN DEFAULT FALSE;
+  DECLARE v_rid     VARCHAR(10);
+  DECLARE v_errno   INT;
+  DECLARE v_msg     VARCHAR(255);
+  DECLARE v_results JSON DEFAULT JSON_ARRAY();
+  DECLARE cur_ids CURSOR FOR
+    SELECT DISTINCT j.rid
+    FROM JSON_TABLE(p_request_ids, '$[*]' COLUMNS (rid VARCHAR(10) PATH '$')) j
+    WHERE j.rid IS NOT NULL
+    ORDER BY j.rid;
+  DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_done = TRUE;
+
+  IF p_action NOT IN ('approve', 'reject', 'cancel') THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5013, MESSAGE_TEXT = 'Unknown batch action';
+  END IF;
+  IF NOT EXISTS(SELECT 1 FROM MINISTRY WHERE Admin_ID = p_admin_id) THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
+  END IF;
+
+  OPEN cur_ids;
+  batch_loop: LOOP
+    FETCH cur_ids INTO v_rid;
+    IF v_done THEN
+      LEAVE batch_loop;
+    END IF;
+    SET v_errno = 0, v_msg = NULL;
+    BEGIN
+      DECLARE CONTINUE HANDLER FOR SQLEXCEPTION
+        GET DIAGNOSTICS CONDITION 1 v_errno = MYSQL_ERRNO, v_msg = MESSAGE_TEXT;
+      CASE p_action
+        WHEN 'approve' THEN CALL approve_request(v_rid, p_admin_id, NULL);
+        WHEN 'reject' THEN CALL reject_request(v_rid, p_admin_id);
+        ELSE CALL cancel_request(v_rid, p_admin_id, NULL);
+      END CASE;
+    END;
+    # A SELECT ... INTO that matched no row inside the call also fires the NOT FOUND handler
+    SET v_done = FALSE;
+    SET v_results = JSON_ARRAY_APPEND(v_results, '$',
+                      JSON_OBJECT('request_id', v_rid, 'errno', v_errno, 'message', v_msg));
+  END LOOP;
+  CLOSE cur_ids;
+
+  SELECT v_results AS Results;
+END$$
+
+# Blacklisting also rejects the vendor's Pending requests (BUDGET_LOG has no free-text column,
+# so nothing is logged)
+DROP PROCEDURE IF EXISTS blacklist_vendor$$
+CREATE PROCEDURE blacklist_vendor(
+  IN p_vendor_id VARCHAR(6),
+  IN p_admin_id  VARCHAR(6)
+)
+BEGIN
+  DECLARE v_admin_name VARCHAR(100);
+  DECLARE EXIT HANDLER FOR SQLEXCEPTION
+  BEGIN
+    ROLLBACK;
+    RESIGNAL;
+  END;
+
+  SELECT Name INTO v_admin_name FROM MINISTRY WHERE Admin_ID = p_admin_id;
+  IF v_admin_name IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5002, MESSAGE_TEXT = 'Unknown Admin_ID';
+  END IF;
+
+  START TRANSACTION;
+
+  IF NOT EXISTS(SELECT 1 FROM VENDOR WHERE Vendor_ID = p_vendor_id) THEN
+    SIGNAL SQLSTATE '45000' SET MYSQL_ERRNO = 5015, MESSAGE_TEXT = 'Unknown Vendor_ID';
+  END IF;
+
+  UPDATE VENDOR SET Blacklisted = TRUE WHERE Vendor_ID = p_vendor_id;
+
+  UPDATE PROCUREMENT_REQUEST
+  SET Status = 'Rejected', Date_of_Approval = NOW(), Approval_Authority = v_admin_name
+  WHERE Vendor_ID = p_vendor_id AND Status = 'Pending';
+
+  COMMIT;
+END$$
+
+DELIMITER ;
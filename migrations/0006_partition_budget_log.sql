@@ -0,0 +1,107 @@
+USE defense_db;
+
+# Monthly RANGE partitioning of BUDGET_LOG, so date-bounded reads touch only the months they ask for
+# and old months can be archived or compacted by swapping/dropping a partition instead of DELETE.
+#
+# MySQL requires every unique key of a partitioned table to include the partitioning column and does
+# not allow foreign keys on partitioned tables, so:
+#   - BUDGET_LOG's foreign keys are dropped (their indexes on Dept_ID/Request_ID/Admin_ID stay). Log
+#     rows now keep the Request_ID of a cancelled (deleted) request instead of having it set to NULL.
+#   - the primary key becomes (Log_ID, Timestamp); Log_IDs stay unique because they come from ID_SEQUENCE.
+# The table starts with a single catch-all partition; run `flask --app flask_app partitions` afterwards
+# to split existing history into months (a one-time table copy) and create the months ahead.
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS prepare_partitioning$$
+CREATE PROCEDURE prepare_partitioning(IN p_table VARCHAR(64))
+BEGIN
+  DECLARE v_drops TEXT;
+
+  # Constraint and index names were generated by the DDL, so look them up
+  SELECT GROUP_CONCAT(CONCAT('DROP FOREIGN KEY `', CONSTRAINT_NAME, '`')) INTO v_drops
+  FROM information_schema.TABLE_CONSTRAINTS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = p_table AND CONSTRAINT_TYPE = 'FOREIGN KEY';
+  IF v_drops IS NOT NULL THEN
+    SET @ddl = CONCAT('ALTER TABLE `', p_table, '` ', v_drops);
+    PREPARE stmt FROM @ddl;
+    EXECUTE stmt;
+    DEALLOCATE PREPARE stmt;
+  END IF;
+
+  SET v_drops = NULL;
+  SELECT GROUP_CONCAT(DISTINCT CONCAT('DROP INDEX `', INDEX_NAME, '`')) INTO v_drops
+  FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = p_table AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY';
+  IF v_drops IS NOT NULL THEN
+    SET @ddl = CONCAT('ALTER TABLE `', p_table, '` ', v_drops);
+    PREPARE stmt FROM @ddl;
+    EXECUTE stmt;
+    DEALLOCATE PREPARE stmt;
+  END IF;
+END$$
+
+DELIMITER ;
+
+CALL prepare_partitioning('BUDGET_LOG');
+DROP PROCEDURE prepare_partitioning;
+
+UPDATE BUDGET_LOG SET Timestamp = CURRENT_TIMESTAMP WHERE Timestamp IS NULL;
+
+ALTER TABLE BUDGET_LOG
+  DROP PRIMARY KEY,
+  MODIFY Timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  ADD PRIMARY KEY (Log_ID, Timestamp);
+
+# TIMESTAMP columns can only be range-partitioned through UNIX_TIMESTAMP(); the optimizer still
+# prunes on plain `Timestamp >= ... AND Timestamp < ...` conditions
+ALTER TABLE BUDGET_LOG
+  PARTITION BY RANGE (UNIX_TIMESTAMP(Timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+  );
+
+# Archived months, moved here whole by `flask partitions --retire-before ... --mode archive`
+# (partition exchange, no row copy). Same structure as BUDGET_LOG, no triggers.
+CREATE TABLE IF NOT EXISTS BUDGET_LOG_ARCHIVE LIKE BUDGET_LOG;
+ALTER TABLE BUDGET_LOG_ARCHIVE
+  PARTITION BY RANGE (UNIX_TIMESTAMP(Timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+  );
+
+# Per-day totals of every retired (archived or compacted) month, so date-range spend reports and
+# `rebuild-rollups` still cover history that is no longer in BUDGET_LOG. Dept_ID/Category '' = NULL.
+CREATE TABLE IF NOT EXISTS BUDGET_LOG_SUMMARY (
+    Day DATE NOT NULL,
+    Dept_ID VARCHAR(6) NOT NULL DEFAULT '',
+    Category VARCHAR(50) NOT NULL DEFAULT '',
+    Amount DECIMAL(24,8) NOT NULL DEFAULT 0,
+    Entries INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (Day, Dept_ID, Category),
+    KEY idx_summary_dept_day (Dept_ID, Day, Amount)
+);
+
+# Rejected requests are final; `flask partitions --archive-rejected N` moves the ones decided more
+# than N months ago out of the live table. Partitioned by request month like BUDGET_LOG.
+CREATE TABLE IF NOT EXISTS PROCUREMENT_REQUEST_ARCHIVE (
+    Request_ID VARCHAR(10) NOT NULL,
+    Dept_ID VARCHAR(6),
+    Item_ID VARCHAR(7),
+    Vendor_ID VARCHAR(6),
+    Quantity INT,
+    Total_Cost DECIMAL(15,2),
+    Status VARCHAR(20),
+    Date_of_Request DATE NOT NULL,
+    Approval_Authority VARCHAR(100),
+    Date_of_Approval DATE,
+    Archived_At TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (Request_ID, Date_of_Request),
+    KEY idx_pra_dept_date (Dept_ID, Date_of_Request)
+)
+PARTITION BY RANGE COLUMNS (Date_of_Request) (
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+# Date-range analytics on the live request table
+#   requests per department within a period
+CREATE INDEX idx_pr_date_dept ON PROCUREMENT_REQUEST (Date_of_Request, Dept_ID);
+#   approvals (vendor spend, high-value list) within a period
+CREATE INDEX idx_pr_status_approval ON PROCUREMENT_REQUEST (Status, Date_of_Approval);
@@ -0,0 +1,146 @@
+USE defense_db;
+
+# Precomputed Analytics page sections, written by `flask --app flask_app refresh-analytics`
+# (or the in-app refresher, ANALYTICS_REFRESH_INTERVAL). Data is the section's rows, pickled.
+CREATE TABLE IF NOT EXISTS ANALYTICS_SNAPSHOT (
+    Section VARCHAR(32) NOT NULL PRIMARY KEY,
+    Data LONGBLOB NOT NULL,
+    Row_Count INT NOT NULL DEFAULT 0,
+    Mode VARCHAR(12) NOT NULL,
+    Seconds DECIMAL(10,3) NOT NULL DEFAULT 0,
+    Refreshed_At TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+);
+
+# Departments/vendors whose analytics rows changed since the last refresh; an incremental
+# refresh deletes the marks and then recomputes only those rows. Marked_At is the first change.
+#   DEPT   - requests, budget log entries or the department itself changed
+#   VENDOR - requests, products or the vendor itself changed
+CREATE TABLE IF NOT EXISTS ANALYTICS_DIRTY (
+    Dimension VARCHAR(10) NOT NULL,
+    Dim_Key VARCHAR(10) NOT NULL,
+    Marked_At TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (Dimension, Dim_Key)
+);
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS analytics_mark$$
+CREATE PROCEDURE analytics_mark(IN p_dim VARCHAR(10), IN p_key VARCHAR(10))
+BEGIN
+  # IGNORE: an existing mark only takes a shared lock, so concurrent writers for the same
+  # department/vendor don't queue on it
+  IF p_key IS NOT NULL THEN
+    INSERT IGNORE INTO ANALYTICS_DIRTY (Dimension, Dim_Key) VALUES (p_dim, p_key);
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_dirty_ai$$
+CREATE TRIGGER trg_request_dirty_ai
+AFTER INSERT ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('DEPT', NEW.Dept_ID);
+  CALL analytics_mark('VENDOR', NEW.Vendor_ID);
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_dirty_au$$
+CREATE TRIGGER trg_request_dirty_au
+AFTER UPDATE ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('DEPT', NEW.Dept_ID);
+  CALL analytics_mark('VENDOR', NEW.Vendor_ID);
+  IF NOT (OLD.Dept_ID <=> NEW.Dept_ID) THEN
+    CALL analytics_mark('DEPT', OLD.Dept_ID);
+  END IF;
+  IF NOT (OLD.Vendor_ID <=> NEW.Vendor_ID) THEN
+    CALL analytics_mark('VENDOR', OLD.Vendor_ID);
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_dirty_ad$$
+CREATE TRIGGER trg_request_dirty_ad
+AFTER DELETE ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('DEPT', OLD.Dept_ID);
+  CALL analytics_mark('VENDOR', OLD.Vendor_ID);
+END$$
+
+DROP TRIGGER IF EXISTS trg_budgetlog_dirty_ai$$
+CREATE TRIGGER trg_budgetlog_dirty_ai
+AFTER INSERT ON BUDGET_LOG
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('DEPT', NEW.Dept_ID);
+END$$
+
+DROP TRIGGER IF EXISTS trg_department_dirty_ai$$
+CREATE TRIGGER trg_department_dirty_ai
+AFTER INSERT ON DEPARTMENT
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('DEPT', NEW.Dept_ID);
+END$$
+
+DROP TRIGGER IF EXISTS trg_department_dirty_au$$
+CREATE TRIGGER trg_department_dirty_au
+AFTER UPDATE ON DEPARTMENT
+FOR EACH ROW
+BEGIN
+  # Budget deductions/refunds don't change any analytics column
+  IF NOT (OLD.Name <=> NEW.Name AND OLD.Dept_ID <=> NEW.Dept_ID) THEN
+    CALL analytics_mark('DEPT', NEW.Dept_ID);
+    CALL analytics_mark('DEPT', OLD.Dept_ID);
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_vendor_dirty_ai$$
+CREATE TRIGGER trg_vendor_dirty_ai
+AFTER INSERT ON VENDOR
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('VENDOR', NEW.Vendor_ID);
+END$$
+
+DROP TRIGGER IF EXISTS trg_vendor_dirty_au$$
+CREATE TRIGGER trg_vendor_dirty_au
+AFTER UPDATE ON VENDOR
+FOR EACH ROW
+BEGIN
+  IF NOT (OLD.Company <=> NEW.Company AND OLD.Vendor_ID <=> NEW.Vendor_ID) THEN
+    CALL analytics_mark('VENDOR', NEW.Vendor_ID);
+    CALL analytics_mark('VENDOR', OLD.Vendor_ID);
+  END IF;
+END$$
+
+# Product count per vendor and category spend
+DROP TRIGGER IF EXISTS trg_product_dirty_ai$$
+CREATE TRIGGER trg_product_dirty_ai
+AFTER INSERT ON PRODUCT
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('VENDOR', NEW.Vendor_ID);
+END$$
+
+DROP TRIGGER IF EXISTS trg_product_dirty_au$$
+CREATE TRIGGER trg_product_dirty_au
+AFTER UPDATE ON PRODUCT
+FOR EACH ROW
+BEGIN
+  # Restocks and stock deductions don't change any analytics column
+  IF NOT (OLD.Vendor_ID <=> NEW.Vendor_ID AND OLD.Category <=> NEW.Category AND OLD.Unit_Cost <=> NEW.Unit_Cost) THEN
+    CALL analytics_mark('VENDOR', NEW.Vendor_ID);
+    CALL analytics_mark('VENDOR', OLD.Vendor_ID);
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_product_dirty_ad$$
+CREATE TRIGGER trg_product_dirty_ad
+AFTER DELETE ON PRODUCT
+FOR EACH ROW
+BEGIN
+  CALL analytics_mark('VENDOR', OLD.Vendor_ID);
+END$$
+
+DELIMITER ;
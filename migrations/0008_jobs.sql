@@ -0,0 +1,26 @@
+USE defense_db;
+
+# Background jobs (flask_app/jobs.py): CSV exports, bulk request actions and vendor blacklisting
+# queued by the web routes and run by worker threads (JOBS_WORKERS) or `flask --app flask_app jobs-worker`.
+#   Status: queued -> running -> done | failed
+#   Progress/Total: units of work done so far (rows exported, requests processed); Total NULL if unknown
+#   Heartbeat_At: bumped with progress; running jobs whose heartbeat stops are handed to another worker
+#   Result_Path: file written by the job (download at /jobs/<id>/download)
+CREATE TABLE IF NOT EXISTS JOB (
+    Job_ID BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    Kind VARCHAR(32) NOT NULL,
+    Params JSON NOT NULL,
+    Status VARCHAR(10) NOT NULL DEFAULT 'queued',
+    Progress BIGINT NOT NULL DEFAULT 0,
+    Total BIGINT NULL,
+    Message VARCHAR(500) NULL,
+    Result_Path VARCHAR(255) NULL,
+    Worker VARCHAR(64) NULL,
+    Attempts INT NOT NULL DEFAULT 0,
+    Created_At TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    Started_At TIMESTAMP(6) NULL,
+    Heartbeat_At TIMESTAMP(6) NULL,
+    Finished_At TIMESTAMP(6) NULL,
+    KEY idx_job_status (Status, Job_ID),
+    KEY idx_job_finished (Finished_At)
+);
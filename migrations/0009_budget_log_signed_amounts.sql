@@ -0,0 +1,25 @@
+USE defense_db;
+
+# BUDGET_LOG keeps signed amounts for the entries that give money back, so that for every department
+#   Current_Budget = Budget_Allocation - SUM(BUDGET_LOG.Amount)
+# holds (checked by `flask --app flask_app reconcile`, flask_app/reconcile.py).
+#   Reversal   - refund of a cancelled request, written negative by cancel_request and the app
+#   Adjustment - correction entry written by `reconcile --correct`, either sign
+# trg_budgetlog_bi used to clamp every negative Amount to 0, which dropped each refund from the ledger
+# while Current_Budget was credited. Other categories are still clamped.
+DELIMITER $$
+
+DROP TRIGGER IF EXISTS trg_budgetlog_bi$$
+CREATE TRIGGER trg_budgetlog_bi
+BEFORE INSERT ON BUDGET_LOG
+FOR EACH ROW
+BEGIN
+  IF NEW.Amount IS NULL OR (NEW.Amount < 0 AND COALESCE(NEW.Category, '') NOT IN ('Reversal', 'Adjustment')) THEN
+    SET NEW.Amount = 0;
+  END IF;
+  IF NEW.Timestamp IS NULL THEN
+    SET NEW.Timestamp = NOW();
+  END IF;
+END$$
+
+DELIMITER ;
@@ -0,0 +1,114 @@
+USE defense_db;
+
+# Change feed for downstream consumers (GET /api/v1/feed, flask_app/feed.py). The triggers below
+# append one row per change, whichever path made it (app, procedures, jobs, imports):
+#   REQUEST    - requests created (I), updated (U: approve, reject, edits) or deleted (D: cancel)
+#   BUDGET_LOG - log entries written (I)
+#   PRODUCT    - stock, unit cost or vendor changed (U: restock, approvals, cancels)
+#   VENDOR     - blacklisted or cleared (U)
+# Change_ID is the consumer's position. Data is the row after the change (the key columns for a
+# delete); money is a decimal string, as in the JSON API.
+CREATE TABLE IF NOT EXISTS CHANGE_FEED (
+    Change_ID BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    Entity VARCHAR(16) NOT NULL,
+    Entity_ID VARCHAR(10) NOT NULL,
+    Op CHAR(1) NOT NULL,
+    Data JSON NOT NULL,
+    Changed_At TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    KEY idx_feed_changed (Changed_At),
+    KEY idx_feed_entity (Entity, Entity_ID, Change_ID)
+);
+
+# Retention bookkeeping (`flask --app flask_app change-feed`), one row:
+#   Purged_Through    - every change up to here was deleted; readers behind it must resync
+#   Compacted_Through - up to here only the newest change of each row is kept
+CREATE TABLE IF NOT EXISTS CHANGE_FEED_STATE (
+    Id TINYINT NOT NULL PRIMARY KEY,
+    Purged_Through BIGINT NOT NULL DEFAULT 0,
+    Compacted_Through BIGINT NOT NULL DEFAULT 0,
+    Updated_At TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+);
+INSERT IGNORE INTO CHANGE_FEED_STATE (Id) VALUES (1);
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS feed_append$$
+CREATE PROCEDURE feed_append(IN p_entity VARCHAR(16), IN p_id VARCHAR(10), IN p_op CHAR(1), IN p_data JSON)
+BEGIN
+  INSERT INTO CHANGE_FEED (Entity, Entity_ID, Op, Data) VALUES (p_entity, p_id, p_op, p_data);
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_feed_ai$$
+CREATE TRIGGER trg_request_feed_ai
+AFTER INSERT ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  CALL feed_append('REQUEST', NEW.Request_ID, 'I', JSON_OBJECT(
+    'Request_ID', NEW.Request_ID, 'Dept_ID', NEW.Dept_ID, 'Item_ID', NEW.Item_ID, 'Vendor_ID', NEW.Vendor_ID,
+    'Quantity', NEW.Quantity, 'Total_Cost', CAST(NEW.Total_Cost AS CHAR), 'Status', NEW.Status,
+    'Date_of_Request', NEW.Date_of_Request, 'Approval_Authority', NEW.Approval_Authority,
+    'Date_of_Approval', NEW.Date_of_Approval));
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_feed_au$$
+CREATE TRIGGER trg_request_feed_au
+AFTER UPDATE ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  IF NOT (OLD.Request_ID <=> NEW.Request_ID AND OLD.Dept_ID <=> NEW.Dept_ID AND OLD.Item_ID <=> NEW.Item_ID
+          AND OLD.Vendor_ID <=> NEW.Vendor_ID AND OLD.Quantity <=> NEW.Quantity AND OLD.Total_Cost <=> NEW.Total_Cost
+          AND OLD.Status <=> NEW.Status AND OLD.Approval_Authority <=> NEW.Approval_Authority
+          AND OLD.Date_of_Approval <=> NEW.Date_of_Approval) THEN
+    CALL feed_append('REQUEST', NEW.Request_ID, 'U', JSON_OBJECT(
+      'Request_ID', NEW.Request_ID, 'Dept_ID', NEW.Dept_ID, 'Item_ID', NEW.Item_ID, 'Vendor_ID', NEW.Vendor_ID,
+      'Quantity', NEW.Quantity, 'Total_Cost', CAST(NEW.Total_Cost AS CHAR), 'Status', NEW.Status,
+      'Date_of_Request', NEW.Date_of_Request, 'Approval_Authority', NEW.Approval_Authority,
+      'Date_of_Approval', NEW.Date_of_Approval));
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_request_feed_ad$$
+CREATE TRIGGER trg_request_feed_ad
+AFTER DELETE ON PROCUREMENT_REQUEST
+FOR EACH ROW
+BEGIN
+  CALL feed_append('REQUEST', OLD.Request_ID, 'D', JSON_OBJECT(
+    'Request_ID', OLD.Request_ID, 'Dept_ID', OLD.Dept_ID, 'Item_ID', OLD.Item_ID, 'Status', OLD.Status));
+END$$
+
+DROP TRIGGER IF EXISTS trg_budgetlog_feed_ai$$
+CREATE TRIGGER trg_budgetlog_feed_ai
+AFTER INSERT ON BUDGET_LOG
+FOR EACH ROW
+BEGIN
+  CALL feed_append('BUDGET_LOG', NEW.Log_ID, 'I', JSON_OBJECT(
+    'Log_ID', NEW.Log_ID, 'Category', NEW.Category, 'Dept_ID', NEW.Dept_ID, 'Request_ID', NEW.Request_ID,
+    'Admin_ID', NEW.Admin_ID, 'Amount', CAST(NEW.Amount AS CHAR), 'Timestamp', NEW.Timestamp));
+END$$
+
+DROP TRIGGER IF EXISTS trg_product_feed_au$$
+CREATE TRIGGER trg_product_feed_au
+AFTER UPDATE ON PRODUCT
+FOR EACH ROW
+BEGIN
+  # Name, category and manufacturer edits are not of interest downstream
+  IF NOT (OLD.Item_ID <=> NEW.Item_ID AND OLD.Stock_Available <=> NEW.Stock_Available
+          AND OLD.Unit_Cost <=> NEW.Unit_Cost AND OLD.Vendor_ID <=> NEW.Vendor_ID) THEN
+    CALL feed_append('PRODUCT', NEW.Item_ID, 'U', JSON_OBJECT(
+      'Item_ID', NEW.Item_ID, 'Stock_Available', NEW.Stock_Available,
+      'Unit_Cost', CAST(NEW.Unit_Cost AS CHAR), 'Vendor_ID', NEW.Vendor_ID));
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_vendor_feed_au$$
+CREATE TRIGGER trg_vendor_feed_au
+AFTER UPDATE ON VENDOR
+FOR EACH ROW
+BEGIN
+  IF NOT (OLD.Vendor_ID <=> NEW.Vendor_ID AND OLD.Blacklisted <=> NEW.Blacklisted) THEN
+    CALL feed_append('VENDOR', NEW.Vendor_ID, 'U', JSON_OBJECT(
+      'Vendor_ID', NEW.Vendor_ID, 'Blacklisted', NEW.Blacklisted IS TRUE));
+  END IF;
+END$$
+
+DELIMITER ;